@@ -0,0 +1,172 @@
+"""
+文本塊切分的效能比較
+
+比較改寫前「每兩句一個請求、batch_size 1」與目前字數預算切分的請求數與延遲。
+
+沒有指定 --url 時以簡單的伺服器模型估算延遲：
+每個請求有固定的開銷，伺服器以 cut5 將文本塊切成片段後，每 batch_size 個片段一起推論，
+一批的耗時取決於其中最長的片段。
+指定 --url 與 --character 時會實際向 GPT-SoVITS 伺服器請求，並可用 --budgets
+比較不同的字數預算，依實測結果調整 TTS_CHUNK_MAX_CHARS。
+
+用法 (於專案根目錄):
+    python -m benchmarks.bench_chunking
+    python -m benchmarks.bench_chunking --url http://127.0.0.1:9880/tts/ --character 角色 --budgets 40,80,120
+"""
+import argparse
+import asyncio
+import heapq
+import re
+import time
+
+import aiohttp
+
+from bot.api.async_tts_handler import (
+    build_tts_payload,
+    preprocess_text,
+    resolve_character_sample,
+    split_text_into_chunks,
+)
+from config import TTS_BATCH_SIZE, TTS_CHUNK_MAX_CHARS, TTS_FIRST_CHUNK_MAX_CHARS, TTS_MAX_PARALLEL_CHUNKS
+
+CORPUS = [
+    "好。",
+    "哈哈哈哈。笑死。真的假的？",
+    "今天晚上要不要一起挖礦？我這邊有很多鐵鎬。",
+    "等一下。我先去吃飯。十分鐘後回來。你們先開始。不用等我。",
+    "這個紅石電路的原理是利用比較器偵測箱子內的物品數量，當數量超過門檻時就會輸出訊號，"
+    "接著觸發活塞把物品推到漏斗裡面，最後再由分類系統把不同的物品送到對應的箱子。",
+    "關於你的問題，首先要確認伺服器的版本。其次，模組之間可能有衝突，建議一個一個停用測試。"
+    "如果還是不行，可以把記錄檔傳到頻道裡。我們會盡快幫你看看。祝你遊戲愉快！",
+]
+
+_SEGMENT_PATTERN = re.compile(r"(?<=[，,。！？!?、；;：:])")
+
+
+def legacy_split(text: str, chunk_size: int = 2) -> list:
+    raw_sentences = re.split(r"([。！？!?\n])", text)
+    sentences = []
+    for i in range(0, len(raw_sentences) - 1, 2):
+        s = raw_sentences[i] + raw_sentences[i + 1]
+        if s.strip():
+            sentences.append(s.strip())
+    if len(raw_sentences) % 2 != 0 and raw_sentences[-1].strip():
+        sentences.append(raw_sentences[-1].strip())
+    return [" ".join(sentences[i : i + chunk_size]) for i in range(0, len(sentences), chunk_size)]
+
+
+def modeled_request_time(chunk: str, batch_size: int, overhead: float, per_char: float) -> float:
+    segments = sorted((len(s) for s in _SEGMENT_PATTERN.split(chunk) if s.strip()), reverse=True)
+    batches = [segments[i : i + batch_size] for i in range(0, len(segments), batch_size)]
+    return overhead + sum(max(batch) * per_char for batch in batches)
+
+
+def modeled_message(chunks: list, batch_size: int, parallel: int, overhead: float, per_char: float):
+    # 以 parallel 個並行請求依序處理文本塊，回傳 (第一塊完成時間, 全部完成時間)
+    workers = [0.0] * max(1, parallel)
+    finished = []
+    for chunk in chunks:
+        start = heapq.heappop(workers)
+        end = start + modeled_request_time(chunk, batch_size, overhead, per_char)
+        finished.append(end)
+        heapq.heappush(workers, end)
+    return finished[0], max(finished)
+
+
+def report(name: str, requests: int, first: float, total: float):
+    print(f"{name:28s} requests {requests:4d}  first chunk {first:6.2f}s  total {total:7.2f}s")
+
+
+def run_model(args):
+    texts = [preprocess_text(text) for text in CORPUS]
+    plans = {
+        "legacy (2 sentences, bs=1)": ([legacy_split(t) for t in texts], 1),
+        f"budget {args.max_chars}/{args.first_chars} (bs={args.batch_size})": (
+            [split_text_into_chunks(t, args.max_chars, args.first_chars) for t in texts],
+            args.batch_size,
+        ),
+    }
+    print(f"model: overhead {args.overhead}s/request, {args.per_char}s/char, parallel {args.parallel}")
+    for name, (chunked, batch_size) in plans.items():
+        results = [
+            modeled_message(chunks, batch_size, args.parallel, args.overhead, args.per_char)
+            for chunks in chunked
+        ]
+        report(
+            name,
+            sum(len(chunks) for chunks in chunked),
+            sum(first for first, _ in results),
+            sum(total for _, total in results),
+        )
+
+
+async def measure(session, url: str, chunks: list, sample: dict, batch_size: int, parallel: int):
+    semaphore = asyncio.Semaphore(parallel)
+    started = time.monotonic()
+    first = None
+
+    async def request(index: int, chunk: str):
+        nonlocal first
+        payload = build_tts_payload(chunk, sample)
+        payload["batch_size"] = batch_size
+        async with semaphore, session.post(url, json=payload) as response:
+            await response.read()
+        # 播放需等第一個文本塊完成才能開始
+        if index == 0:
+            first = time.monotonic() - started
+
+    await asyncio.gather(*(request(index, chunk) for index, chunk in enumerate(chunks)))
+    return first, time.monotonic() - started
+
+
+async def run_server(args):
+    sample = resolve_character_sample(args.character)
+    texts = [preprocess_text(text) for text in CORPUS]
+    plans = [("legacy (2 sentences, bs=1)", [legacy_split(t) for t in texts], 1)]
+    for budget in args.budgets:
+        plans.append(
+            (
+                f"budget {budget}/{args.first_chars} (bs={args.batch_size})",
+                [split_text_into_chunks(t, budget, args.first_chars) for t in texts],
+                args.batch_size,
+            )
+        )
+
+    async with aiohttp.ClientSession() as session:
+        # 暖機，讓參考語音載入伺服器
+        await measure(session, args.url, ["暖機。"], sample, 1, 1)
+        for name, chunked, batch_size in plans:
+            first_total = total_total = 0.0
+            for chunks in chunked:
+                first, total = await measure(session, args.url, chunks, sample, batch_size, args.parallel)
+                first_total += first
+                total_total += total
+            chars = sum(len(chunk) for chunks in chunked for chunk in chunks)
+            report(name, sum(len(chunks) for chunks in chunked), first_total, total_total)
+            print(f"{'':28s} throughput {chars / total_total:.1f} chars/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="GPT-SoVITS /tts 網址，未指定時使用伺服器模型估算")
+    parser.add_argument("--character", help="實測時使用的語音角色")
+    parser.add_argument("--budgets", default=str(TTS_CHUNK_MAX_CHARS), help="以逗號分隔的字數預算")
+    parser.add_argument("--max-chars", type=int, default=TTS_CHUNK_MAX_CHARS)
+    parser.add_argument("--first-chars", type=int, default=TTS_FIRST_CHUNK_MAX_CHARS)
+    parser.add_argument("--batch-size", type=int, default=TTS_BATCH_SIZE)
+    parser.add_argument("--parallel", type=int, default=TTS_MAX_PARALLEL_CHUNKS)
+    parser.add_argument("--overhead", type=float, default=0.6, help="模型：每個請求的固定開銷秒數")
+    parser.add_argument("--per-char", type=float, default=0.04, help="模型：每個字的推論秒數")
+    args = parser.parse_args()
+    args.budgets = [int(budget) for budget in args.budgets.split(",")]
+
+    if args.url:
+        if not args.character:
+            parser.error("--url requires --character")
+        asyncio.run(run_server(args))
+    else:
+        run_model(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+preprocess_text 的效能測試
+
+與改寫前逐一套用正則表達式的實作比較，並確認兩者輸出相同。
+
+用法 (於專案根目錄):
+    python -m benchmarks.bench_preprocess
+"""
+import json
+import re
+import timeit
+from pathlib import Path
+from types import SimpleNamespace
+
+from disnake import Message
+
+from bot.api import async_tts_handler
+from bot.api.async_tts_handler import preprocess_text
+
+GOLDEN = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "preprocess_golden.json"
+
+
+def legacy_preprocess_text(text: str, message: Message = None) -> str:
+    """
+    改寫前的 preprocess_text，保留作為效能與輸出比較的基準
+    Args:
+        text (str): 要預處理的文本
+        message: Discord消息對象，用於獲取用戶和頻道名稱
+
+    Returns:
+        str: 預處理後的文本
+    """
+
+    if message:
+        # 替換提及用戶
+        def replace_user_mention(match: re.Match) -> str:
+            user_id = int(match.group(1))
+            user = message.guild.get_member(user_id)
+
+            return f"，提及 {user.display_name} 用戶，" if user else match.group(0)
+
+        text = re.sub(r"<@!?(\d+)>", replace_user_mention, text)
+
+        # 替換提及頻道
+        def replace_channel_mention(match: re.Match) -> str:
+            channel_id = int(match.group(1))
+            channel = message.guild.get_channel(channel_id)
+
+            return f"，在 {channel.name} 頻道中，" if channel else match.group(0)
+
+        text = re.sub(r"<#(\d+)>", replace_channel_mention, text)
+
+    # 移除Markdown特殊字符和格式符號
+    def replace_other_chars(t: str) -> str:
+        # 移除Markdown標題
+        t = re.sub(r"#*", "", t)
+        # 移除Markdown列表項目
+        t = re.sub(r"\*", "", t)
+        # 移除Markdown鏈接
+        t = re.sub(r"\[.*?]\(.*?\)", "", t)
+        # 移除多餘的空格和換行符
+        t = t.replace("\n", " ").strip()
+        # 移除連結
+        t = re.sub(r"https?://\S+", "", t)
+        # 移除Discord表情符號
+        t = re.sub(r"<a?:\w+:\d+>", "", t)
+
+        return t
+
+    def insert_commas_for_long_text(t, limit=200):
+        segments = re.split(r"(?<=[。！？，])", t)
+        processed_segments = []
+        for seg in segments:
+            if not seg:
+                continue
+            if len(seg) >= limit:
+                sub_chunks = [seg[i : i + limit] for i in range(0, len(seg), limit)]
+                new_seg = "，".join(sub_chunks)
+                processed_segments.append(new_seg)
+            else:
+                processed_segments.append(seg)
+        return "".join(processed_segments)
+
+    text = replace_other_chars(text)
+    if [
+        i
+        for i in [c for c in re.split(r"(?<=[。！？，])", text) if c.strip()]
+        if len(i) >= 200
+    ]:
+        text = insert_commas_for_long_text(text)
+    return text
+
+
+def fake_message(members: dict, channels: dict):
+    guild = SimpleNamespace(
+        id=1,
+        get_member=lambda i: SimpleNamespace(display_name=members[str(i)]) if str(i) in members else None,
+        get_channel=lambda i: SimpleNamespace(name=channels[str(i)]) if str(i) in channels else None,
+    )
+    return SimpleNamespace(guild=guild)
+
+
+def main(number: int = 2000):
+    corpus = json.loads(GOLDEN.read_text(encoding="utf-8"))
+    message = fake_message(corpus["members"], corpus["channels"])
+    cases = [(case["text"], message if case["message"] else None) for case in corpus["cases"]]
+    # 一般聊天訊息：短句為主，偶爾夾帶提及與連結
+    chat = [
+        ("今天晚上要不要一起挖礦？", None),
+        ("<@123> 你在哪裡？我在 <#456> 等你", message),
+        ("看這個 https://example.com/video 笑死 <:lol:123>", None),
+        ("**注意**：伺服器 10 分鐘後重啟！", None),
+    ]
+
+    for text, msg in cases + chat:
+        assert preprocess_text(text, msg) == legacy_preprocess_text(text, msg), text
+
+    for name, workload in (("golden corpus", cases), ("chat messages", chat)):
+        legacy = timeit.timeit(
+            lambda: [legacy_preprocess_text(text, msg) for text, msg in workload], number=number
+        )
+        current = timeit.timeit(
+            lambda: [preprocess_text(text, msg) for text, msg in workload], number=number
+        )
+        per_call = 1e6 / (number * len(workload))
+        print(
+            f"{name:14s} legacy {legacy * per_call:7.2f} us/call  "
+            f"current {current * per_call:7.2f} us/call  speedup {legacy / current:.2f}x"
+        )
+    async_tts_handler._mention_names.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,123 @@
 import asyncio
-import io
 import re
+import time
 from pathlib import Path
-
-import pydub.utils
-from config import USER_VOICE_SETTINGS_FILE, VOICE_DIR, TTS_API_URL
-from utils.file_utils import get_samples_by_character, load_sample_data
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from bot.api.quality_tiers import QualityTier, load_monitor
+from bot.api.tts_cache import sample_fingerprint_async, tts_cache
+from bot.api.tts_backends import backend_pool
+from bot.api.tts_resilience import TTSHTTPError, is_retryable, tts_resilience
+from bot.character_registry import character_registry
+from bot.utils.pcm import PCMChunk, build_wav, decode_wav, encode_wav, parse_wav_header
+from bot.utils.rate_limiter import tts_concurrency
+from bot.utils.single_flight import SingleFlight
+from config import (
+    VOICE_DIR,
+    TTS_MAX_PARALLEL_CHUNKS,
+    TTS_STREAMING_MODE,
+    TTS_PREFIX_CACHE_SIZE,
+    TTS_CHUNK_MAX_CHARS,
+    TTS_FIRST_CHUNK_MAX_CHARS,
+    TTS_BATCH_SIZE,
+)
 from utils.logger import logger
 from disnake import Message
-from pydub import AudioSegment
-from aiohttp import ClientSession, ClientTimeout
-
-original_get_encoder = pydub.utils.get_encoder_name
 
+# 已解碼的說話者前綴音訊 (LRU)
+_prefix_audio: OrderedDict[str, PCMChunk] = OrderedDict()
+# 合併同時進行的相同文本塊請求
+chunk_flights = SingleFlight()
+
+
+# 使用者與頻道提及，一次掃描同時處理兩者
+_MENTION_PATTERN = re.compile(r"<@!?(\d+)>|<#(\d+)>")
+_CHANNEL_MENTION_PATTERN = re.compile(r"<#(\d+)>")
+# Markdown 鏈接 (不跨行)
+_MARKDOWN_LINK_PATTERN = re.compile(r"\[.*?]\(.*?\)")
+# 連結與 Discord 表情符號
+_URL_OR_EMOJI_PATTERN = re.compile(r"https?://\S+|<a?:\w+:\d+>")
+# 在這些標點之後切分句段，判斷是否需要為過長的句段插入逗號
+_CLAUSE_SPLIT_PATTERN = re.compile(r"(?<=[。！？，])")
+# 句尾標點與換行，用於切分句子
+_SENTENCE_SPLIT_PATTERN = re.compile(r"([。！？!?\n])")
+# 句中的停頓標點，過長的句子在這些位置之後切開
+_CLAUSE_BREAK_PATTERN = re.compile(r"(?<=[，,、；;：:])")
+# Markdown 標題與列表符號
+_MARKDOWN_CHARS = str.maketrans("", "", "#*")
+# 沒有標點的句段超過這個長度時插入逗號
+_LONG_CLAUSE_LIMIT = 200
+# 提及名稱的快取秒數與數量上限
+_MENTION_CACHE_TTL = 60
+_MENTION_CACHE_SIZE = 1024
+
+# (伺服器 ID, 種類, ID) -> (到期時間, 名稱)
+_mention_names: OrderedDict[tuple, tuple] = OrderedDict()
+
+
+def _lookup_mention_name(guild, kind: str, target_id: int) -> Optional[str]:
+    """
+    取得伺服器成員的顯示名稱或頻道名稱，結果依伺服器快取一段時間
 
-def custom_get_encoder_name():
-    encoder = original_get_encoder()
-    return [encoder, "-loglevel", "error"]
-
+    Args:
+        guild: Discord 伺服器
+        kind (str): "user" 或 "channel"
+        target_id (int): 使用者或頻道 ID
 
-pydub.utils.get_encoder_name = custom_get_encoder_name
+    Returns:
+        str | None: 名稱，找不到時回傳 None
+    """
+    key = (guild.id, kind, target_id)
+    now = time.monotonic()
+    cached = _mention_names.get(key)
+    if cached is not None and cached[0] > now:
+        _mention_names.move_to_end(key)
+        return cached[1]
+
+    if kind == "user":
+        target = guild.get_member(target_id)
+        name = target.display_name if target else None
+    else:
+        target = guild.get_channel(target_id)
+        name = target.name if target else None
+
+    _mention_names[key] = (now + _MENTION_CACHE_TTL, name)
+    _mention_names.move_to_end(key)
+    while len(_mention_names) > _MENTION_CACHE_SIZE:
+        _mention_names.popitem(last=False)
+    return name
+
+
+def _replace_mentions(text: str, guild) -> str:
+    def channel_text(match: re.Match, channel_id: str) -> str:
+        name = _lookup_mention_name(guild, "channel", int(channel_id))
+        return f"，在 {name} 頻道中，" if name is not None else match.group(0)
+
+    def replace(match: re.Match) -> str:
+        user_id, channel_id = match.groups()
+        if channel_id is not None:
+            return channel_text(match, channel_id)
+
+        name = _lookup_mention_name(guild, "user", int(user_id))
+        if name is None:
+            return match.group(0)
+        # 與先替換使用者、再替換頻道的結果一致：名稱中的頻道提及同樣會被替換
+        if "<#" in name:
+            name = _CHANNEL_MENTION_PATTERN.sub(lambda m: channel_text(m, m.group(1)), name)
+        return f"，提及 {name} 用戶，"
+
+    return _MENTION_PATTERN.sub(replace, text)
+
+
+def _insert_commas_for_long_text(text: str, limit: int = _LONG_CLAUSE_LIMIT) -> str:
+    segments = _CLAUSE_SPLIT_PATTERN.split(text)
+    if not any(len(seg) >= limit and seg.strip() for seg in segments):
+        return text
+    return "".join(
+        "，".join(seg[i : i + limit] for i in range(0, len(seg), limit)) if len(seg) >= limit else seg
+        for seg in segments
+    )
 
 
 def preprocess_text(text: str, message: Message = None) -> str:
@@ -32,77 +130,35 @@ def preprocess_text(text: str, message: Message = None) -> str:
     Returns:
         str: 預處理後的文本
     """
-
-    if message:
-        # 替換提及用戶
-        def replace_user_mention(match: re.Match) -> str:
-            user_id = int(match.group(1))
-            user = message.guild.get_member(user_id)
-
-            return f"，提及 {user.display_name} 用戶，" if user else match.group(0)
-
-        text = re.sub(r"<@!?(\d+)>", replace_user_mention, text)
-
-        # 替換提及頻道
-        def replace_channel_mention(match: re.Match) -> str:
-            channel_id = int(match.group(1))
-            channel = message.guild.get_channel(channel_id)
-
-            return f"，在 {channel.name} 頻道中，" if channel else match.group(0)
-
-        text = re.sub(r"<#(\d+)>", replace_channel_mention, text)
-
-    # 移除Markdown特殊字符和格式符號
-    def replace_other_chars(t: str) -> str:
-        # 移除Markdown標題
-        t = re.sub(r"#*", "", t)
-        # 移除Markdown列表項目
-        t = re.sub(r"\*", "", t)
-        # 移除Markdown鏈接
-        t = re.sub(r"\[.*?]\(.*?\)", "", t)
-        # 移除多餘的空格和換行符
-        t = t.replace("\n", " ").strip()
-        # 移除連結
-        t = re.sub(r"https?://\S+", "", t)
-        # 移除Discord表情符號
-        t = re.sub(r"<a?:\w+:\d+>", "", t)
-
-        return t
-
-    def insert_commas_for_long_text(t, limit=200):
-        segments = re.split(r"(?<=[。！？，])", t)
-        processed_segments = []
-        for seg in segments:
-            if not seg:
-                continue
-            if len(seg) >= limit:
-                sub_chunks = [seg[i : i + limit] for i in range(0, len(seg), limit)]
-                new_seg = "，".join(sub_chunks)
-                processed_segments.append(new_seg)
-            else:
-                processed_segments.append(seg)
-        return "".join(processed_segments)
-
-    text = replace_other_chars(text)
-    if [
-        i
-        for i in [c for c in re.split(r"(?<=[。！？，])", text) if c.strip()]
-        if len(i) >= 200
-    ]:
-        text = insert_commas_for_long_text(text)
+    if message and "<" in text:
+        text = _replace_mentions(text, message.guild)
+
+    # 移除Markdown標題與列表符號
+    text = text.translate(_MARKDOWN_CHARS)
+    # 移除Markdown鏈接 (需在換行符號被替換前進行，鏈接不跨行)
+    if "[" in text:
+        text = _MARKDOWN_LINK_PATTERN.sub("", text)
+    # 移除多餘的空格和換行符
+    text = text.replace("\n", " ").strip()
+    # 移除連結與Discord表情符號 (在 strip 之後，保留移除後留下的空格)
+    if ":" in text:
+        text = _URL_OR_EMOJI_PATTERN.sub("", text)
+
+    if len(text) >= _LONG_CLAUSE_LIMIT:
+        text = _insert_commas_for_long_text(text)
     return text
 
 
-def split_text_into_chunks(text: str, chunk_size: int = 2) -> list:
+def split_sentences(text: str) -> list:
     """
-    將文本分割為多個文本塊，每個文本塊包含指定數量的句子
+    將文本依句尾標點與換行切分為句子
     Args:
-        text (str): 要分割的文本
-        chunk_size (int): 每個文本塊包含的句子數
+        text (str): 要切分的文本
+
     Returns:
-        list: 包含多個文本塊的列表
+        list: 去除前後空白後的句子 (保留句尾標點)
     """
-    raw_sentences = re.split(r"([。！？!?\n])", text)
+    raw_sentences = _SENTENCE_SPLIT_PATTERN.split(text)
     sentences = []
     for i in range(0, len(raw_sentences) - 1, 2):
         s = raw_sentences[i] + raw_sentences[i + 1]
@@ -112,17 +168,473 @@ def split_text_into_chunks(text: str, chunk_size: int = 2) -> list:
         last_piece = raw_sentences[-1].strip()
         if last_piece:
             sentences.append(last_piece)
+    return sentences
+
+
+def _fit_sentence(sentence: str, max_chars: int) -> list:
+    # 超過預算的長句在逗號等停頓處切開，找不到停頓處的部分維持原樣
+    if len(sentence) <= max_chars:
+        return [sentence]
+    pieces = []
+    current = ""
+    for clause in _CLAUSE_BREAK_PATTERN.split(sentence):
+        if current and len(current) + len(clause) > max_chars:
+            pieces.append(current.strip())
+            current = clause
+        else:
+            current += clause
+    if current.strip():
+        pieces.append(current.strip())
+    return pieces
+
+
+def split_text_into_chunks(
+    text: str,
+    max_chars: int = TTS_CHUNK_MAX_CHARS,
+    first_chunk_chars: int = TTS_FIRST_CHUNK_MAX_CHARS,
+) -> list:
+    """
+    將文本分割為多個文本塊，每個文本塊在字數預算內盡量裝入多個句子
+
+    短句會合併為一次請求，避免每個短句各花一次來回；
+    超過預算的長句會在逗號處切開。文本塊送出後由伺服器依 text_split_method
+    再切分並以 batch_size 批次推論，因此預算應依實測的伺服器吞吐量調整。
+    Args:
+        text (str): 要分割的文本
+        max_chars (int): 每個文本塊的字數預算
+        first_chunk_chars (int): 第一個文本塊的字數預算，較小的值可讓串流播放更快開始；
+            0 表示與 max_chars 相同
+
+    Returns:
+        list: 包含多個文本塊的列表
+    """
+    sentences = split_sentences(text)
     if not sentences:
         return [text] if text.strip() else []
+
     chunks = []
-    for i in range(0, len(sentences), chunk_size):
-        group = sentences[i : i + chunk_size]
-        chunks.append(" ".join(group))
+    current = ""
+    for sentence in sentences:
+        for piece in _fit_sentence(sentence, max_chars):
+            budget = first_chunk_chars if first_chunk_chars and not chunks else max_chars
+            if current and len(current) + 1 + len(piece) > budget:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
     return chunks
 
 
+def build_tts_payload(
+    chunk: str,
+    character_sample: dict,
+    streaming_mode: bool = False,
+    tier: Optional[QualityTier] = None,
+) -> dict:
+    """
+    建立送往TTS API的請求內容
+    Args:
+        chunk (str): 要轉換的文本塊
+        character_sample (dict): 角色語音樣本 (包含 file 與 text)
+        streaming_mode (bool): 是否要求伺服器以串流方式回傳音訊
+        tier (QualityTier): 合成品質層級，預設為目前負載對應的層級
+
+    Returns:
+        dict: 請求內容
+    """
+    tier = tier or load_monitor.tier
+    audio_path = str(Path(VOICE_DIR).joinpath(character_sample["file"]).as_posix())
+    return {
+        "text": chunk,
+        "text_lang": "zh",
+        "ref_audio_path": audio_path,
+        "aux_ref_audio_paths": [audio_path],
+        "prompt_lang": "zh",
+        "prompt_text": character_sample["text"],
+        "top_k": 5,
+        "top_p": 1,
+        "temperature": 1,
+        "text_split_method": "cut5",
+        "batch_size": TTS_BATCH_SIZE,
+        "batch_threshold": 0.75,
+        "split_bucket": True,
+        "speed_factor": tier.speed_factor,
+        "fragment_interval": 0.3,
+        "seed": -1,
+        "media_type": "wav",
+        "streaming_mode": streaming_mode,
+        "parallel_infer": True,
+        "repetition_penalty": 1.35,
+        "sample_steps": tier.sample_steps,
+        "super_sampling": tier.super_sampling,
+    }
+
+
+async def request_chunk_audio(
+    chunk: str, character_sample: dict, tier: Optional[QualityTier] = None
+) -> bytes:
+    """
+    向TTS API請求單一文本塊的語音
+    Args:
+        chunk (str): 要轉換的文本塊
+        character_sample (dict): 角色語音樣本
+        tier (QualityTier): 合成品質層級
+
+    Returns:
+        bytes: 伺服器回傳的 wav 音訊
+    """
+    logger.info(f"Sending TTS request for chunk: {chunk}")
+    data = build_tts_payload(chunk, character_sample, tier=tier)
+    logger.debug(data)
+    started = time.monotonic()
+    async with backend_pool.post(character_sample.get("name"), data) as response:
+        if response.status != 200:
+            resp_text = await response.text()
+            logger.error(f"TTS API請求失敗: {response.status}, {resp_text}")
+            raise TTSHTTPError(f"TTS API請求失敗: {response.status}", response.status)
+        content = await response.read()
+    load_monitor.record_latency(time.monotonic() - started)
+    return content
+
+
+async def chunk_cache_key(chunk: str, character_sample: dict, tier: Optional[QualityTier] = None) -> str:
+    """
+    計算文本塊在語音快取中的鍵，參考語音第一次使用時在執行緒中計算雜湊
+    Args:
+        chunk (str): 要轉換的文本塊
+        character_sample (dict): 角色語音樣本
+        tier (QualityTier): 合成品質層級，不同層級的語音分開快取
+
+    Returns:
+        str: 快取鍵
+    """
+    params = build_tts_payload(chunk, character_sample, tier=tier)
+    audio_path = params.pop("ref_audio_path")
+    for field in ("text", "aux_ref_audio_paths", "streaming_mode"):
+        params.pop(field)
+    return tts_cache.make_key(
+        chunk, character_sample.get("name"), await sample_fingerprint_async(audio_path), params
+    )
+
+
+async def fetch_chunk_audio(chunk: str, character_sample: dict) -> bytes:
+    """
+    取得單一文本塊的語音，優先使用快取，未命中時才向TTS API請求 (套用逾時、重試與斷路器)，
+    同時進行的相同請求只會送出一次
+    Args:
+        chunk (str): 要轉換的文本塊
+        character_sample (dict): 角色語音樣本
+
+    Returns:
+        bytes: wav 音訊
+    """
+    # 同一個文本塊的快取鍵與請求使用同一個品質層級
+    tier = load_monitor.tier
+    key = await chunk_cache_key(chunk, character_sample, tier)
+    cached = await tts_cache.get(key)
+    if cached is not None:
+        logger.debug(f"TTS cache hit for chunk: {chunk}")
+        return cached
+
+    async def synthesize() -> bytes:
+        async with tts_concurrency:
+            content = await tts_resilience.call(
+                lambda: request_chunk_audio(chunk, character_sample, tier), limiter=tts_concurrency
+            )
+        await tts_cache.put(key, content, character_sample.get("name"))
+        return content
+
+    # 同一個文本塊已在合成中時 (例如多人同時洗同一句話) 直接等待同一個請求
+    return await chunk_flights.do(key, synthesize)
+
+
+async def stream_chunk_pcm(
+    chunk: str, character_sample: dict, tier: Optional[QualityTier] = None
+) -> AsyncIterator[PCMChunk]:
+    """
+    以 streaming_mode 向TTS API請求單一文本塊，並在 HTTP 回應仍在傳輸時逐段產出 PCM
+
+    伺服器會先送出 wav 標頭，之後的資料皆為原始 PCM。
+    等待回應與每段資料的間隔以 tts_resilience.timeout() 為上限，卡住的後端不會一直佔用併發名額。
+    已播放的部分無法重送，因此只在產出任何音訊之前重試，也不送出對沖請求。
+    Args:
+        chunk (str): 要轉換的文本塊
+        character_sample (dict): 角色語音樣本
+        tier (QualityTier): 合成品質層級
+
+    Yields:
+        PCMChunk: 已接收到的 PCM 資料
+    """
+    logger.info(f"Sending streaming TTS request for chunk: {chunk}")
+    data = build_tts_payload(chunk, character_sample, streaming_mode=True, tier=tier)
+    logger.debug(data)
+    attempt = 0
+    while True:
+        yielded = False
+        started = time.monotonic()
+        try:
+            async with tts_concurrency, tts_resilience.guard(), backend_pool.post(
+                character_sample.get("name"), data, read_timeout=tts_resilience.timeout()
+            ) as response:
+                if response.status != 200:
+                    resp_text = await response.text()
+                    logger.error(f"TTS API請求失敗: {response.status}, {resp_text}")
+                    raise TTSHTTPError(f"TTS API請求失敗: {response.status}", response.status)
+
+                header = b""
+                fmt = None
+                async for piece in response.content.iter_any():
+                    if fmt is None:
+                        header += piece
+                        parsed = parse_wav_header(header)
+                        if parsed is None:
+                            continue
+                        fmt, offset = parsed
+                        piece = header[offset:]
+                        # 串流模式以收到第一段音訊的時間作為請求延遲
+                        load_monitor.record_latency(time.monotonic() - started)
+                    if piece:
+                        yielded = True
+                        yield PCMChunk(piece, fmt)
+            return
+        except Exception as e:
+            if yielded or not is_retryable(e) or attempt >= tts_resilience.retries:
+                raise
+            delay = tts_resilience.backoff(attempt)
+            attempt += 1
+            logger.warning(f"Streaming TTS request failed ({e!r}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+async def stream_chunks(
+    chunks: list, character_sample: dict, max_parallel: int = TTS_MAX_PARALLEL_CHUNKS
+) -> AsyncIterator[bytes]:
+    """
+    並行合成多個文本塊，並依原本的順序逐一產出每個文本塊的 wav 音訊
+
+    前面的文本塊完成後會立即產出，不需等待後面的文本塊。
+    任一文本塊失敗時，會取消其餘尚未完成的請求並拋出該錯誤；
+    提前關閉產生器同樣會取消尚未完成的請求。
+    Args:
+        chunks (list): 文本塊列表
+        character_sample (dict): 角色語音樣本
+        max_parallel (int): 同時進行的請求數上限
+
+    Yields:
+        bytes: 每個文本塊的 wav 音訊
+    """
+    semaphore = asyncio.Semaphore(max(1, max_parallel))
+
+    async def request(chunk: str) -> bytes:
+        async with semaphore:
+            return await fetch_chunk_audio(chunk, character_sample)
+
+    tasks = [asyncio.create_task(request(chunk)) for chunk in chunks]
+    try:
+        for task in tasks:
+            while not task.done():
+                await asyncio.wait(
+                    [t for t in tasks if not t.done()],
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                # 任何一個文本塊失敗都應立即中止，而非等到輪到它時才發現
+                for finished in tasks:
+                    if finished.done() and not finished.cancelled() and finished.exception():
+                        raise finished.exception()
+            yield task.result()
+    except Exception as e:
+        logger.error(f"TTS API請求異常: {e}")
+        raise
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def stream_pcm(
+    chunks: list, character_sample: dict, streaming_mode: bool = TTS_STREAMING_MODE
+) -> AsyncIterator[PCMChunk]:
+    """
+    依序產出所有文本塊的 PCM 音訊
+    Args:
+        chunks (list): 文本塊列表
+        character_sample (dict): 角色語音樣本
+        streaming_mode (bool): 是否使用伺服器的串流模式；
+            開啟時逐塊串流接收，否則並行合成完整的文本塊
+
+    Yields:
+        PCMChunk: PCM 音訊
+    """
+    if streaming_mode:
+        for chunk in chunks:
+            tier = load_monitor.tier
+            key = await chunk_cache_key(chunk, character_sample, tier)
+            cached = await tts_cache.get(key)
+            if cached is not None:
+                yield decode_wav(cached)
+                continue
+
+            frames = bytearray()
+            fmt = None
+            async for piece in stream_chunk_pcm(chunk, character_sample, tier):
+                frames += piece.frames
+                fmt = piece.fmt
+                yield piece
+            if fmt is not None:
+                content = encode_wav(PCMChunk(frames, fmt))
+                await tts_cache.put(key, content, character_sample.get("name"))
+        return
+
+    stream = stream_chunks(chunks, character_sample)
+    try:
+        async for content in stream:
+            yield decode_wav(content)
+    finally:
+        await stream.aclose()
+
+
+async def speaker_prefix_audio(prefix: str, character_sample: dict) -> PCMChunk:
+    """
+    取得說話者前綴 (例如 "<名稱> 說:") 的 PCM 音訊
+
+    每個 (前綴, 角色) 只會合成一次，解碼後的結果保留在記憶體 LRU 中，
+    之後直接在 PCM 層接在內文音訊前面。
+    Args:
+        prefix (str): 前綴文本
+        character_sample (dict): 角色語音樣本
+
+    Returns:
+        PCMChunk: 前綴的 PCM 音訊
+    """
+    prefix = preprocess_text(prefix)
+    key = await chunk_cache_key(prefix, character_sample)
+    cached = _prefix_audio.get(key)
+    if cached is not None:
+        _prefix_audio.move_to_end(key)
+        return cached
+
+    chunk = decode_wav(await fetch_chunk_audio(prefix, character_sample))
+    _prefix_audio[key] = chunk
+    while len(_prefix_audio) > TTS_PREFIX_CACHE_SIZE:
+        _prefix_audio.popitem(last=False)
+    return chunk
+
+
+async def prepend_audio(
+    head: Callable[[], Awaitable[PCMChunk]], body: AsyncIterator[PCMChunk]
+) -> AsyncIterator[PCMChunk]:
+    """
+    在串流音訊前接上一段音訊，兩者會在開始迭代時同時開始合成
+
+    開頭音訊以無參數的函式傳入，在產生器內才建立，
+    從未播放就被捨棄的串流 (例如被排程器拒絕或清除) 不會留下未等待的協程。
+    Args:
+        head: 產生開頭音訊的無參數函式
+        body: 內文音訊串流
+
+    Yields:
+        PCMChunk: 先產出開頭音訊，再依序產出內文音訊
+    """
+    head_task = asyncio.ensure_future(head())
+    first_task = asyncio.ensure_future(body.__anext__())
+    try:
+        yield await head_task
+        try:
+            yield await first_task
+        except StopAsyncIteration:
+            return
+        async for piece in body:
+            yield piece
+    finally:
+        for task in (head_task, first_task):
+            task.cancel()
+        await asyncio.gather(head_task, first_task, return_exceptions=True)
+        await body.aclose()
+
+
+async def synthesize_chunks(
+    chunks: list, character_sample: dict, max_parallel: int = TTS_MAX_PARALLEL_CHUNKS
+) -> list:
+    """
+    並行合成多個文本塊，並依原本的順序回傳結果
+    Args:
+        chunks (list): 文本塊列表
+        character_sample (dict): 角色語音樣本
+        max_parallel (int): 同時進行的請求數上限
+
+    Returns:
+        list: 與 chunks 順序相同的 PCMChunk 列表
+    """
+    # 只解析 wav 標頭，PCM 資料直接引用伺服器回傳的內容
+    return [
+        decode_wav(content)
+        async for content in stream_chunks(chunks, character_sample, max_parallel)
+    ]
+
+
+def resolve_character_sample(character: str) -> dict:
+    """
+    取得角色的語音樣本
+    Args:
+        character (str): 語音角色
+
+    Returns:
+        dict: 角色語音樣本 (包含 file、text 與角色名稱 name)
+
+    Raises:
+        ValueError: 角色不存在
+    """
+    character_content = character_registry.get(character)
+
+    if not character_content:
+        raise ValueError(f"角色 '{character}' 不存在")
+
+    return {**character_content, "name": character}
+
+
+async def text_to_speech_stream(
+    text: str,
+    character: str,
+    message: Message = None,
+    is_preprocess: bool = False,
+    prefix: Optional[str] = None,
+) -> AsyncIterator[PCMChunk]:
+    """
+    以串流模式將文本轉換為語音
+
+    角色會在呼叫時立即檢查，實際的語音合成則在開始迭代時才進行，
+    播放端可以在後面的文本塊仍在合成時先播放第一段。
+    Args:
+        text (str): 要轉換的文本
+        character (str): 語音角色
+        message: Discord消息對象，用於獲取用戶和頻道名稱
+        is_preprocess (bool): 文本是否已經過預處理
+        prefix (str): 說話者前綴 (例如 "<名稱> 說:")，會單獨合成並快取後接在內文前
+
+    Returns:
+        AsyncIterator[PCMChunk]: 依序產出 PCM 音訊的非同步迭代器
+
+    Raises:
+        ValueError: 角色不存在
+    """
+    preprocessed_text = text if is_preprocess else preprocess_text(text, message)
+    chunks = split_text_into_chunks(preprocessed_text)
+    character_sample = resolve_character_sample(character)
+
+    body = stream_pcm(chunks, character_sample)
+    if prefix:
+        return prepend_audio(lambda: speaker_prefix_audio(prefix, character_sample), body)
+    return body
+
+
 async def text_to_speech(
-    text: str, character: str, message: Message = None, is_preprocess: bool = False
+    text: str,
+    character: str,
+    message: Message = None,
+    is_preprocess: bool = False,
+    prefix: Optional[str] = None,
 ) -> bytes:
     """
     與TTS API互動的函數
@@ -150,91 +662,21 @@ async def text_to_speech(
         text (str): 要轉換的文本
         character (str): 語音角色
         message: Discord消息對象，用於獲取用戶和頻道名稱
+        is_preprocess (bool): 文本是否已經過預處理
+        prefix (str): 說話者前綴 (例如 "<名稱> 說:")，會單獨合成並快取後接在內文前
     """
     preprocessed_text = text if is_preprocess else preprocess_text(text, message)
     chunks = split_text_into_chunks(preprocessed_text)
 
-    sample_data = load_sample_data()
-    user_voice_dict = load_sample_data(USER_VOICE_SETTINGS_FILE)
-    character_content = get_samples_by_character(
-        character, sample_data, user_voice_dict
-    )
+    character_sample = resolve_character_sample(character)
 
-    if not character_content:
-        raise ValueError(f"角色 '{character}' 不存在")
+    if prefix:
+        prefix_chunk, pcm_chunks = await asyncio.gather(
+            speaker_prefix_audio(prefix, character_sample),
+            synthesize_chunks(chunks, character_sample),
+        )
+        pcm_chunks = [prefix_chunk, *pcm_chunks]
+    else:
+        pcm_chunks = await synthesize_chunks(chunks, character_sample)
 
-    character_sample = character_content
-    audio_segments = []
-
-    time_out = ClientTimeout(total=1200)
-    async with ClientSession(timeout=time_out) as session:
-        for chunk in chunks:
-            try:
-                logger.info(f"Sending TTS request for chunk: {chunk}")
-                audio_path = str(
-                    Path(VOICE_DIR)
-                    .joinpath(character_sample["file"])
-                    .as_posix()
-                )
-                data = {
-                    "text": chunk,
-                    "text_lang": "zh",
-                    "ref_audio_path": audio_path,
-                    "aux_ref_audio_paths": [audio_path],
-                    "prompt_lang": "zh",
-                    "prompt_text": character_sample["text"],
-                    "top_k": 5,
-                    "top_p": 1,
-                    "temperature": 1,
-                    "text_split_method": "cut5",
-                    "batch_size": 1,
-                    "batch_threshold": 0.75,
-                    "split_bucket": True,
-                    "speed_factor": 1,
-                    "fragment_interval": 0.3,
-                    "seed": -1,
-                    "media_type": "wav",
-                    "streaming_mode": False,
-                    "parallel_infer": True,
-                    "repetition_penalty": 1.35,
-                    "sample_steps": 32,
-                    "super_sampling": False,
-                }
-                logger.debug(data)
-                async with session.post(
-                    TTS_API_URL, json=data
-                ) as response:
-                    if response.status == 200:
-                        content = await response.read()
-
-                        # AudioSegment.from_file 是阻塞操作，建議在 thread 中執行
-                        def process_audio(data_bytes):
-                            return AudioSegment.from_file(
-                                io.BytesIO(data_bytes), format="wav"
-                            )
-
-                        audio_segment = await asyncio.to_thread(process_audio, content)
-                        audio_segments.append(audio_segment)
-                    else:
-                        resp_text = await response.text()
-                        logger.error(
-                            f"TTS API請求失敗: {response.status}, {resp_text}"
-                        )
-                        raise Exception(f"TTS API請求失敗: {response.status}")
-
-            except Exception as e:
-                logger.error(f"TTS API請求異常: {e}")
-                raise e
-
-    if not audio_segments:
-        return b""
-
-    def finalize_audio(segments):
-        combined = sum(segments, AudioSegment.empty())
-        out_buf = io.BytesIO()
-        combined.export(out_buf, format="wav")
-        return out_buf.getvalue()
-
-    combined_audio_bytes = await asyncio.to_thread(finalize_audio, audio_segments)
-
-    return combined_audio_bytes
+    return await asyncio.to_thread(build_wav, pcm_chunks)
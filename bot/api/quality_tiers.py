@@ -0,0 +1,132 @@
+import time
+from typing import NamedTuple, Optional
+
+from config import (
+    TTS_ADAPTIVE_QUALITY,
+    TTS_ADAPTIVE_BACKLOG_THRESHOLDS,
+    TTS_ADAPTIVE_LATENCY_THRESHOLDS,
+)
+from utils.logger import logger
+
+
+class QualityTier(NamedTuple):
+    name: str
+    speed_factor: float
+    sample_steps: int
+    super_sampling: bool
+
+
+# 由高品質到高速度排列，第一個為平時使用的設定
+QUALITY_TIERS = (
+    QualityTier("full", 1.0, 32, False),
+    QualityTier("fast", 1.15, 16, False),
+    QualityTier("rush", 1.3, 8, False),
+)
+
+# 指標降到門檻的這個比例以下才會回到較高品質，避免在門檻附近反覆切換
+_HYSTERESIS = 0.75
+# 延遲的指數移動平均權重
+_LATENCY_ALPHA = 0.3
+
+
+class LoadMonitor:
+    """
+    依播放排程積壓與 TTS 後端延遲選擇合成品質
+
+    積壓或延遲超過門檻時提高語速並降低取樣步數，讓佇列更快消化；
+    負載下降後逐級回到完整品質。
+
+    Attributes:
+        enabled (bool): 是否啟用自動調整，停用時一律使用完整品質
+        backlog_thresholds (list[int]): 進入各降級層級的排隊語音數門檻
+        latency_thresholds (list[float]): 進入各降級層級的平均請求延遲門檻 (秒)
+    """
+
+    def __init__(
+        self,
+        enabled: bool = TTS_ADAPTIVE_QUALITY,
+        backlog_thresholds: Optional[list] = None,
+        latency_thresholds: Optional[list] = None,
+        tiers: tuple = QUALITY_TIERS,
+    ):
+        self.enabled = enabled
+        self.backlog_thresholds = list(
+            TTS_ADAPTIVE_BACKLOG_THRESHOLDS if backlog_thresholds is None else backlog_thresholds
+        )
+        self.latency_thresholds = list(
+            TTS_ADAPTIVE_LATENCY_THRESHOLDS if latency_thresholds is None else latency_thresholds
+        )
+        self.tiers = tiers
+        self.latency: Optional[float] = None
+        self._backlogs: dict[int, int] = {}
+        self._level = 0
+        self._changed_at = time.monotonic()
+
+    @property
+    def backlog(self) -> int:
+        return max(self._backlogs.values(), default=0)
+
+    @property
+    def tier(self) -> QualityTier:
+        return self.tiers[self._level]
+
+    def report_backlog(self, guild_id: int, depth: int):
+        """
+        回報伺服器目前排隊的語音數
+        """
+        if depth:
+            self._backlogs[guild_id] = depth
+        else:
+            self._backlogs.pop(guild_id, None)
+        self._update()
+
+    def record_latency(self, seconds: float):
+        """
+        記錄一次 TTS 請求的耗時
+        """
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += _LATENCY_ALPHA * (seconds - self.latency)
+        self._update()
+
+    def stats(self) -> dict:
+        """
+        取得目前的負載與品質層級
+        """
+        return {
+            "tier": self.tier.name,
+            "level": self._level,
+            "backlog": self.backlog,
+            "latency": self.latency,
+            "tier_age": time.monotonic() - self._changed_at,
+        }
+
+    def _update(self):
+        if not self.enabled:
+            return
+        level = max(
+            self._level_for(self.backlog, self.backlog_thresholds),
+            self._level_for(self.latency or 0.0, self.latency_thresholds),
+        )
+        level = min(level, len(self.tiers) - 1)
+        if level != self._level:
+            previous = self.tier
+            self._level = level
+            self._changed_at = time.monotonic()
+            logger.info(
+                f"TTS quality tier {previous.name} -> {self.tier.name} "
+                f"(backlog={self.backlog}, latency={self.latency or 0.0:.2f}s)"
+            )
+
+    def _level_for(self, value: float, thresholds: list) -> int:
+        level = 0
+        for i, threshold in enumerate(thresholds, start=1):
+            # 已經在這個層級以上時，需降到門檻的一定比例以下才會離開
+            limit = threshold * _HYSTERESIS if self._level >= i else threshold
+            if value >= limit:
+                level = i
+        return level
+
+
+load_monitor = LoadMonitor()
@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from urllib.parse import urljoin
+
+from aiohttp import ClientConnectionError, ClientResponse, ClientTimeout
+
+from bot.api.tts_client import TTSClient, tts_client
+from config import (
+    TTS_API_URLS,
+    TTS_HEALTH_PATH,
+    TTS_HEALTH_INTERVAL,
+    TTS_HEALTH_TIMEOUT,
+    TTS_BACKEND_STICKY_SLACK,
+)
+from utils.logger import logger
+
+
+class Backend:
+    """
+    單一 TTS 後端的狀態
+
+    Attributes:
+        url (str): TTS API 網址
+        healthy (bool): 最近一次請求或健康檢查是否成功
+        outstanding (int): 正在進行中的請求數
+        last_error (str): 最近一次失敗的原因
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.changed_at = time.monotonic()
+
+    def weight(self, character: Optional[str]) -> int:
+        """
+        角色對這個後端的親和度 (rendezvous hashing)，後端增減時其他角色的對應不受影響
+        """
+        digest = hashlib.sha1(f"{character}|{self.url}".encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big")
+
+
+class BackendPool:
+    """
+    多個 GPT-SoVITS 後端的負載平衡
+
+    同一個角色固定優先送往同一個後端，讓該後端的參考語音快取保持有效；
+    該後端的進行中請求數比最空閒的後端多出 sticky_slack 以上時，改送往最空閒的後端。
+    連線失敗或回應 5xx 的後端會被標記為異常並自動改用下一個後端，
+    異常的後端由定期的健康檢查或下一次成功的請求恢復。
+
+    Attributes:
+        backends (list[Backend]): 所有後端
+        health_path (str): 健康檢查路徑 (相對於 TTS API 網址)，空字串表示不進行健康檢查
+        health_interval (float): 健康檢查間隔秒數
+        health_timeout (float): 健康檢查逾時秒數
+        sticky_slack (int): 允許固定後端比最空閒後端多出的進行中請求數
+    """
+
+    def __init__(
+        self,
+        urls: list = TTS_API_URLS,
+        client: TTSClient = tts_client,
+        health_path: str = TTS_HEALTH_PATH,
+        health_interval: float = TTS_HEALTH_INTERVAL,
+        health_timeout: float = TTS_HEALTH_TIMEOUT,
+        sticky_slack: int = TTS_BACKEND_STICKY_SLACK,
+    ):
+        if not urls:
+            raise ValueError("at least one TTS backend is required")
+        self.backends = [Backend(url) for url in urls]
+        self.client = client
+        self.health_path = health_path
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.sticky_slack = sticky_slack
+        self._health_task: Optional[asyncio.Task] = None
+
+    def candidates(self, character: Optional[str]) -> list:
+        """
+        依優先順序排列可用的後端
+        Args:
+            character: 語音角色
+
+        Returns:
+            list[Backend]: 正常的後端在前 (固定後端優先，其餘依進行中請求數)，異常的後端在最後
+        """
+        healthy = [b for b in self.backends if b.healthy]
+        unhealthy = [b for b in self.backends if not b.healthy]
+        if not healthy:
+            return sorted(unhealthy, key=lambda b: b.outstanding)
+
+        sticky = max(healthy, key=lambda b: b.weight(character))
+        least = min(b.outstanding for b in healthy)
+        others = sorted((b for b in healthy if b is not sticky), key=lambda b: b.outstanding)
+        if sticky.outstanding - least > self.sticky_slack:
+            ordered = others[:1] + [sticky] + others[1:]
+        else:
+            ordered = [sticky] + others
+        return ordered + sorted(unhealthy, key=lambda b: b.outstanding)
+
+    @asynccontextmanager
+    async def post(
+        self, character: Optional[str], payload: dict, read_timeout: Optional[float] = None
+    ) -> AsyncIterator[ClientResponse]:
+        """
+        將請求送往最合適的後端，連線失敗或回應 5xx 時自動改用下一個後端
+        Args:
+            character: 語音角色，用於選擇固定的後端
+            payload: 請求內容
+            read_timeout: 等待回應標頭與每段回應資料的逾時秒數，未指定時只套用連線池的總逾時
+
+        Yields:
+            ClientResponse: 後端的回應 (最後一個後端的 5xx 回應也會原樣交給呼叫端)
+        """
+        candidates = self.candidates(character)
+        options = {}
+        if read_timeout is not None:
+            session_timeout = self.client.session.timeout
+            options["timeout"] = ClientTimeout(total=session_timeout.total, sock_read=read_timeout)
+        for index, backend in enumerate(candidates):
+            is_last = index == len(candidates) - 1
+            yielded = False
+            backend.outstanding += 1
+            backend.requests += 1
+            try:
+                async with self.client.session.post(backend.url, json=payload, **options) as response:
+                    if response.status >= 500 and not is_last:
+                        self._mark_down(backend, f"HTTP {response.status}")
+                        continue
+                    if response.status < 500:
+                        self._mark_up(backend)
+                    yielded = True
+                    yield response
+                    return
+            except (ClientConnectionError, asyncio.TimeoutError) as e:
+                if yielded:
+                    raise
+                self._mark_down(backend, repr(e))
+                if is_last:
+                    raise
+            finally:
+                backend.outstanding -= 1
+
+    async def check_health(self):
+        """
+        對所有後端進行一次健康檢查
+        """
+        if not self.health_path:
+            return
+        await asyncio.gather(*(self._probe(backend) for backend in self.backends))
+
+    async def start(self):
+        """
+        開始定期健康檢查
+        """
+        if self.health_path and self.health_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        """
+        停止定期健康檢查
+        """
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+
+    def stats(self) -> list:
+        """
+        取得各後端的狀態
+        """
+        return [
+            {
+                "url": backend.url,
+                "healthy": backend.healthy,
+                "outstanding": backend.outstanding,
+                "requests": backend.requests,
+                "failures": backend.failures,
+                "last_error": backend.last_error,
+            }
+            for backend in self.backends
+        ]
+
+    async def _health_loop(self):
+        while True:
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"TTS backend health check failed: {e}")
+            await asyncio.sleep(self.health_interval)
+
+    async def _probe(self, backend: Backend):
+        url = urljoin(backend.url, self.health_path)
+        try:
+            async with self.client.session.get(
+                url, timeout=ClientTimeout(total=self.health_timeout)
+            ) as response:
+                if response.status < 500:
+                    self._mark_up(backend)
+                else:
+                    self._mark_down(backend, f"health check HTTP {response.status}")
+        except (ClientConnectionError, asyncio.TimeoutError) as e:
+            self._mark_down(backend, f"health check {e!r}")
+
+    @staticmethod
+    def _mark_up(backend: Backend):
+        if not backend.healthy:
+            backend.healthy = True
+            backend.changed_at = time.monotonic()
+            logger.info(f"TTS backend {backend.url} is healthy again")
+
+    @staticmethod
+    def _mark_down(backend: Backend, reason: str):
+        backend.failures += 1
+        backend.last_error = reason
+        if backend.healthy:
+            backend.healthy = False
+            backend.changed_at = time.monotonic()
+            logger.warning(f"TTS backend {backend.url} marked unhealthy: {reason}")
+
+
+backend_pool = BackendPool()
@@ -0,0 +1,332 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from config import (
+    TTS_CACHE_ENABLED,
+    TTS_CACHE_DIR,
+    TTS_CACHE_MEMORY_MB,
+    TTS_CACHE_DISK_MB,
+)
+from utils.logger import logger
+
+_WHITESPACE = re.compile(r"\s+")
+# 參考語音路徑 -> (修改時間, 大小, 雜湊) 的 LRU
+_SAMPLE_FINGERPRINT_CACHE_SIZE = 1024
+_sample_fingerprints: OrderedDict[str, tuple[int, int, str]] = OrderedDict()
+_sample_fingerprints_lock = threading.Lock()
+
+
+def normalize_text(text: str) -> str:
+    """
+    正規化文本，讓只有空白差異的文本使用同一個快取項目
+    """
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def sample_fingerprint(path: str) -> str:
+    """
+    計算參考語音檔案的內容雜湊，並依檔案的修改時間與大小快取結果
+    Args:
+        path: 參考語音檔案路徑
+
+    Returns:
+        str: 檔案內容的 sha256，若檔案不存在則使用路徑本身
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return f"path:{path}"
+
+    fingerprint = _cached_fingerprint(path, stat)
+    if fingerprint is None:
+        fingerprint = _hash_file(path)
+        with _sample_fingerprints_lock:
+            _sample_fingerprints[path] = (stat.st_mtime_ns, stat.st_size, fingerprint)
+            _sample_fingerprints.move_to_end(path)
+            while len(_sample_fingerprints) > _SAMPLE_FINGERPRINT_CACHE_SIZE:
+                _sample_fingerprints.popitem(last=False)
+    return fingerprint
+
+
+async def sample_fingerprint_async(path: str) -> str:
+    """
+    與 sample_fingerprint 相同，但尚未快取的檔案在執行緒中讀取與雜湊，不阻塞事件迴圈
+    Args:
+        path: 參考語音檔案路徑
+
+    Returns:
+        str: 檔案內容的 sha256，若檔案不存在則使用路徑本身
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return f"path:{path}"
+
+    fingerprint = _cached_fingerprint(path, stat)
+    if fingerprint is None:
+        fingerprint = await asyncio.to_thread(sample_fingerprint, path)
+    return fingerprint
+
+
+def _cached_fingerprint(path: str, stat: os.stat_result) -> Optional[str]:
+    # 檔案的修改時間或大小改變時視為未快取，新的雜湊會覆蓋同一路徑的舊項目
+    with _sample_fingerprints_lock:
+        cached = _sample_fingerprints.get(path)
+        if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+            return None
+        _sample_fingerprints.move_to_end(path)
+        return cached[2]
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _tag_of(character: Optional[str]) -> str:
+    return hashlib.sha1(str(character).encode("utf-8")).hexdigest()[:12]
+
+
+class _DiskEntry(NamedTuple):
+    path: str
+    size: int
+    tag: str
+
+
+class TTSCache:
+    """
+    以內容定址的語音合成快取
+
+    快取鍵由正規化後的文本、角色、參考語音雜湊與合成參數組成。
+    分為記憶體 LRU 與有容量上限的硬碟兩層，兩層皆以 LRU 淘汰。
+    硬碟命中時會更新檔案的修改時間，重新啟動後依修改時間重建硬碟層的 LRU 順序。
+
+    Attributes:
+        memory_hits (int): 記憶體命中次數
+        disk_hits (int): 硬碟命中次數
+        misses (int): 未命中次數
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = TTS_CACHE_MEMORY_MB * 1024 * 1024,
+        disk_dir: Optional[str] = TTS_CACHE_DIR,
+        max_disk_bytes: int = TTS_CACHE_DISK_MB * 1024 * 1024,
+        enabled: bool = TTS_CACHE_ENABLED,
+    ):
+        self.enabled = enabled
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory: OrderedDict[str, tuple[bytes, str]] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: Optional[OrderedDict[str, _DiskEntry]] = None
+        self._disk_bytes = 0
+        self._disk_lock = threading.RLock()
+
+    @staticmethod
+    def make_key(text: str, character: Optional[str], sample_hash: str, params: dict) -> str:
+        """
+        產生快取鍵
+        Args:
+            text: 要合成的文本
+            character: 語音角色
+            sample_hash: 參考語音的雜湊
+            params: 其餘合成參數
+
+        Returns:
+            str: 快取鍵
+        """
+        raw = json.dumps(
+            {
+                "text": normalize_text(text),
+                "character": character,
+                "sample": sample_hash,
+                "params": params,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        讀取快取，硬碟命中的項目會提升到記憶體層
+        """
+        if not self.enabled:
+            return None
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return entry[0]
+
+        found = await asyncio.to_thread(self._read_disk, key)
+        if found is not None:
+            data, tag = found
+            self.disk_hits += 1
+            self._put_memory(key, data, tag)
+            return data
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, data: bytes, character: Optional[str] = None):
+        """
+        寫入快取
+        """
+        if not self.enabled or not data:
+            return
+        tag = _tag_of(character)
+        self._put_memory(key, data, tag)
+        await asyncio.to_thread(self._write_disk, key, data, tag)
+
+    async def invalidate_character(self, character: str) -> int:
+        """
+        移除某個角色的所有快取項目 (例如角色的參考語音被修改時)，硬碟上的檔案在執行緒中刪除
+        Args:
+            character: 語音角色
+
+        Returns:
+            int: 移除的項目數
+        """
+        tag = _tag_of(character)
+        removed = 0
+        for key in [k for k, (_, t) in self._memory.items() if t == tag]:
+            data, _ = self._memory.pop(key)
+            self._memory_bytes -= len(data)
+            removed += 1
+
+        removed += await asyncio.to_thread(self._invalidate_disk, tag)
+        if removed:
+            logger.info(f"Invalidated {removed} TTS cache entries for character {character}")
+        return removed
+
+    def stats(self) -> dict:
+        """
+        取得快取統計資料
+        """
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk) if self._disk is not None else 0,
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def _put_memory(self, key: str, data: bytes, tag: str):
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old[0])
+        self._memory[key] = (data, tag)
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _load_disk_index(self) -> OrderedDict:
+        with self._disk_lock:
+            if self._disk is None:
+                self._disk = self._scan_disk()
+            return self._disk
+
+    def _scan_disk(self) -> OrderedDict:
+        index = OrderedDict()
+        self._disk_bytes = 0
+        if not self.disk_dir:
+            return index
+
+        os.makedirs(self.disk_dir, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            name, ext = os.path.splitext(entry.name)
+            if ext != ".wav" or "-" not in name:
+                continue
+            tag, key = name.split("-", 1)
+            stat = entry.stat()
+            files.append((stat.st_mtime_ns, key, _DiskEntry(entry.path, stat.st_size, tag)))
+
+        for _, key, disk_entry in sorted(files, key=lambda f: f[0]):
+            index[key] = disk_entry
+            self._disk_bytes += disk_entry.size
+        return index
+
+    def _read_disk(self, key: str) -> Optional[tuple[bytes, str]]:
+        with self._disk_lock:
+            disk_entry = self._load_disk_index().get(key)
+            if disk_entry is None:
+                return None
+            try:
+                with open(disk_entry.path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                self._remove_disk(key)
+                return None
+            try:
+                # 修改時間記錄最近一次使用，重新啟動後用來恢復 LRU 順序
+                os.utime(disk_entry.path)
+            except OSError:
+                pass
+            self._disk.move_to_end(key)
+            return data, disk_entry.tag
+
+    def _write_disk(self, key: str, data: bytes, tag: str):
+        with self._disk_lock:
+            index = self._load_disk_index()
+            if not self.disk_dir or key in index or len(data) > self.max_disk_bytes:
+                return
+
+            path = os.path.join(self.disk_dir, f"{tag}-{key}.wav")
+            temp_path = f"{path}.tmp"
+            try:
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except OSError as e:
+                logger.error(f"Failed to write TTS cache entry: {e}")
+                return
+
+            index[key] = _DiskEntry(path, len(data), tag)
+            self._disk_bytes += len(data)
+            while self._disk_bytes > self.max_disk_bytes:
+                self._remove_disk(next(iter(index)))
+
+    def _invalidate_disk(self, tag: str) -> int:
+        with self._disk_lock:
+            keys = [k for k, e in self._load_disk_index().items() if e.tag == tag]
+            for key in keys:
+                self._remove_disk(key)
+        return len(keys)
+
+    def _remove_disk(self, key: str):
+        disk_entry = self._disk.pop(key, None)
+        if disk_entry is None:
+            return
+        self._disk_bytes -= disk_entry.size
+        try:
+            os.remove(disk_entry.path)
+        except OSError:
+            pass
+
+
+tts_cache = TTSCache()
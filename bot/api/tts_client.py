@@ -0,0 +1,91 @@
+from typing import Optional
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+from config import (
+    TTS_POOL_LIMIT,
+    TTS_POOL_LIMIT_PER_HOST,
+    TTS_KEEPALIVE_TIMEOUT,
+    TTS_DNS_CACHE_TTL,
+    TTS_REQUEST_TIMEOUT,
+)
+from utils.logger import logger
+
+
+class TTSClient:
+    """
+    TTS 後端共用的 HTTP 客戶端
+
+    整個機器人生命週期內只會建立一個 ClientSession，並透過 TCPConnector 連線池
+    重用 keep-alive 連線，避免每段語音都重新進行 TCP 握手。
+
+    Attributes:
+        limit (int): 連線池的總連線數上限
+        limit_per_host (int): 單一主機的連線數上限
+        keepalive_timeout (float): 閒置連線保留的秒數
+        dns_cache_ttl (int): DNS 快取秒數
+        timeout (float): 單次請求的總逾時秒數
+    """
+
+    def __init__(
+        self,
+        limit: int = TTS_POOL_LIMIT,
+        limit_per_host: int = TTS_POOL_LIMIT_PER_HOST,
+        keepalive_timeout: float = TTS_KEEPALIVE_TIMEOUT,
+        dns_cache_ttl: int = TTS_DNS_CACHE_TTL,
+        timeout: float = TTS_REQUEST_TIMEOUT,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout
+        self._session: Optional[ClientSession] = None
+
+    def _create_session(self) -> ClientSession:
+        connector = TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+        return ClientSession(
+            connector=connector, timeout=ClientTimeout(total=self.timeout)
+        )
+
+    @property
+    def closed(self) -> bool:
+        return self._session is None or self._session.closed
+
+    @property
+    def session(self) -> ClientSession:
+        """
+        取得共用的 ClientSession，若尚未建立或已關閉則重新建立
+
+        Returns:
+            ClientSession: 共用的 HTTP session
+        """
+        if self.closed:
+            self._session = self._create_session()
+        return self._session
+
+    async def start(self):
+        """
+        在機器人啟動時建立連線池
+        """
+        if self.closed:
+            self._session = self._create_session()
+            logger.info("TTS HTTP client started")
+
+    async def close(self):
+        """
+        在機器人關閉時釋放連線池
+        """
+        if not self.closed:
+            await self._session.close()
+            logger.info("TTS HTTP client closed")
+        self._session = None
+
+
+tts_client = TTSClient()
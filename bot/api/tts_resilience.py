@@ -0,0 +1,332 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from aiohttp import ClientError
+
+from bot.utils.rate_limiter import ConcurrencyLimiter
+from config import (
+    TTS_MAX_RETRIES,
+    TTS_RETRY_BASE_DELAY,
+    TTS_RETRY_MAX_DELAY,
+    TTS_HEDGE_ENABLED,
+    TTS_TIMEOUT_MIN,
+    TTS_TIMEOUT_MAX,
+    TTS_TIMEOUT_MULTIPLIER,
+    TTS_BREAKER_THRESHOLD,
+    TTS_BREAKER_COOLDOWN,
+)
+from utils.logger import logger
+
+T = TypeVar("T")
+
+# 觀測到這麼多次請求後才以延遲分位數計算逾時與對沖延遲
+_MIN_SAMPLES = 20
+
+
+class TTSHTTPError(Exception):
+    """
+    TTS API 回應了非 200 的狀態碼
+    """
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitOpenError(Exception):
+    """
+    斷路器開啟中，TTS 後端暫時不接受請求
+    """
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    判斷錯誤是否來自後端異常 (可重試)，而非請求內容本身的問題
+    """
+    if isinstance(error, TTSHTTPError):
+        return error.status >= 500
+    return isinstance(error, (ClientError, asyncio.TimeoutError))
+
+
+class LatencyTracker:
+    """
+    保留最近的請求延遲並計算分位數
+    """
+
+    def __init__(self, size: int = 200):
+        self._samples: deque = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        取得延遲分位數
+        Args:
+            p: 分位數 (0~100)
+
+        Returns:
+            float | None: 延遲秒數，沒有任何紀錄時回傳 None
+        """
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """
+    連續失敗達到門檻時開啟斷路器，在冷卻期間直接拒絕請求；
+    冷卻結束後放行一個試探請求 (半開)，成功則關閉斷路器，失敗則再次開啟。
+
+    Attributes:
+        threshold (int): 開啟斷路器的連續失敗次數，0 表示停用
+        cooldown (float): 開啟後的冷卻秒數
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int = TTS_BREAKER_THRESHOLD, cooldown: float = TTS_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def before_call(self):
+        """
+        請求前檢查斷路器
+
+        Raises:
+            CircuitOpenError: 斷路器開啟中，或半開狀態下已有試探請求在進行
+        """
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._probing):
+            raise CircuitOpenError("TTS 後端暫時無法使用")
+        if state == self.HALF_OPEN:
+            self._probing = True
+
+    def record_success(self):
+        if self._opened_at is not None:
+            logger.info("TTS circuit breaker closed")
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or (self.threshold and self.failures >= self.threshold):
+            if self._opened_at is None or self._probing:
+                logger.warning(f"TTS circuit breaker opened after {self.failures} failures")
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """
+        試探請求沒有得到成功或失敗的結果 (例如被取消) 時，允許下一個請求再次試探
+        """
+        self._probing = False
+
+
+class ResilientCaller:
+    """
+    TTS 請求的容錯層
+
+    - 單次請求的逾時由最近的延遲 p99 乘上倍數計算，並限制在上下限之間
+    - 後端異常時以指數退避加上隨機抖動重試
+    - 啟用對沖時，請求超過 p95 延遲仍未完成便再送出一個相同的請求，採用先完成者；
+      對沖請求同樣佔用併發名額，沒有空閒名額時不送出
+    - 後端連續失敗時由斷路器直接拒絕請求，不再等待逾時
+
+    Attributes:
+        retries (int): 最多重試次數
+        hedge (bool): 是否啟用對沖請求
+        breaker (CircuitBreaker): 斷路器
+        latency (LatencyTracker): 成功請求的延遲紀錄
+    """
+
+    def __init__(
+        self,
+        retries: int = TTS_MAX_RETRIES,
+        base_delay: float = TTS_RETRY_BASE_DELAY,
+        max_delay: float = TTS_RETRY_MAX_DELAY,
+        hedge: bool = TTS_HEDGE_ENABLED,
+        min_timeout: float = TTS_TIMEOUT_MIN,
+        max_timeout: float = TTS_TIMEOUT_MAX,
+        timeout_multiplier: float = TTS_TIMEOUT_MULTIPLIER,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.retried = 0
+        self.hedged = 0
+        self.timeouts = 0
+
+    def timeout(self) -> float:
+        """
+        目前單次請求的逾時秒數，延遲紀錄不足時使用上限
+        """
+        if len(self.latency) < _MIN_SAMPLES:
+            return self.max_timeout
+        p99 = self.latency.percentile(99)
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.timeout_multiplier))
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        送出對沖請求前等待的秒數 (p95 延遲)，未啟用或延遲紀錄不足時回傳 None
+        """
+        if not self.hedge or len(self.latency) < _MIN_SAMPLES:
+            return None
+        return self.latency.percentile(95)
+
+    def backoff(self, attempt: int) -> float:
+        """
+        第 attempt 次失敗後重試前等待的秒數 (指數退避加上隨機抖動)，並計入重試次數
+        """
+        self.retried += 1
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(
+        self, request: Callable[[], Awaitable[T]], limiter: Optional[ConcurrencyLimiter] = None
+    ) -> T:
+        """
+        以容錯機制執行請求
+        Args:
+            request: 每次呼叫都會送出一次新請求的協程函式
+            limiter: 請求所在的併發上限，對沖請求需要另外取得一個空閒名額
+
+        Returns:
+            請求的結果
+
+        Raises:
+            CircuitOpenError: 斷路器開啟中
+            Exception: 重試後仍然失敗，或錯誤不可重試時拋出最後一次的錯誤
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.guard():
+                    return await self._attempt(request, limiter)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.retries:
+                    raise
+                last_error = e
+            delay = self.backoff(attempt)
+            logger.warning(f"TTS request failed ({last_error!r}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """
+        以斷路器保護一次請求，並依結果更新斷路器狀態
+
+        不可重試的錯誤 (例如請求內容有誤) 代表後端仍正常回應，視為成功。
+
+        Raises:
+            CircuitOpenError: 斷路器開啟中
+        """
+        self.breaker.before_call()
+        try:
+            yield
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+            if is_retryable(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        else:
+            self.breaker.record_success()
+
+    def stats(self) -> dict:
+        """
+        取得容錯層的狀態
+        """
+        return {
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "timeout": self.timeout(),
+            "p50": self.latency.percentile(50),
+            "p95": self.latency.percentile(95),
+            "p99": self.latency.percentile(99),
+            "retried": self.retried,
+            "hedged": self.hedged,
+            "timeouts": self.timeouts,
+        }
+
+    async def _attempt(
+        self, request: Callable[[], Awaitable[T]], limiter: Optional[ConcurrencyLimiter] = None
+    ) -> T:
+        timeout = self.timeout()
+        hedge_delay = self.hedge_delay()
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(request())]
+        try:
+            if hedge_delay is not None and hedge_delay < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done:
+                    if limiter is None or await limiter.try_acquire():
+                        self.hedged += 1
+                        logger.debug(f"TTS request slower than p95 ({hedge_delay:.2f}s), sending hedged request")
+                        tasks.append(asyncio.ensure_future(self._hedge(request, limiter)))
+                    else:
+                        logger.debug("No free TTS request slot, skipping hedged request")
+
+            error: Optional[BaseException] = None
+            while tasks:
+                remaining = timeout - (time.monotonic() - started)
+                done, _ = await asyncio.wait(
+                    tasks, timeout=max(0.0, remaining), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError(f"TTS request timed out after {timeout:.1f}s")
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        self.latency.record(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _hedge(request: Callable[[], Awaitable[T]], limiter: Optional[ConcurrencyLimiter]) -> T:
+        try:
+            return await request()
+        finally:
+            if limiter is not None:
+                limiter.release()
+
+
+tts_resilience = ResilientCaller()
@@ -4,12 +4,47 @@ import disnake
 from disnake.ext import commands
 
 import config
+from bot.api.tts_backends import backend_pool
+from bot.api.tts_client import tts_client
+from bot.character_registry import character_registry
+from bot.sqlite_store import sqlite_store
+from bot.user_settings import settings_store
+from bot.utils.audio_queue import audio_queue
 from utils.logger import logger
 
+
+class TTSBot(commands.InteractionBot):
+    """
+    在機器人生命週期內管理共用資源 (例如 TTS 連線池、後端健康檢查、播放引擎、用戶設置與用戶語音) 的 InteractionBot
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.audio_queue = audio_queue
+
+    async def start(self, *args, **kwargs) -> None:
+        await settings_store.load_async()
+        await character_registry.start()
+        await tts_client.start()
+        await backend_pool.start()
+        await super().start(*args, **kwargs)
+
+    async def close(self) -> None:
+        try:
+            await self.audio_queue.close()
+            await super().close()
+        finally:
+            await backend_pool.close()
+            await tts_client.close()
+            await settings_store.close()
+            await character_registry.close()
+            sqlite_store.close()
+
+
 intents = disnake.Intents.default()
 intents.members = True
 intents.message_content = True
-bot = commands.InteractionBot(intents=intents)
+bot = TTSBot(intents=intents)
 
 # 加載命令和事件處理器
 base_path = 'bot'
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+from typing import Optional
+
+from bot.sqlite_store import SQLiteStore, sqlite_store
+from config import USER_DATA_BACKEND, USER_DATA_REFRESH_INTERVAL, USER_VOICE_SETTINGS_FILE
+from utils import file_utils
+from utils.logger import logger
+
+SAMPLE_DATA_FILE = "data/sample_data.json"
+
+
+def _file_signature(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class CharacterRegistry:
+    """
+    語音角色索引
+
+    角色語音樣本與用戶語音只在檔案的修改時間或大小改變時重新讀取，
+    合併後的索引保留在記憶體中，每次查詢只需檢查檔案狀態而不必重新解析 JSON。
+    透過這裡新增、刪除或編輯角色時會立即更新索引。
+    指定 database 時用戶語音改從 SQLite 資料庫讀取：查詢只使用記憶體中的資料，
+    由 start 在資料庫的背景執行緒載入，之後每 refresh_interval 秒檢查資料庫與 WAL 檔案的狀態，
+    有變更時才重新讀取，事件迴圈上不會直接存取資料庫。
+
+    Attributes:
+        sample_file (str): 角色語音樣本檔案
+        user_voice_file (str): 用戶語音檔案
+        database (Optional[SQLiteStore]): 用戶語音資料庫，未指定時使用用戶語音檔案
+        refresh_interval (float): 檢查資料庫變更的間隔秒數，0 表示只在啟動時讀取
+    """
+
+    def __init__(
+        self,
+        sample_file: str = SAMPLE_DATA_FILE,
+        user_voice_file: str = USER_VOICE_SETTINGS_FILE,
+        database: Optional[SQLiteStore] = None,
+        refresh_interval: float = USER_DATA_REFRESH_INTERVAL,
+    ):
+        self.sample_file = sample_file
+        self.user_voice_file = user_voice_file
+        self.database = database
+        self.refresh_interval = refresh_interval
+        self._data: dict[str, dict] = {}
+        self._signatures: dict[str, Optional[tuple]] = {}
+        self._index: Optional[dict] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def samples(self) -> dict:
+        """
+        角色語音樣本 (不含用戶語音)，請勿修改回傳的內容
+        """
+        self._refresh()
+        return self._data[self.sample_file]
+
+    @property
+    def user_voices(self) -> dict:
+        """
+        用戶語音 (以用戶 ID 字串為鍵)，請勿修改回傳的內容
+        """
+        self._refresh()
+        return self._data[self.user_voice_file]
+
+    def get(self, character_name: str) -> dict:
+        """
+        通過角色名稱獲取語音樣本，用戶語音優先於同名的角色
+        Args:
+            character_name: 角色名稱
+
+        Returns:
+            dict: 語音樣本，角色不存在時回傳空字典；請勿修改回傳的內容
+        """
+        return self._refresh().get(character_name, {})
+
+    def list_characters(self) -> list:
+        """
+        列出所有角色 (不含用戶語音)
+        """
+        return file_utils.list_characters(self.samples)
+
+    def invalidate(self):
+        """
+        捨棄已載入的檔案資料，下次查詢時重新讀取 (資料庫中的用戶語音不受影響)
+        """
+        for path in [path for path in self._data if not self._from_database(path)]:
+            del self._data[path]
+            self._signatures.pop(path, None)
+        self._index = None
+
+    async def refresh_user_voices(self):
+        """
+        在資料庫的背景執行緒檢查並重新讀取用戶語音，未指定 database 時不做任何事
+        """
+        if self.database is None:
+            return
+        result = await self.database.run(self._read_user_voices, self._signatures.get(self.user_voice_file))
+        if result is not None:
+            signature, data = result
+            logger.debug(f"Loaded user voices from {self.database.path}")
+            self._data[self.user_voice_file] = data
+            self._signatures[self.user_voice_file] = signature
+            self._index = None
+
+    async def start(self):
+        """
+        從資料庫載入用戶語音並開始定期檢查變更
+        """
+        if self.database is None:
+            return
+        await self.refresh_user_voices()
+        if self.refresh_interval > 0 and self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        """
+        停止定期檢查資料庫變更
+        """
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    def add_character(self, name: str, filename: str, text: str):
+        """新增語音角色"""
+        try:
+            file_utils.add_character(name, filename, text, file_path=self.sample_file)
+        finally:
+            self.invalidate()
+
+    def remove_character(self, name: str) -> dict:
+        """刪除語音角色並返回其內容"""
+        try:
+            return file_utils.remove_character(name, file_path=self.sample_file)
+        finally:
+            self.invalidate()
+
+    def edit_character(self, name: str, *, filename: Optional[str] = None, text: Optional[str] = None):
+        """編輯語音角色信息"""
+        try:
+            file_utils.edit_character(name, filename=filename, text=text, file_path=self.sample_file)
+        finally:
+            self.invalidate()
+
+    def _refresh(self) -> dict:
+        # 兩個檔案都要檢查，不能短路
+        changed = [self._load(self.sample_file), self._load(self.user_voice_file)]
+        if any(changed) or self._index is None:
+            self._index = {**self._data[self.sample_file], **self._data[self.user_voice_file]}
+        return self._index
+
+    def _load(self, path: str) -> bool:
+        if self._from_database(path):
+            # 由 refresh_user_voices 在背景載入，尚未載入時視為沒有用戶語音
+            self._data.setdefault(path, {})
+            return False
+
+        signature = _file_signature(path)
+        if path in self._data and self._signatures.get(path) == signature:
+            return False
+
+        if signature is None:
+            data = {}
+        else:
+            try:
+                data = file_utils.load_sample_data(path)
+            except json.JSONDecodeError as e:
+                # 檔案可能正在被寫入，保留上一次的內容並在下次查詢時重試
+                logger.warning(f"Failed to parse {path}, keeping previous data: {e}")
+                self._data.setdefault(path, {})
+                return False
+
+        logger.debug(f"Loaded character data from {path}")
+        self._data[path] = data
+        self._signatures[path] = signature
+        return True
+
+    def _from_database(self, path: str) -> bool:
+        return self.database is not None and path == self.user_voice_file
+
+    def _read_user_voices(self, known_signature: Optional[tuple]) -> Optional[tuple]:
+        # 在資料庫的背景執行緒執行，資料庫沒有變更時回傳 None
+        signature = self.database.signature()
+        if signature == known_signature:
+            return None
+        return signature, self.database.load_user_voices()
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh_user_voices()
+            except Exception as e:
+                logger.error(f"Failed to refresh user voices from {self.database.path}: {e}")
+
+
+character_registry = CharacterRegistry(database=sqlite_store if USER_DATA_BACKEND == "sqlite" else None)
@@ -1,9 +1,32 @@
+import disnake
 from disnake.ext.commands import Cog, Bot
 
-from bot.utils.audio_queue import AudioQueue
+from bot.utils.audio_queue import audio_queue
 
 
 class BaseCog(Cog):
     def __init__(self, bot: Bot) -> None:
         self.bot = bot
-        self.audio_manager = AudioQueue()
+        # 所有 cog 共用機器人的播放引擎，重新載入擴充時也不會重建
+        self.audio_manager = getattr(bot, "audio_queue", audio_queue)
+
+    @staticmethod
+    def tts_error_reporter(inter: disnake.ApplicationCommandInteraction, followup: bool = False):
+        """
+        建立 AudioItem.on_error 使用的回呼，語音在播放時合成失敗的話以錯誤訊息通知發出指令的使用者
+        Args:
+            inter: 交互事件
+            followup: 以新的訊息回報，而非修改原本的回應
+        """
+        async def report(error: Exception):
+            embed = disnake.Embed(
+                title="錯誤",
+                description="獲取TTS音頻時出錯。",
+                color=disnake.Color.red(),
+            )
+            if followup:
+                await inter.followup.send(embed=embed, ephemeral=True)
+            else:
+                await inter.edit_original_response(embed=embed)
+
+        return report
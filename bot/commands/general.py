@@ -3,15 +3,21 @@ import os
 import disnake
 from disnake.ext import commands
 
+from bot.api import async_tts_handler
+from bot.api.quality_tiers import load_monitor
+from bot.api.tts_backends import backend_pool
+from bot.api.tts_resilience import tts_resilience
+from bot.api.tts_cache import tts_cache
 from bot.client.base_cog import BaseCog
+from bot.utils.rate_limiter import tts_concurrency, tts_rate_limiter
 from config import GUILD_ID, BOT_MANAGER_ROLES
 from utils.logger import logger
 
 
 class GeneralCommands(BaseCog):
     def __init__(self, bot: commands.Bot):
+        super().__init__(bot)
         self.allowed_roles = BOT_MANAGER_ROLES
-        self.bot = bot
 
     @commands.slash_command(
         name="ping",
@@ -61,6 +67,107 @@ class GeneralCommands(BaseCog):
         else:
             await inter.followup.send("所有命令已重新加載。", ephemeral=True)
 
+    @commands.slash_command(
+        name="tts_stats",
+        description="顯示語音合成的統計資料",
+        guild_ids=[GUILD_ID]
+    )
+    async def tts_stats(self, inter: disnake.ApplicationCommandInteraction):
+        """
+        顯示語音合成的統計資料
+        """
+        if not any(role.id in self.allowed_roles for role in inter.author.roles):
+            await inter.response.send_message("你沒有權限執行此命令。", ephemeral=True)
+            return
+
+        stats = {
+            "cache": tts_cache.stats(),
+            "load": load_monitor.stats(),
+            "backends": backend_pool.stats(),
+            "resilience": tts_resilience.stats(),
+            "concurrency": tts_concurrency.stats(),
+            "rate_limit": tts_rate_limiter.stats(),
+            "playback_queue": self.audio_manager.snapshot().get(inter.guild.id) if inter.guild else None,
+        }
+        for section, values in stats.items():
+            logger.info(f"TTS stats [{section}]: {values}")
+
+        embed = disnake.Embed(title="TTS 統計", color=disnake.Color.blurple())
+        cache_stats = stats["cache"]
+        embed.add_field(
+            name="語音快取",
+            value=(
+                f"命中率: {cache_stats['hit_rate']:.1%}\n"
+                f"記憶體命中: {cache_stats['memory_hits']}\n"
+                f"硬碟命中: {cache_stats['disk_hits']}\n"
+                f"未命中: {cache_stats['misses']}\n"
+                f"記憶體: {cache_stats['memory_entries']} 項 / {cache_stats['memory_bytes'] / 1024 / 1024:.1f} MB\n"
+                f"硬碟: {cache_stats['disk_entries']} 項 / {cache_stats['disk_bytes'] / 1024 / 1024:.1f} MB\n"
+                f"合併的重複請求: {async_tts_handler.chunk_flights.shared}"
+            ),
+            inline=False,
+        )
+        load_stats = stats["load"]
+        latency = f"{load_stats['latency']:.2f} 秒" if load_stats['latency'] is not None else "無資料"
+        embed.add_field(
+            name="合成品質",
+            value=(
+                f"目前層級: {load_stats['tier']}\n"
+                f"最大排隊數: {load_stats['backlog']}\n"
+                f"平均請求延遲: {latency}"
+            ),
+            inline=False,
+        )
+        embed.add_field(
+            name="TTS 後端",
+            value="\n".join(
+                f"{'🟢' if backend['healthy'] else '🔴'} {backend['url']} "
+                f"(進行中 {backend['outstanding']} / 請求 {backend['requests']} / 失敗 {backend['failures']})"
+                for backend in stats["backends"]
+            ),
+            inline=False,
+        )
+        resilience_stats = stats["resilience"]
+        p95 = f"{resilience_stats['p95']:.2f} 秒" if resilience_stats['p95'] is not None else "無資料"
+        embed.add_field(
+            name="請求容錯",
+            value=(
+                f"斷路器: {resilience_stats['breaker']} (連續失敗 {resilience_stats['consecutive_failures']})\n"
+                f"目前逾時: {resilience_stats['timeout']:.1f} 秒 / p95 延遲: {p95}\n"
+                f"重試: {resilience_stats['retried']} / 對沖: {resilience_stats['hedged']} / "
+                f"逾時: {resilience_stats['timeouts']}"
+            ),
+            inline=False,
+        )
+        concurrency_stats = stats["concurrency"]
+        rate_stats = stats["rate_limit"]
+        embed.add_field(
+            name="流量控制",
+            value=(
+                f"後端請求: {concurrency_stats['active']} / {concurrency_stats['limit']} "
+                f"(等待中 {concurrency_stats['waiting']})\n"
+                f"已允許: {rate_stats['allowed']} / 已限流: {rate_stats['rejected']}"
+            ),
+            inline=False,
+        )
+        queue_stats = stats["playback_queue"]
+        if queue_stats:
+            embed.add_field(
+                name="播放排程",
+                value=(
+                    f"排隊中: {queue_stats['size']} "
+                    f"(指令 {queue_stats['by_priority']['interactive']} / "
+                    f"聊天 {queue_stats['by_priority']['passive']})\n"
+                    f"排隊使用者: {len(queue_stats['by_user'])}\n"
+                    f"最久等待: {queue_stats['oldest_age']:.1f} 秒\n"
+                    f"已播放: {queue_stats['served']}\n"
+                    f"已拒絕: {queue_stats['rejected']} / 已捨棄: {queue_stats['dropped']} / "
+                    f"已過期: {queue_stats['expired']}"
+                ),
+                inline=False,
+            )
+        await inter.response.send_message(embed=embed, ephemeral=True)
+
 
 def setup(bot: commands.Bot):
     bot.add_cog(GeneralCommands(bot))
@@ -1,27 +1,26 @@
 from pathlib import Path
 
 import disnake
-import asyncio
+import math
 import os
 import tempfile
 from disnake.ext import commands
 
 from bot.api.gemini_chat_history import GeminiChatHistory
-from bot.api.async_tts_handler import text_to_speech
+from bot.api.async_tts_handler import text_to_speech_stream
 from bot.api.gemini_api import GeminiAPIClient
+from bot.character_registry import character_registry
 from bot.client.base_cog import BaseCog
 from bot.utils.audio_queue import AudioItem
+from bot.utils.playback_scheduler import Priority
+from bot.utils.rate_limiter import tts_rate_limiter
 from config import GUILD_ID, ModelConfig, QUESTION_PROMPT, CONVERSATION_PROMPT
-from utils.file_utils import list_characters, load_sample_data
 from utils.logger import logger
 
 
 class LLMCommands(BaseCog):
     def __init__(self, bot: commands.Bot):
         super().__init__(bot)
-        self.lock = asyncio.Lock()
-        self.max_retries = 3
-        self.retry_delay = 2
         self.llm_client = GeminiAPIClient(model_config=ModelConfig())
 
     @commands.slash_command(
@@ -46,7 +45,7 @@ class LLMCommands(BaseCog):
             desc="使用角色語音名稱",
             choices=[
                 disnake.OptionChoice(name=character, value=character)
-                for character in list_characters(load_sample_data())
+                for character in character_registry.list_characters()
             ],
             default=None,
         ),
@@ -180,17 +179,36 @@ class LLMCommands(BaseCog):
             await inter.followup.send(embed=embed, ephemeral=True)
             return
 
+        retry_after = tts_rate_limiter.acquire(inter.author.id, inter.guild.id)
+        if retry_after:
+            embed = disnake.Embed(
+                title="錯誤",
+                description=f"你的語音請求太頻繁，請在 {math.ceil(retry_after)} 秒後再試。",
+                color=disnake.Color.red(),
+            )
+            await inter.followup.send(embed=embed, ephemeral=True)
+            return
+
         try:
             speech_text = f"雲妹回覆: {response_text}"
-            audio_data = await text_to_speech(speech_text, character_name)
-            logger.info(f"Audio data length: {len(audio_data)} bytes")
+            audio_data = await text_to_speech_stream(response_text, character_name, prefix="雲妹回覆:")
             audio_item = AudioItem(
                 audio_data=audio_data,
                 voice_state=voice_state,
                 text=speech_text,
                 guild_id=inter.guild.id,
+                user_id=inter.author.id,
+                priority=Priority.INTERACTIVE,
+                on_error=self.tts_error_reporter(inter, followup=True),
             )
-            await self.audio_manager.add_to_queue(audio_item)
+            if not await self.audio_manager.add_to_queue(audio_item):
+                embed = disnake.Embed(
+                    title="錯誤",
+                    description="你的待播放語音過多，請稍後再試。",
+                    color=disnake.Color.red(),
+                )
+                await inter.followup.send(embed=embed, ephemeral=True)
+                return
 
             embed = disnake.Embed(
                 title="雲妹回覆",
@@ -1,27 +1,25 @@
-import asyncio
+import math
 import os
 
 import disnake
 from disnake.ext import commands
 
 from bot import user_settings
-from bot.api.async_tts_handler import text_to_speech
+from bot.api.async_tts_handler import text_to_speech_stream
+from bot.character_registry import character_registry
 from bot.client.base_cog import BaseCog
 from bot.user_settings import is_user_voice_exist
 from bot.utils.audio_queue import AudioItem
+from bot.utils.playback_scheduler import Priority
+from bot.utils.rate_limiter import tts_rate_limiter
 from bot.utils.extract_user_nickname import extract_user_nickname
 from config import DEFAULT_VOICE, GUILD_ID
-from utils.file_utils import list_characters, load_sample_data
 from utils.logger import logger
 
 
 class TTSCommands(BaseCog):
     def __init__(self, bot: commands.Bot):
         super().__init__(bot)
-        self.sample_data = load_sample_data()
-        self.lock = asyncio.Lock()
-        self.max_retries = 3
-        self.retry_delay = 2
 
         try:
             disnake.opus._OpusStruct.get_opus_version()
@@ -49,7 +47,7 @@ class TTSCommands(BaseCog):
             desc="使用角色語音名稱",
             choices=[
                 disnake.OptionChoice(name=character, value=character)
-                for character in (list_characters(load_sample_data()) + ["自己聲音 (需要先上傳語音樣本）"])
+                for character in (character_registry.list_characters() + ["自己聲音 (需要先上傳語音樣本）"])
             ],
         ),
     ):
@@ -134,18 +132,38 @@ class TTSCommands(BaseCog):
             )
             await inter.edit_original_response(embed=embed)
             return
+        retry_after = tts_rate_limiter.acquire(user_id, inter.guild.id)
+        if retry_after:
+            embed = disnake.Embed(
+                title="錯誤",
+                description=f"你的語音請求太頻繁，請在 {math.ceil(retry_after)} 秒後再試。",
+                color=disnake.Color.red(),
+            )
+            await inter.edit_original_response(embed=embed)
+            return
+
         try:
             player_name = extract_user_nickname(inter.author.display_name)
-            speech_text = f"{player_name} 說: {text}" if character_name != str(user_id) else text
-            audio_data = await text_to_speech(speech_text, character_name)
-            logger.info(f"Audio data length: {len(audio_data)} bytes")
+            prefix = f"{player_name} 說:" if character_name != str(user_id) else None
+            speech_text = f"{prefix} {text}" if prefix else text
+            audio_data = await text_to_speech_stream(text, character_name, prefix=prefix)
             audio_item = AudioItem(
                 audio_data=audio_data,
                 voice_state=voice_state,
                 text=speech_text,
                 guild_id=inter.guild.id,
+                user_id=user_id,
+                priority=Priority.INTERACTIVE,
+                on_error=self.tts_error_reporter(inter),
             )
-            await self.audio_manager.add_to_queue(audio_item)
+            if not await self.audio_manager.add_to_queue(audio_item):
+                embed = disnake.Embed(
+                    title="錯誤",
+                    description="你的待播放語音過多，請稍後再試。",
+                    color=disnake.Color.red(),
+                )
+                await inter.edit_original_response(embed=embed)
+                return
             logger.info("Audio data add to queue")
             embed = disnake.Embed(
                 title="TTS 播放",
@@ -4,16 +4,11 @@ from pathlib import Path
 import disnake
 from disnake.ext import commands
 
+from bot.api.tts_cache import tts_cache
+from bot.character_registry import character_registry
 from bot.client.base_cog import BaseCog
 from bot.commands.general import GeneralCommands
 from config import GUILD_ID, DOWNLOAD_DIR, VOICE_MANAGER_ROLE_ID
-from utils.file_utils import (
-    load_sample_data,
-    list_characters,
-    add_character,
-    remove_character,
-    edit_character,
-)
 from utils.logger import logger
 
 
@@ -54,7 +49,7 @@ class VoiceManager(BaseCog):
         dest_path = Path(DOWNLOAD_DIR).joinpath(audio.filename)
         await audio.save(dest_path)
         try:
-            add_character(character_name, audio.filename, reference_text)
+            character_registry.add_character(character_name, audio.filename, reference_text)
         except ValueError:
             dest_path.unlink(missing_ok=True)
             embed = disnake.Embed(
@@ -85,7 +80,7 @@ class VoiceManager(BaseCog):
         character_name: str = commands.Param(
             name="角色名稱",
             desc="選擇要刪除的角色",
-            choices=[disnake.OptionChoice(name=c, value=c) for c in list_characters(load_sample_data())],
+            choices=[disnake.OptionChoice(name=c, value=c) for c in character_registry.list_characters()],
         ),
     ):
         if not self._has_permission(inter.author):
@@ -93,10 +88,11 @@ class VoiceManager(BaseCog):
             return
         await inter.response.defer(ephemeral=True)
         try:
-            entry = remove_character(character_name)
+            entry = character_registry.remove_character(character_name)
             file_path = Path(DOWNLOAD_DIR).joinpath(entry["file"])
             if file_path.exists():
                 file_path.unlink()
+            await tts_cache.invalidate_character(character_name)
             embed = disnake.Embed(
                 title="成功",
                 description=f"已刪除角色 {character_name}",
@@ -123,7 +119,7 @@ class VoiceManager(BaseCog):
         character_name: str = commands.Param(
             name="角色名稱",
             desc="選擇要編輯的角色",
-            choices=[disnake.OptionChoice(name=c, value=c) for c in list_characters(load_sample_data())],
+            choices=[disnake.OptionChoice(name=c, value=c) for c in character_registry.list_characters()],
         ),
         reference_text: str = commands.Param(
             name="參考文本", desc="新的參考文本（留空則不修改）", default=None
@@ -153,7 +149,8 @@ class VoiceManager(BaseCog):
             filename = audio.filename
 
         try:
-            edit_character(character_name, filename=filename, text=reference_text)
+            character_registry.edit_character(character_name, filename=filename, text=reference_text)
+            await tts_cache.invalidate_character(character_name)
             embed = disnake.Embed(
                 title="成功",
                 description=f"已更新角色 {character_name}",
@@ -1,14 +1,14 @@
 import re
 import disnake
-import tempfile
-import asyncio
-import os
 from disnake.ext import commands
 from bot import user_settings
-from bot.api.async_tts_handler import text_to_speech
+from bot.api.async_tts_handler import text_to_speech_stream
 from bot.client.base_cog import BaseCog
 from bot.user_settings import is_user_voice_exist
 from bot.utils.audio_queue import AudioItem
+from bot.utils.message_coalescer import message_coalescer
+from bot.utils.playback_scheduler import Priority
+from bot.utils.rate_limiter import tts_rate_limiter
 from bot.utils.extract_user_nickname import extract_user_nickname
 from utils.logger import logger
 from config import (
@@ -23,9 +23,6 @@ class MessageListener(BaseCog):
         super().__init__(bot)
         self.target_channel_id = TTS_TARGET_CHANNEL_ID
         self.target_user_id = MESSAGE_BOT_TARGET_USER_ID
-        self.lock = asyncio.Lock()
-        self.max_retries = 3
-        self.retry_delay = 2
 
     @commands.Cog.listener()
     async def on_message(self, message: disnake.Message):
@@ -98,22 +95,40 @@ class MessageListener(BaseCog):
                 logger.info(f"User {game_username} is not in a voice channel.")
                 return
 
-            try:
-                # Get the first part of the name (split by space)
-                player_name = extract_user_nickname(member.display_name)
-                speech_text = f'{player_name} 說: {user_message}' if character_name != str(user_id) else user_message
-                audio_data = await text_to_speech(speech_text, character_name)
-                logger.info(f"Audio data length: {len(audio_data)} bytes")
-                audio_item = AudioItem(
-                    audio_data=audio_data,
-                    voice_state=voice_state,
-                    text=speech_text,
-                    guild_id=message.guild.id,
-                )
-                await self.audio_manager.add_to_queue(audio_item)
-                logger.info("Audio data add to queue")
-            except Exception as e:
-                logger.error(f"Error fetching TTS audio: {e}")
+            # Get the first part of the name (split by space)
+            player_name = extract_user_nickname(member.display_name)
+            prefix = f'{player_name} 說:' if character_name != str(user_id) else None
+
+            async def speak(text: str):
+                try:
+                    speech_text = f'{prefix} {text}' if prefix else text
+                    audio_data = await text_to_speech_stream(text, character_name, prefix=prefix)
+                    audio_item = AudioItem(
+                        audio_data=audio_data,
+                        voice_state=voice_state,
+                        text=speech_text,
+                        guild_id=message.guild.id,
+                        user_id=user_id,
+                        priority=Priority.PASSIVE,
+                    )
+                    await self.audio_manager.add_to_queue(audio_item)
+                    logger.info("Audio data add to queue")
+                except Exception as e:
+                    logger.error(f"Error fetching TTS audio: {e}")
+
+            # 發言過於頻繁時不進行合成，連續被拒絕只提示一次
+            retry_after = tts_rate_limiter.acquire(user_id, guild.id)
+            if retry_after:
+                logger.info(f"TTS rate limited for user: {game_username} (retry after {retry_after:.1f}s)")
+                if tts_rate_limiter.should_notify(user_id):
+                    try:
+                        await message.add_reaction("⏳")
+                    except disnake.HTTPException:
+                        pass
+                return
+
+            # 短時間內的連續訊息合併為一段語音
+            await message_coalescer.submit((user_id, message.channel.id), user_message, speak)
 
 
 def setup(bot: commands.Bot):
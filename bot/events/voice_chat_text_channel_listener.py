@@ -1,15 +1,14 @@
-import asyncio
-import os
-import tempfile
-
 import disnake
 from disnake.ext import commands
 
 from bot import user_settings
-from bot.api.async_tts_handler import text_to_speech
+from bot.api.async_tts_handler import text_to_speech_stream
 from bot.client.base_cog import BaseCog
 from bot.user_settings import is_user_voice_exist
 from bot.utils.audio_queue import AudioItem
+from bot.utils.message_coalescer import message_coalescer
+from bot.utils.playback_scheduler import Priority
+from bot.utils.rate_limiter import tts_rate_limiter
 from bot.utils.extract_user_nickname import extract_user_nickname
 from config import VOICE_TEXT_INPUT_CHANNEL_IDS, DEFAULT_VOICE
 from utils.logger import logger
@@ -17,11 +16,8 @@ from utils.logger import logger
 
 class VoiceChatTextChannelListener(BaseCog):
     def __init__(self, bot: commands.Bot):
-        self.bot = bot
+        super().__init__(bot)
         self.target_channel_ids = VOICE_TEXT_INPUT_CHANNEL_IDS
-        self.lock = asyncio.Lock()
-        self.max_retries = 3
-        self.retry_delay = 2
 
     @commands.Cog.listener()
     async def on_message(self, message: disnake.Message):
@@ -76,21 +72,39 @@ class VoiceChatTextChannelListener(BaseCog):
             logger.info(f"User {message.author.name} is not in a voice channel.")
             return
 
-        try:
-            player_name = extract_user_nickname(member.display_name)
-            speech_text = f'{player_name} 說: {message.content}' if character_name != str(user_id) else message.content,
-            audio_data = await text_to_speech(speech_text, character_name)
-            logger.info(f"Audio data length: {len(audio_data)} bytes")
-            audio_item = AudioItem(
-                audio_data=audio_data,
-                voice_state=voice_state,
-                text=speech_text,
-                guild_id=message.guild.id,
-            )
-            await self.audio_manager.add_to_queue(audio_item)
-            logger.info("Audio data add to queue")
-        except Exception as e:
-            logger.error(f"Error fetching TTS audio: {e}")
+        player_name = extract_user_nickname(member.display_name)
+        prefix = f'{player_name} 說:' if character_name != str(user_id) else None
+
+        async def speak(text: str):
+            try:
+                speech_text = f'{prefix} {text}' if prefix else text
+                audio_data = await text_to_speech_stream(text, character_name, prefix=prefix)
+                audio_item = AudioItem(
+                    audio_data=audio_data,
+                    voice_state=voice_state,
+                    text=speech_text,
+                    guild_id=message.guild.id,
+                    user_id=user_id,
+                    priority=Priority.PASSIVE,
+                )
+                await self.audio_manager.add_to_queue(audio_item)
+                logger.info("Audio data add to queue")
+            except Exception as e:
+                logger.error(f"Error fetching TTS audio: {e}")
+
+        # 發言過於頻繁時不進行合成，連續被拒絕只提示一次
+        retry_after = tts_rate_limiter.acquire(user_id, guild.id)
+        if retry_after:
+            logger.info(f"TTS rate limited for user: {message.author.name} (retry after {retry_after:.1f}s)")
+            if tts_rate_limiter.should_notify(user_id):
+                try:
+                    await message.add_reaction("⏳")
+                except disnake.HTTPException:
+                    pass
+            return
+
+        # 短時間內的連續訊息合併為一段語音
+        await message_coalescer.submit((user_id, message.channel.id), message.content, speak)
 
 
 def setup(bot: commands.Bot):
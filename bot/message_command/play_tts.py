@@ -1,13 +1,16 @@
+import math
+
 import disnake
-import asyncio
 
 from disnake import HTTPException
 from disnake.ext import commands
-from bot.api.async_tts_handler import text_to_speech
+from bot.api.async_tts_handler import text_to_speech_stream
 from bot import user_settings
 from bot.client.base_cog import BaseCog
 from bot.user_settings import is_user_voice_exist
 from bot.utils.audio_queue import AudioItem
+from bot.utils.playback_scheduler import Priority
+from bot.utils.rate_limiter import tts_rate_limiter
 from bot.utils.extract_user_nickname import extract_user_nickname
 from config import GUILD_ID, DEFAULT_VOICE
 from utils.logger import logger
@@ -16,9 +19,6 @@ from utils.logger import logger
 class PlayTTS(BaseCog):
     def __init__(self, bot: commands.Bot):
         super().__init__(bot)
-        self.lock = asyncio.Lock()
-        self.max_retries = 3
-        self.retry_delay = 2  # seconds
 
     @commands.message_command(name="Play TTS (朗誦訊息到語音頻道)", guild_ids=[GUILD_ID])
     async def play_tts(self, inter: disnake.ApplicationCommandInteraction, message: disnake.Message):
@@ -59,18 +59,38 @@ class PlayTTS(BaseCog):
             await inter.edit_original_response(embed=embed)
             return
 
+        retry_after = tts_rate_limiter.acquire(user_id, inter.guild.id)
+        if retry_after:
+            embed = disnake.Embed(
+                title="錯誤",
+                description=f"你的語音請求太頻繁，請在 {math.ceil(retry_after)} 秒後再試。",
+                color=disnake.Color.red(),
+            )
+            await inter.edit_original_response(embed=embed)
+            return
+
         try:
             player_name = extract_user_nickname(inter.author.display_name)
-            speech_text = f"{player_name} 說: {message.content}" if character_name != str(user_id) else message.content
-            audio_data = await text_to_speech(speech_text, character_name)
-            logger.info(f"Audio data length: {len(audio_data)} bytes")
+            prefix = f"{player_name} 說:" if character_name != str(user_id) else None
+            speech_text = f"{prefix} {message.content}" if prefix else message.content
+            audio_data = await text_to_speech_stream(message.content, character_name, prefix=prefix)
             audio_item = AudioItem(
                 audio_data=audio_data,
                 voice_state=voice_state,
                 text=speech_text,
                 guild_id=inter.guild.id,
+                user_id=user_id,
+                priority=Priority.INTERACTIVE,
+                on_error=self.tts_error_reporter(inter),
             )
-            await self.audio_manager.add_to_queue(audio_item)
+            if not await self.audio_manager.add_to_queue(audio_item):
+                embed = disnake.Embed(
+                    title="錯誤",
+                    description="你的待播放語音過多，請稍後再試。",
+                    color=disnake.Color.red(),
+                )
+                await inter.edit_original_response(embed=embed)
+                return
             logger.info("Audio data add to queue")
             embed = disnake.Embed(
                 title="TTS 播放",
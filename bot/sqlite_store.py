@@ -0,0 +1,237 @@
+"""
+以 SQLite 保存用戶設置與用戶語音
+
+設定 USER_DATA_BACKEND=sqlite 後，用戶設置 (含遊戲ID) 與用戶語音改為保存在 USER_DATA_DB_FILE，
+不再每次變更都重寫整個 JSON 檔案。第一次切換時執行一次匯入：
+
+    python -m bot.sqlite_store
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from config import USER_DATA_DB_FILE, USER_SETTINGS_FILE, USER_VOICE_SETTINGS_FILE
+from utils.logger import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id INTEGER PRIMARY KEY,
+    settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_voices (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# 固定的 SQL 字串會被連線的語句快取重複使用，不必每次重新編譯
+_SELECT_ALL_SETTINGS = "SELECT user_id, settings FROM user_settings"
+_UPSERT_SETTINGS = "INSERT OR REPLACE INTO user_settings (user_id, settings) VALUES (?, ?)"
+_SELECT_ALL_VOICES = "SELECT user_id, data FROM user_voices"
+_UPSERT_VOICE = "INSERT OR REPLACE INTO user_voices (user_id, data) VALUES (?, ?)"
+_SELECT_META = "SELECT value FROM meta WHERE key = ?"
+_UPSERT_META = "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)"
+
+_IMPORTED_KEY = "json_imported"
+
+
+class SQLiteStore:
+    """
+    用戶設置與用戶語音的 SQLite 資料庫
+
+    使用 WAL 模式，讀取不會被寫入阻塞；以用戶ID為主鍵，寫入時只更新有變更的用戶。
+    所有方法都是同步的並共用一個連線 (以鎖保護)；在事件迴圈中請透過 run 在專用的背景執行緒執行。
+
+    Attributes:
+        path (str): 資料庫檔案
+    """
+
+    def __init__(self, path: str = USER_DATA_DB_FILE):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        開啟資料庫並建立資料表，已開啟時直接回傳現有連線
+        """
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # WAL 模式下 NORMAL 仍可保證資料庫不會損毀，只可能遺失最後一次交易
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+            logger.info(f"Opened user data database {self.path}")
+        return self._connection
+
+    async def run(self, func: Callable, *args):
+        """
+        在資料庫專用的背景執行緒執行 func，避免阻塞事件迴圈
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite_store")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def close(self):
+        """
+        關閉資料庫連線與背景執行緒，之後再使用時會重新開啟
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def signature(self) -> tuple:
+        """
+        資料庫與 WAL 檔案的修改時間和大小，用來判斷其他程序是否寫入過資料
+        """
+        signature = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                signature.append(None)
+            else:
+                signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def load_settings(self) -> dict:
+        """
+        讀取所有用戶設置 (以用戶ID字串為鍵)
+        """
+        with self._lock:
+            rows = self.connect().execute(_SELECT_ALL_SETTINGS).fetchall()
+        return {str(user_id): json.loads(settings) for user_id, settings in rows}
+
+    def save_settings(self, settings: dict):
+        """
+        在同一個交易中寫入多位用戶的設置
+        Args:
+            settings: 以用戶ID為鍵的用戶設置
+        """
+        with self._lock, self._transaction() as connection:
+            connection.executemany(_UPSERT_SETTINGS, _settings_rows(settings))
+
+    def load_user_voices(self) -> dict:
+        """
+        讀取所有用戶語音 (以用戶ID字串為鍵)
+        """
+        with self._lock:
+            rows = self.connect().execute(_SELECT_ALL_VOICES).fetchall()
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def import_json(
+        self,
+        settings_file: str = USER_SETTINGS_FILE,
+        user_voice_file: str = USER_VOICE_SETTINGS_FILE,
+        force: bool = False,
+    ) -> Optional[tuple]:
+        """
+        從 JSON 檔案匯入用戶設置與用戶語音，只會執行一次
+
+        遊戲ID的反向映射由用戶設置中的 game_id 欄位產生，因此不需要另外匯入。
+        Args:
+            settings_file: 用戶設置檔
+            user_voice_file: 用戶語音檔
+            force: 已匯入過時仍再次匯入 (覆蓋同一用戶的資料)
+
+        Returns:
+            Optional[tuple]: 匯入的 (用戶設置數, 用戶語音數)，已匯入過時回傳 None
+        """
+        with self._lock:
+            imported = self.connect().execute(_SELECT_META, (_IMPORTED_KEY,)).fetchone()
+        if imported and not force:
+            logger.info(f"{self.path} was already imported from {imported[0]}, skipping")
+            return None
+
+        settings = _read_json(settings_file).get("user_settings", {})
+        voices = _read_json(user_voice_file)
+        with self._lock, self._transaction() as connection:
+            connection.executemany(_UPSERT_SETTINGS, _settings_rows(settings))
+            connection.executemany(_UPSERT_VOICE, _voice_rows(voices))
+            connection.execute(_UPSERT_META, (_IMPORTED_KEY, f"{settings_file},{user_voice_file}"))
+        logger.info(f"Imported {len(settings)} user settings and {len(voices)} user voices into {self.path}")
+        return len(settings), len(voices)
+
+    def is_imported(self) -> bool:
+        """
+        是否已從 JSON 檔案匯入過
+        """
+        with self._lock:
+            return self.connect().execute(_SELECT_META, (_IMPORTED_KEY,)).fetchone() is not None
+
+    @contextmanager
+    def _transaction(self):
+        # 連線使用自動提交模式，需要原子性的寫入以明確的交易包起來
+        connection = self.connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+
+def _settings_rows(settings: dict) -> list:
+    return [
+        (int(user_id), json.dumps(data, ensure_ascii=False))
+        for user_id, data in settings.items()
+    ]
+
+
+def _voice_rows(voices: dict) -> list:
+    return [(str(user_id), json.dumps(data, ensure_ascii=False)) for user_id, data in voices.items()]
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning(f"{path} not found, nothing to import")
+        return {}
+
+
+sqlite_store = SQLiteStore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="將用戶設置與用戶語音從 JSON 檔案匯入 SQLite 資料庫")
+    parser.add_argument("--db", default=USER_DATA_DB_FILE, help="資料庫檔案")
+    parser.add_argument("--settings-file", default=USER_SETTINGS_FILE, help="用戶設置檔")
+    parser.add_argument("--user-voice-file", default=USER_VOICE_SETTINGS_FILE, help="用戶語音檔")
+    parser.add_argument("--force", action="store_true", help="已匯入過時仍再次匯入")
+    args = parser.parse_args()
+
+    store = SQLiteStore(args.db)
+    try:
+        result = store.import_json(args.settings_file, args.user_voice_file, force=args.force)
+    finally:
+        store.close()
+    if result is None:
+        print(f"{args.db} 已匯入過，如需重新匯入請加上 --force")
+    else:
+        print(f"已匯入 {result[0]} 筆用戶設置與 {result[1]} 筆用戶語音到 {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,207 @@
+import asyncio
 import json
+import os
+import sqlite3
+from typing import Optional
 
-from config import USER_SETTINGS_FILE, REVERSE_MAPPING_FILE, USER_VOICE_SETTINGS_FILE
+from bot.character_registry import character_registry
+from bot.sqlite_store import SQLiteStore, sqlite_store
+from config import USER_DATA_BACKEND, USER_SETTINGS_FILE, REVERSE_MAPPING_FILE, USER_SETTINGS_FLUSH_DELAY
+from utils.file_utils import write_json_atomic
+from utils.logger import logger
+
+
+class UserSettingsStore:
+    """
+    保存在記憶體中的用戶設置
+
+    設置檔只在第一次使用時讀取一次，之後的查詢直接使用記憶體中的資料。
+    變更會標記為待寫入，flush_delay 秒後在背景執行緒一次寫回檔案 (暫存檔 + os.replace)，
+    期間的多次變更合併為一次寫入；關閉機器人時呼叫 close 寫回尚未寫入的變更。
+    沒有執行中的事件迴圈時 (例如腳本或測試) 變更會立即寫入。
+
+    指定 database 時改從 SQLite 資料庫讀取，寫入時只更新有變更的用戶，
+    反向映射只保留在記憶體中的遊戲ID索引，不再寫入反向映射檔。
+
+    Attributes:
+        path (str): 用戶設置檔
+        mapping_path (str): 遊戲ID到用户ID的反向映射檔
+        flush_delay (float): 變更後延遲寫入的秒數
+        database (Optional[SQLiteStore]): 用戶設置資料庫，未指定時使用 JSON 檔案
+    """
+
+    def __init__(
+        self,
+        path: str = USER_SETTINGS_FILE,
+        mapping_path: str = REVERSE_MAPPING_FILE,
+        flush_delay: float = USER_SETTINGS_FLUSH_DELAY,
+        database: Optional[SQLiteStore] = None,
+    ):
+        self.path = path
+        self.mapping_path = mapping_path
+        self.flush_delay = flush_delay
+        self.database = database
+        self._data: Optional[dict] = None
+        self._game_ids: dict[str, int] = {}
+        self._dirty_users: set[str] = set()
+        self._mapping_dirty = False
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def settings(self) -> dict:
+        if self._data is None:
+            self.load()
+        return self._data["user_settings"]
+
+    def load(self):
+        """
+        從檔案或資料庫讀取用戶設置，檔案不存在時使用空的設置
+        """
+        self._apply(*self._read())
+
+    async def load_async(self):
+        """
+        在背景執行緒讀取用戶設置，避免阻塞事件迴圈；機器人啟動時呼叫
+        """
+        run = self.database.run if self.database is not None else asyncio.to_thread
+        self._apply(*await run(self._read))
+
+    def get(self, user_id: int) -> dict:
+        """
+        獲取用戶設置的副本，修改後需呼叫 set 才會保存
+        """
+        return dict(self.settings.get(str(user_id), {}))
+
+    def set(self, user_id: int, settings: dict):
+        """
+        設置用戶設置並排程寫回檔案
+        """
+        previous = self.settings.get(str(user_id), {})
+        self.settings[str(user_id)] = dict(settings)
+        if previous.get("game_id") != settings.get("game_id"):
+            self._rebuild_game_ids()
+        self._dirty_users.add(str(user_id))
+        self._schedule_flush()
+
+    def user_id_by_game_id(self, game_id: str) -> Optional[int]:
+        """
+        根據遊戲ID獲取用户ID
+        """
+        if self._data is None:
+            self.load()
+        return self._game_ids.get(game_id)
+
+    def game_id_mapping(self) -> dict:
+        """
+        取得遊戲ID到用户ID的反向映射，使用 JSON 檔案時並排程寫回反向映射檔
+        """
+        if self._data is None:
+            self.load()
+        if self.database is None:
+            self._mapping_dirty = True
+            self._schedule_flush()
+        return dict(self._game_ids)
+
+    def flush(self):
+        """
+        立即將尚未寫入的變更寫回檔案
+        """
+        for write, _ in self._take_pending():
+            write()
+
+    async def flush_async(self):
+        """
+        在背景執行緒將尚未寫入的變更寫回檔案，寫入失敗時保留變更並重新排程
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        # 同一時間只有一次寫入，避免較舊的快照覆蓋較新的檔案
+        run = self.database.run if self.database is not None else asyncio.to_thread
+        async with self._flush_lock:
+            for write, users in self._take_pending():
+                try:
+                    await run(write)
+                except (OSError, sqlite3.Error) as e:
+                    logger.error(f"Failed to save user settings: {e}")
+                    if users is None:
+                        self._mapping_dirty = True
+                    else:
+                        self._dirty_users |= users
+                    self._schedule_flush()
+
+    async def close(self):
+        """
+        取消延遲寫入並立即寫回所有尚未寫入的變更
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush_async()
+
+    def _take_pending(self) -> list:
+        # 在事件迴圈上複製資料，背景執行緒只負責序列化與寫入
+        # 回傳 (寫入函式, 寫入失敗時需要重新標記的用戶) 的列表，反向映射檔的用戶為 None
+        pending = []
+        if self._dirty_users:
+            users, self._dirty_users = self._dirty_users, set()
+            if self.database is not None:
+                rows = {user_id: dict(self.settings[user_id]) for user_id in users}
+                pending.append((lambda: self.database.save_settings(rows), users))
+            else:
+                data = {**self._data, "user_settings": {k: dict(v) for k, v in self.settings.items()}}
+                pending.append((lambda: write_json_atomic(self.path, data, indent=4), users))
+        if self._mapping_dirty:
+            self._mapping_dirty = False
+            mapping = dict(self._game_ids)
+            pending.append((lambda: write_json_atomic(self.mapping_path, mapping, indent=4), None))
+        return pending
+
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        self._flush_task = asyncio.ensure_future(self.flush_async())
+
+    def _read(self) -> tuple:
+        # 只負責讀取，不修改狀態，可以在背景執行緒執行
+        if self.database is not None:
+            if not self.database.is_imported() and os.path.exists(self.path):
+                logger.warning(f"{self.path} has not been imported into {self.database.path}, run python -m bot.sqlite_store")
+            return {"user_settings": self.database.load_settings()}, self.database.path
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        data.setdefault("user_settings", {})
+        return data, self.path
+
+    def _apply(self, data: dict, source: str):
+        self._data = data
+        self._rebuild_game_ids()
+        logger.info(f"Loaded settings for {len(self._data['user_settings'])} users from {source}")
+
+    def _rebuild_game_ids(self):
+        self._game_ids = {}
+        for user_id, settings in self.settings.items():
+            game_id = settings.get("game_id")
+            if game_id:
+                self._game_ids[game_id] = int(user_id)
+
+
+settings_store = UserSettingsStore(database=sqlite_store if USER_DATA_BACKEND == "sqlite" else None)
 
 
 def get_user_settings(user_id: int) -> dict:
@@ -12,9 +213,7 @@ def get_user_settings(user_id: int) -> dict:
     Returns:
         dict: 用戶設置
     """
-    with open(USER_SETTINGS_FILE, 'r') as f:
-        data = json.load(f)
-    return data['user_settings'].get(str(user_id), {})
+    return settings_store.get(user_id)
 
 
 def set_user_settings(user_id: int, settings: dict):
@@ -24,32 +223,14 @@ def set_user_settings(user_id: int, settings: dict):
         user_id: 用户ID
         settings: 用戶設置
     """
-    with open(USER_SETTINGS_FILE, 'r+') as f:
-        data = json.load(f)
-        data['user_settings'][str(user_id)] = settings
-        f.seek(0)
-        json.dump(data, f, indent=4)
-        f.truncate()
+    settings_store.set(user_id, settings)
 
 
 def generate_game_id_to_user_id_mapping():
     """
     生成遊戲ID到用户ID的反向映射
     """
-    with open(USER_SETTINGS_FILE, 'r') as f:
-        data = json.load(f)
-
-    game_id_to_user_id = {}
-
-    for user_id, settings in data['user_settings'].items():
-        game_id = settings.get('game_id')
-        if game_id:
-            game_id_to_user_id[game_id] = int(user_id)
-
-    with open(REVERSE_MAPPING_FILE, 'w') as f:
-        json.dump(game_id_to_user_id, f, indent=4)
-
-    return game_id_to_user_id
+    return settings_store.game_id_mapping()
 
 
 def get_user_id_by_game_id(game_id: str) -> int:
@@ -61,9 +242,7 @@ def get_user_id_by_game_id(game_id: str) -> int:
     Returns:
         int: 用户ID
     """
-    with open(REVERSE_MAPPING_FILE, 'r') as f:
-        game_id_to_user_id = json.load(f)
-    return game_id_to_user_id.get(game_id)
+    return settings_store.user_id_by_game_id(game_id)
 
 
 def is_user_voice_exist(user_id: int) -> bool:
@@ -75,6 +254,4 @@ def is_user_voice_exist(user_id: int) -> bool:
     Returns:
         int: 用戶語音
     """
-    with open(USER_VOICE_SETTINGS_FILE, 'r') as f:
-        data = json.load(f)
-    return str(user_id) in data.keys()
+    return str(user_id) in character_registry.user_voices
@@ -1,34 +1,90 @@
 import asyncio
-import os
-from tempfile import NamedTemporaryFile
-from typing import NamedTuple, Optional
-from disnake import FFmpegPCMAudio, VoiceClient, VoiceState
+import time
+from typing import AsyncIterator, Awaitable, Callable, NamedTuple, Optional
 
-from utils import logger
+from disnake import AudioSource, VoiceClient, VoiceState
+
+from bot.api.quality_tiers import load_monitor
+from config import TTS_PLAYBACK_GAP, TTS_PLAYER_IDLE_TIMEOUT, TTS_QUEUE_MAX_AGE
+from bot.utils.audio_source import DiscordFrameEncoder, StreamingAudioSource
+from bot.utils.pcm import PCMChunk
+from bot.utils.playback_scheduler import PlaybackScheduler, Priority, is_expired
+from utils.logger import logger
 
 
 class AudioItem(NamedTuple):
-    audio_data: bytes
+    # 依序產出 PCM 音訊的非同步迭代器 (例如 text_to_speech_stream 的回傳值)
+    audio_data: AsyncIterator[PCMChunk]
     voice_state: VoiceState
     text: str
     guild_id: int
+    # 發出語音的使用者，用於在使用者之間輪流播放與限制排隊數量
+    user_id: Optional[int] = None
+    priority: Priority = Priority.PASSIVE
+    # 加入排程的時間與播放期限 (time.monotonic())，由 add_to_queue 填入
+    enqueued_at: Optional[float] = None
+    deadline: Optional[float] = None
+    # 合成或播放失敗時呼叫，讓發出請求的指令可以回報錯誤 (合成在播放時才進行，加入排程時無法得知)
+    on_error: Optional[Callable[[Exception], Awaitable[None]]] = None
+
+
+class _PreparedAudio(NamedTuple):
+    # 可以直接播放的音訊來源，串流沒有產出任何音訊時為 None
+    source: Optional[AudioSource]
+    # 播放期間持續寫入音訊的背景工作
+    pump_task: Optional[asyncio.Task]
 
 
 class AudioQueue:
-    def __init__(self):
+    """
+    依伺服器排隊播放語音的播放引擎
+
+    整個機器人共用同一個實例 (見模組底部的 audio_queue)，讓所有 cog 的音訊
+    在同一個伺服器內依序播放，不會互相搶占 voice_client。
+    每個伺服器有一個常駐的播放工作，佇列閒置超過 idle_timeout 秒後才會結束。
+    聊天語音排隊超過 max_age 秒便不再合成與播放。
+    """
+
+    def __init__(
+        self,
+        gap: float = TTS_PLAYBACK_GAP,
+        idle_timeout: float = TTS_PLAYER_IDLE_TIMEOUT,
+        max_age: float = TTS_QUEUE_MAX_AGE,
+    ):
         self._log = logger
-        self._queues: dict[int, asyncio.Queue] = {}
+        self.gap = gap
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self._queues: dict[int, PlaybackScheduler] = {}
         self._play_tasks: dict[int, asyncio.Task] = {}
 
-    def get_queue(self, guild_id: int) -> asyncio.Queue:
+    def get_queue(self, guild_id: int) -> PlaybackScheduler:
         if guild_id not in self._queues:
-            self._queues[guild_id] = asyncio.Queue()
+            self._queues[guild_id] = PlaybackScheduler()
         return self._queues[guild_id]
 
-    async def add_to_queue(self, item: AudioItem):
-        self._log.debug("add to queue")
+    async def add_to_queue(self, item: AudioItem) -> bool:
+        """
+        將語音加入伺服器的播放排程
+
+        Returns:
+            bool: 是否成功加入，使用者排隊的語音數已達上限或排程已滿時回傳 False
+        """
+        now = time.monotonic()
+        deadline = item.deadline
+        if deadline is None and self.max_age > 0 and item.priority == Priority.PASSIVE:
+            deadline = now + self.max_age
+        item = item._replace(enqueued_at=now, deadline=deadline)
+
         queue = self.get_queue(item.guild_id)
-        await queue.put(item)
+        position = queue.position_of(item.user_id, item.priority)
+        if not queue.put_nowait(item):
+            self._log.warning(
+                f"Playback queue full for user {item.user_id} in guild {item.guild_id}, rejecting audio"
+            )
+            return False
+        self._log.debug(f"add to queue ({Priority(item.priority).name}, at most {position} ahead)")
+        load_monitor.report_backlog(item.guild_id, len(queue))
 
         if (
             item.guild_id not in self._play_tasks
@@ -38,36 +94,151 @@ class AudioQueue:
             self._play_tasks[item.guild_id] = asyncio.create_task(
                 self._play_loop(item.guild_id)
             )
+        return True
 
     async def _play_loop(self, guild_id: int):
         queue = self.get_queue(guild_id)
+        next_item: Optional[AudioItem] = None
+        next_prepare: Optional[asyncio.Task] = None
+
+        try:
+            while True:
+                if next_item is None:
+                    try:
+                        next_item = await asyncio.wait_for(queue.get(), timeout=self.idle_timeout)
+                        load_monitor.report_backlog(guild_id, len(queue))
+                    except asyncio.TimeoutError:
+                        # 檢查與結束之間沒有 await，不會有語音在此時被遺留在佇列中
+                        if queue.empty():
+                            self._log.debug(f"Play worker for guild {guild_id} idle, stopping")
+                            return
+                        continue
+                    next_prepare = asyncio.create_task(self.__prepare(next_item.audio_data))
+                item, prepare = next_item, next_prepare
+                next_item = next_prepare = None
+
+                try:
+                    voice_client = await self.__connect(item.voice_state)
+                    prepared = await prepare
+
+                    # 播放目前語音的同時預先準備下一段，讓語音之間沒有空檔
+                    try:
+                        next_item = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        # 沒有其他語音，或剩下的語音皆已過期
+                        pass
+                    else:
+                        load_monitor.report_backlog(guild_id, len(queue))
+                        next_prepare = asyncio.create_task(self.__prepare(next_item.audio_data))
+
+                    if is_expired(item):
+                        # 語音在等待連線或預先準備期間過期，停止仍在進行的合成
+                        self._log.info(f"Dropping stale audio in guild {guild_id}")
+                        await self.__discard(prepare)
+                    elif voice_client and voice_client.is_connected():
+                        await self.__play_prepared(prepared, voice_client)
+                    else:
+                        await self.__discard(prepare)
+                except Exception as e:
+                    await self.__discard(prepare)
+                    self._log.error(f"播放循環錯誤: {e}")
+                    await self.__report_error(item, e)
+
+                if self.gap > 0:
+                    await asyncio.sleep(self.gap)
+        finally:
+            if next_prepare is not None:
+                await self.__discard(next_prepare)
+
+    async def __report_error(self, item: AudioItem, error: Exception):
+        if item.on_error is None:
+            return
+        try:
+            await item.on_error(error)
+        except Exception as e:
+            self._log.error(f"Failed to report playback error: {e}")
 
-        while not queue.empty():
-            item: AudioItem = await queue.get()
-            guild = item.voice_state.channel.guild
-            voice_client: Optional[VoiceClient] = guild.voice_client
+    @staticmethod
+    async def __connect(voice_state: VoiceState) -> Optional[VoiceClient]:
+        voice_client: Optional[VoiceClient] = voice_state.channel.guild.voice_client
+        if not voice_client or not voice_client.is_connected():
+            voice_client = await voice_state.channel.connect(timeout=20, reconnect=True)
+        elif voice_client.channel != voice_state.channel:
+            await voice_client.move_to(voice_state.channel)
+        return voice_client
 
+    async def __prepare(self, stream: AsyncIterator[PCMChunk]) -> _PreparedAudio:
+        """
+        開始接收串流音訊，準備可以直接播放的音訊來源
+
+        收到的 PCM 會在執行緒中重新取樣並預先編碼為 Opus (函式庫可用時)，再寫入 StreamingAudioSource，
+        播放時不需要 ffmpeg 程序或再次編碼。收到第一段音訊後即可開始播放，其餘音訊則在播放期間持續寫入。
+        """
+        encoder = DiscordFrameEncoder()
+        source = StreamingAudioSource(opus=encoder.opus)
+        first_audio = asyncio.Event()
+
+        async def pump():
             try:
-                if not voice_client or not voice_client.is_connected():
-                    voice_client = await item.voice_state.channel.connect(
-                        timeout=20, reconnect=True
-                    )
-                elif voice_client.channel != item.voice_state.channel:
-                    await voice_client.move_to(item.voice_state.channel)
-
-                if voice_client and voice_client.is_connected():
-                    await self.__run_player(item.audio_data, voice_client)
-            except Exception as e:
-                self._log.error(f"播放循環錯誤: {e}")
-
-            queue.task_done()
-            await asyncio.sleep(1)
-
-    async def __run_player(self, audio_data: bytes, voice_client: VoiceClient):
+                async for chunk in stream:
+                    source.feed(await asyncio.to_thread(encoder.encode, chunk))
+                    if source.fed:
+                        first_audio.set()
+                source.feed(await asyncio.to_thread(encoder.flush))
+            finally:
+                try:
+                    aclose = getattr(stream, "aclose", None)
+                    if aclose:
+                        await aclose()
+                finally:
+                    source.finish()
+                    first_audio.set()
+
+        pump_task = asyncio.create_task(pump())
+        try:
+            await first_audio.wait()
+        except BaseException:
+            pump_task.cancel()
+            await asyncio.gather(pump_task, return_exceptions=True)
+            raise
+
+        if not source.fed:
+            # 串流沒有產出任何音訊，回報合成時發生的錯誤 (若有)
+            await pump_task
+            return _PreparedAudio(None, None)
+        return _PreparedAudio(source, pump_task)
+
+    async def __play_prepared(self, prepared: _PreparedAudio, voice_client: VoiceClient):
         """封裝播放邏輯，確保在這一階段是阻塞的 (直到播放結束)"""
-        with NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-            temp_file.write(audio_data)
-            temp_path = temp_file.name
+        if prepared.source is None:
+            return
+
+        pump_task = prepared.pump_task
+        try:
+            await self.__play_source(prepared.source, voice_client)
+            if pump_task is not None and pump_task.done():
+                # 回報合成途中發生的錯誤 (若有)；播放被提前停止時則於下方取消合成
+                await pump_task
+        finally:
+            if pump_task is not None and not pump_task.done():
+                pump_task.cancel()
+                await asyncio.gather(pump_task, return_exceptions=True)
+            self._log.info("Finished playing audio.")
+
+    @staticmethod
+    async def __discard(prepare: asyncio.Task):
+        """取消尚未播放的音訊準備工作，並停止仍在接收的串流"""
+        prepare.cancel()
+        await asyncio.gather(prepare, return_exceptions=True)
+        if prepare.cancelled() or prepare.exception() is not None:
+            return
+        pump_task = prepare.result().pump_task
+        if pump_task is not None and not pump_task.done():
+            pump_task.cancel()
+            await asyncio.gather(pump_task, return_exceptions=True)
+
+    async def __play_source(self, source: AudioSource, voice_client: VoiceClient):
+        """播放音訊來源並等待播放結束"""
         done = asyncio.Event()
 
         def after_playing(error):
@@ -75,19 +246,40 @@ class AudioQueue:
                 self._log.error(f"Playback error: {error}")
             voice_client.loop.call_soon_threadsafe(done.set)
 
-        try:
-            if voice_client.is_playing():
-                voice_client.stop()
-            voice_client.play(FFmpegPCMAudio(temp_path), after=after_playing)
-            self._log.info(f"Started playing: {temp_path}")
-            await done.wait()
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            self._log.info("Finished playing and cleaned up temp file.")
+        if voice_client.is_playing():
+            voice_client.stop()
+        voice_client.play(source, after=after_playing)
+        self._log.info("Started playing audio")
+        await done.wait()
+
+    def snapshot(self) -> dict[int, dict]:
+        """
+        取得各伺服器播放排程的狀態
+        """
+        return {
+            guild_id: {
+                **queue.snapshot(),
+                "playing": guild_id in self._play_tasks and not self._play_tasks[guild_id].done(),
+            }
+            for guild_id, queue in self._queues.items()
+        }
 
     def clear(self, guild_id: int):
         if guild_id in self._queues:
-            self._queues[guild_id] = asyncio.Queue()
+            self._queues[guild_id] = PlaybackScheduler()
         if guild_id in self._play_tasks:
             self._play_tasks[guild_id].cancel()
+
+    async def close(self):
+        """
+        在機器人關閉時停止所有播放
+        """
+        tasks = [task for task in self._play_tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queues.clear()
+        self._play_tasks.clear()
+
+
+audio_queue = AudioQueue()
@@ -0,0 +1,138 @@
+import threading
+from collections import deque
+from typing import Optional
+
+from disnake import AudioSource, opus
+
+from bot.utils.pcm import (
+    DISCORD_FRAME_DURATION,
+    DISCORD_FRAME_SIZE,
+    PCMChunk,
+    PCMResampler,
+)
+from utils.logger import logger
+
+SILENCE_FRAME = b"\x00" * DISCORD_FRAME_SIZE
+# 20 ms 的 Opus 靜音封包
+OPUS_SILENCE_FRAME = b"\xf8\xff\xfe"
+
+
+class DiscordFrameEncoder:
+    """
+    將合成的 PCM 轉換為可直接播放的 20 ms 幀 (會阻塞，應於執行緒中呼叫)
+
+    PCM 會先轉換為 48 kHz 雙聲道並切割為 20 ms 的幀，不足一幀的部分留到下一段音訊；
+    若 Opus 函式庫可用則再預先編碼為 Opus 封包，播放執行緒便不需要再次編碼，
+    整個過程也不需要 ffmpeg 程序。
+
+    Attributes:
+        opus (bool): 產出的幀是否為 Opus 封包
+    """
+
+    def __init__(self, encode_opus: bool = True):
+        self._encoder: Optional[opus.Encoder] = None
+        if encode_opus:
+            try:
+                self._encoder = opus.Encoder()
+            except opus.OpusNotLoaded:
+                logger.debug("Opus library not available, falling back to PCM playback")
+        self._resampler: Optional[PCMResampler] = None
+        self._pending = bytearray()
+
+    @property
+    def opus(self) -> bool:
+        return self._encoder is not None
+
+    def encode(self, chunk: PCMChunk) -> list[bytes]:
+        """
+        轉換一段 PCM 音訊
+        Args:
+            chunk: PCM 音訊
+
+        Returns:
+            list[bytes]: 已湊滿的 20 ms 幀
+        """
+        if self._resampler is None or self._resampler.fmt != chunk.fmt:
+            self._resampler = PCMResampler(chunk.fmt)
+        self._pending += self._resampler.convert(chunk.frames)
+        end = len(self._pending) - len(self._pending) % DISCORD_FRAME_SIZE
+        frames = [bytes(self._pending[i:i + DISCORD_FRAME_SIZE]) for i in range(0, end, DISCORD_FRAME_SIZE)]
+        del self._pending[:end]
+        return self._encode_frames(frames)
+
+    def flush(self) -> list[bytes]:
+        """
+        以靜音補滿並取出最後不足一幀的音訊
+        """
+        if not self._pending:
+            return []
+        frame = bytes(self._pending).ljust(DISCORD_FRAME_SIZE, b"\x00")
+        self._pending.clear()
+        return self._encode_frames([frame])
+
+    def _encode_frames(self, frames: list[bytes]) -> list[bytes]:
+        if self._encoder is None:
+            return frames
+        return [self._encoder.encode(frame, self._encoder.SAMPLES_PER_FRAME) for frame in frames]
+
+
+class StreamingAudioSource(AudioSource):
+    """
+    可以邊接收邊播放的音訊來源
+
+    由事件迴圈呼叫 feed() 寫入 DiscordFrameEncoder 產出的 20 ms 幀 (PCM 或 Opus 封包)，
+    播放執行緒則透過 read() 每次取出一幀。資料尚未到達時回傳靜音幀以維持播放節奏，
+    直到呼叫 finish() 且緩衝區清空後才結束播放。
+
+    Attributes:
+        opus (bool): 寫入的幀是否為 Opus 封包
+    """
+
+    def __init__(self, opus: bool = False):
+        self.opus = opus
+        self._frames: deque[bytes] = deque()
+        self._condition = threading.Condition()
+        self._finished = False
+        self._fed = 0
+
+    @property
+    def buffered(self) -> int:
+        return len(self._frames)
+
+    @property
+    def fed(self) -> int:
+        return self._fed
+
+    def feed(self, frames: list[bytes]):
+        if not frames:
+            return
+        with self._condition:
+            self._frames.extend(frames)
+            self._fed += len(frames)
+            self._condition.notify_all()
+
+    def finish(self):
+        with self._condition:
+            self._finished = True
+            self._condition.notify_all()
+
+    def read(self) -> bytes:
+        with self._condition:
+            if not self._frames and not self._finished:
+                self._condition.wait(timeout=DISCORD_FRAME_DURATION)
+
+            if self._frames:
+                return self._frames.popleft()
+            if self._finished:
+                return b""
+            # 資料尚未到達，以靜音幀維持播放節奏
+            return OPUS_SILENCE_FRAME if self.opus else SILENCE_FRAME
+
+    def is_opus(self) -> bool:
+        return self.opus
+
+    def cleanup(self):
+        with self._condition:
+            self._finished = True
+            self._frames.clear()
+            self._condition.notify_all()
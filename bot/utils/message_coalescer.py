@@ -0,0 +1,103 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, Optional
+
+from config import TTS_COALESCE_WINDOW, TTS_COALESCE_MAX_CHARS
+from utils.logger import logger
+
+_SENTENCE_ENDINGS = "。！？!?.,，、~～…"
+
+
+def join_messages(texts: list[str]) -> str:
+    """
+    將多則訊息合併為一段語音文本，沒有結尾標點的訊息之間補上句號讓語音有停頓
+    """
+    parts = [text.strip() for text in texts if text.strip()]
+    joined = []
+    for i, part in enumerate(parts):
+        if i < len(parts) - 1 and part[-1] not in _SENTENCE_ENDINGS:
+            part += "。"
+        joined.append(part)
+    return "".join(joined)
+
+
+class _Burst:
+    def __init__(self, text: str, flush: Callable[[str], Awaitable[None]]):
+        self.texts = [text]
+        self.length = len(text)
+        self.flush = flush
+        self.task: Optional[asyncio.Task] = None
+
+
+class MessageCoalescer:
+    """
+    合併同一使用者在同一頻道短時間內連續送出的訊息
+
+    第一則訊息到達後開始計時，window 秒內同一個 key 的訊息會合併為一段文本，
+    時間到後只呼叫一次 flush，讓多則短訊息只需合併成一次語音合成與一個說話者前綴。
+    合併後的文本超過 max_chars 時會立即送出目前累積的訊息。
+
+    Attributes:
+        window (float): 合併訊息的時間窗口 (秒)，0 表示不合併
+        max_chars (int): 單次合併的文本長度上限
+    """
+
+    def __init__(
+        self,
+        window: float = TTS_COALESCE_WINDOW,
+        max_chars: int = TTS_COALESCE_MAX_CHARS,
+    ):
+        self.window = window
+        self.max_chars = max_chars
+        self._bursts: dict[Hashable, _Burst] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._bursts)
+
+    async def submit(self, key: Hashable, text: str, flush: Callable[[str], Awaitable[None]]):
+        """
+        提交一則訊息
+        Args:
+            key: 合併的單位，例如 (使用者 ID, 頻道 ID)
+            text: 訊息文本
+            flush: 送出合併後文本的協程函式，會使用最後一則訊息提供的版本
+        """
+        if self.window <= 0:
+            await flush(text)
+            return
+
+        burst = self._bursts.get(key)
+        if burst is not None and burst.length + len(text) > self.max_chars:
+            # 文本過長，先送出目前累積的訊息
+            self._bursts.pop(key)
+            burst.task.cancel()
+            await self._flush(key, burst)
+            burst = None
+
+        if burst is None:
+            burst = _Burst(text, flush)
+            burst.task = asyncio.create_task(self._flush_later(key, burst))
+            self._bursts[key] = burst
+            return
+
+        burst.texts.append(text)
+        burst.length += len(text)
+        burst.flush = flush
+
+    async def _flush_later(self, key: Hashable, burst: _Burst):
+        await asyncio.sleep(self.window)
+        if self._bursts.get(key) is burst:
+            del self._bursts[key]
+            await self._flush(key, burst)
+
+    @staticmethod
+    async def _flush(key: Hashable, burst: _Burst):
+        if len(burst.texts) > 1:
+            logger.debug(f"Coalesced {len(burst.texts)} messages for {key}")
+        try:
+            await burst.flush(join_messages(burst.texts))
+        except Exception as e:
+            logger.error(f"Error flushing coalesced messages for {key}: {e}")
+
+
+message_coalescer = MessageCoalescer()
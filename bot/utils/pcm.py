@@ -0,0 +1,237 @@
+import struct
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# Discord 語音使用 48 kHz、雙聲道、16-bit little-endian PCM，每幀 20 ms
+DISCORD_SAMPLE_RATE = 48000
+DISCORD_CHANNELS = 2
+DISCORD_SAMPLE_WIDTH = 2
+DISCORD_FRAME_DURATION = 0.02
+DISCORD_FRAME_SIZE = int(
+    DISCORD_SAMPLE_RATE * DISCORD_FRAME_DURATION * DISCORD_CHANNELS * DISCORD_SAMPLE_WIDTH
+)
+
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class PCMFormat(NamedTuple):
+    sample_rate: int
+    channels: int
+    sample_width: int
+
+    @property
+    def frame_width(self) -> int:
+        return self.channels * self.sample_width
+
+
+class PCMChunk(NamedTuple):
+    # bytes-like 的 PCM 資料 (可能是指向原始 wav 的 memoryview)
+    frames: bytes
+    fmt: PCMFormat
+
+
+def parse_wav_header(data: bytes) -> Optional[tuple[PCMFormat, int]]:
+    """
+    解析 wav 標頭 (可用於尚未接收完整的串流)
+    Args:
+        data: 目前已收到的 wav 資料
+
+    Returns:
+        tuple | None: (音訊格式, data 區塊起始位置)，若資料仍不足以解析標頭則回傳 None
+
+    Raises:
+        ValueError: 資料不是 PCM wav
+    """
+    if len(data) < 12:
+        return None
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("not a RIFF/WAVE stream")
+
+    offset = 12
+    fmt = None
+    while True:
+        if len(data) < offset + 8:
+            return None
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack("<I", data[offset + 4:offset + 8])[0]
+        body = offset + 8
+
+        if chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("wav data chunk found before fmt chunk")
+            return fmt, body
+
+        if len(data) < body + chunk_size:
+            return None
+
+        if chunk_id == b"fmt ":
+            audio_format, channels, sample_rate, _, _, bits = struct.unpack(
+                "<HHIIHH", data[body:body + 16]
+            )
+            if audio_format not in (_WAVE_FORMAT_PCM, _WAVE_FORMAT_EXTENSIBLE):
+                raise ValueError(f"unsupported wav format: {audio_format}")
+            fmt = PCMFormat(sample_rate, channels, bits // 8)
+
+        # RIFF 區塊以偶數位元組對齊
+        offset = body + chunk_size + (chunk_size & 1)
+
+
+def decode_wav(data: bytes) -> PCMChunk:
+    """
+    將完整的 wav 音訊解碼為 PCM
+
+    直接以 memoryview 指向原始資料中的 data 區塊，不會複製音訊內容。
+    Args:
+        data: wav 音訊
+
+    Returns:
+        PCMChunk: PCM 資料 (bytes-like) 與格式
+
+    Raises:
+        ValueError: 資料不是完整的 PCM wav
+    """
+    parsed = parse_wav_header(data)
+    if parsed is None:
+        raise ValueError("incomplete wav header")
+    fmt, offset = parsed
+
+    # 串流模式的標頭可能沒有正確的長度，此時以實際收到的資料為準
+    size = struct.unpack_from("<I", data, offset - 4)[0]
+    if size == 0 or offset + size > len(data):
+        size = len(data) - offset
+    size -= size % fmt.frame_width
+    return PCMChunk(memoryview(data)[offset:offset + size], fmt)
+
+
+def wav_header(fmt: PCMFormat, data_size: int) -> bytes:
+    """
+    產生標準 44 位元組的 PCM wav 標頭
+    Args:
+        fmt: 音訊格式
+        data_size: PCM 資料長度
+
+    Returns:
+        bytes: wav 標頭
+    """
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_size,
+        b"WAVE",
+        b"fmt ",
+        16,
+        _WAVE_FORMAT_PCM,
+        fmt.channels,
+        fmt.sample_rate,
+        fmt.sample_rate * fmt.frame_width,
+        fmt.frame_width,
+        fmt.sample_width * 8,
+        b"data",
+        data_size,
+    )
+
+
+def encode_wav(chunk: PCMChunk) -> bytes:
+    """
+    將 PCM 編碼為 wav 音訊
+    Args:
+        chunk: PCM 資料與格式
+
+    Returns:
+        bytes: wav 音訊
+    """
+    return build_wav([chunk])
+
+
+def build_wav(chunks: list) -> bytes:
+    """
+    將多段 PCM 串接並編碼為單一 wav 音訊
+
+    格式一致時直接串接原始 PCM：先計算總長度，再一次配置輸出並逐段複製，
+    每段音訊只會被複製一次。格式不一致時先統一轉換為 Discord 格式。
+    Args:
+        chunks: PCMChunk 列表
+
+    Returns:
+        bytes: wav 音訊，若沒有任何音訊則回傳空 bytes
+    """
+    if not chunks:
+        return b""
+
+    fmt = chunks[0].fmt
+    frames = [chunk.frames for chunk in chunks]
+    if any(chunk.fmt != fmt for chunk in chunks):
+        fmt = PCMFormat(DISCORD_SAMPLE_RATE, DISCORD_CHANNELS, DISCORD_SAMPLE_WIDTH)
+        frames = [PCMResampler(chunk.fmt).convert(chunk.frames) for chunk in chunks]
+
+    data_size = sum(len(f) for f in frames)
+    return b"".join([wav_header(fmt, data_size), *frames])
+
+
+class PCMResampler:
+    """
+    將 16-bit PCM 轉換為 Discord 使用的 48 kHz 雙聲道格式
+
+    使用線性內插重新取樣，並在多次呼叫之間保留狀態，
+    因此可以逐段轉換串流資料而不會在段落接縫處產生斷點。
+    """
+
+    def __init__(self, fmt: PCMFormat):
+        if fmt.sample_width != 2:
+            raise ValueError(f"unsupported sample width: {fmt.sample_width}")
+        if fmt.channels not in (1, 2):
+            raise ValueError(f"unsupported channel count: {fmt.channels}")
+        self.fmt = fmt
+        self._step = fmt.sample_rate / DISCORD_SAMPLE_RATE
+        self._passthrough = (
+            fmt.sample_rate == DISCORD_SAMPLE_RATE and fmt.channels == DISCORD_CHANNELS
+        )
+        self._remainder = b""
+        self._pending = np.zeros((0, fmt.channels), dtype=np.float32)
+        self._pos = 0.0
+
+    def convert(self, data: bytes) -> bytes:
+        """
+        轉換一段 PCM 資料
+        Args:
+            data: 原始格式的 PCM 資料 (可以不是完整的取樣幀)
+
+        Returns:
+            bytes: 48 kHz 雙聲道 16-bit PCM
+        """
+        data = self._remainder + data
+        usable = len(data) - len(data) % self.fmt.frame_width
+        self._remainder = data[usable:]
+        if self._passthrough or not usable:
+            return data[:usable]
+
+        samples = np.frombuffer(data[:usable], dtype="<i2").reshape(-1, self.fmt.channels)
+        if self.fmt.sample_rate == DISCORD_SAMPLE_RATE:
+            return self._to_output(samples)
+
+        buf = np.concatenate([self._pending, samples.astype(np.float32)])
+        last = len(buf) - 1
+        if last < 1 or self._pos > last:
+            self._pending = buf
+            return b""
+
+        count = int((last - self._pos) // self._step) + 1
+        positions = self._pos + np.arange(count) * self._step
+        index = positions.astype(np.int64)
+        frac = (positions - index)[:, None].astype(np.float32)
+        following = np.minimum(index + 1, last)
+        out = buf[index] * (1 - frac) + buf[following] * frac
+
+        next_pos = self._pos + count * self._step
+        keep_from = min(int(next_pos), last)
+        self._pending = buf[keep_from:]
+        self._pos = next_pos - keep_from
+        return self._to_output(out)
+
+    @staticmethod
+    def _to_output(samples: np.ndarray) -> bytes:
+        if samples.shape[1] == 1:
+            samples = np.repeat(samples, DISCORD_CHANNELS, axis=1)
+        return np.clip(np.rint(samples), -32768, 32767).astype("<i2").tobytes()
@@ -0,0 +1,239 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from enum import IntEnum
+from typing import Any, Hashable, Optional
+
+from config import TTS_QUEUE_MAX_DEPTH, TTS_QUEUE_MAX_PER_USER
+
+
+class Priority(IntEnum):
+    # 使用者主動觸發的指令 (例如 /play_tts、/ask)
+    INTERACTIVE = 0
+    # 監聽頻道訊息自動朗讀
+    PASSIVE = 1
+
+
+class PlaybackScheduler:
+    """
+    單一伺服器的播放排程器
+
+    依優先級分類排隊，優先級高的語音一律先播放；同一優先級內則在使用者之間
+    輪流取出 (round-robin)，避免單一使用者的大量訊息讓其他人等待。
+    每位使用者同時排隊的語音數有上限，超過上限的語音會被拒絕。
+
+    整個排程的深度也有上限：排程已滿時會先移除已過期的語音，仍然不足時
+    捨棄最舊的聊天語音，若排隊中全是指令語音則拒絕新的語音。
+    超過期限 (deadline) 的語音在取出時直接略過，不會開始合成。
+
+    排隊的項目需要有 user_id、priority、enqueued_at 與 deadline 屬性 (見 AudioItem)。
+
+    Attributes:
+        max_per_user (int): 每位使用者最多排隊的語音數，0 表示不限制
+        max_depth (int): 排程最多排隊的語音數，0 表示不限制
+        served (int): 已取出的語音數
+        rejected (int): 因超過上限而被拒絕的語音數
+        dropped (int): 因排程已滿而被捨棄的語音數
+        expired (int): 因超過期限而被略過的語音數
+    """
+
+    def __init__(
+        self,
+        max_per_user: int = TTS_QUEUE_MAX_PER_USER,
+        max_depth: int = TTS_QUEUE_MAX_DEPTH,
+    ):
+        self.max_per_user = max_per_user
+        self.max_depth = max_depth
+        self.served = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.expired = 0
+        self._classes: dict[Priority, OrderedDict[Hashable, deque]] = {
+            priority: OrderedDict() for priority in Priority
+        }
+        self._per_user: dict[Hashable, int] = {}
+        self._size = 0
+        self._not_empty = asyncio.Event()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def put_nowait(self, item: Any) -> bool:
+        """
+        將語音加入排程
+        Args:
+            item: 要播放的語音
+
+        Returns:
+            bool: 是否成功加入，使用者排隊的語音數已達上限或排程已滿時回傳 False
+        """
+        user = item.user_id
+        if (
+            user is not None
+            and self.max_per_user
+            and self._per_user.get(user, 0) >= self.max_per_user
+        ):
+            self.rejected += 1
+            return False
+
+        if self.max_depth and self._size >= self.max_depth:
+            self._drop_expired()
+            if self._size >= self.max_depth and not self._drop_oldest(Priority.PASSIVE):
+                self.rejected += 1
+                return False
+
+        users = self._classes[Priority(item.priority)]
+        users.setdefault(user, deque()).append(item)
+        self._per_user[user] = self._per_user.get(user, 0) + 1
+        self._size += 1
+        self._not_empty.set()
+        return True
+
+    def get_nowait(self) -> Any:
+        """
+        取出下一個要播放的語音，已超過期限的語音會被略過
+
+        Raises:
+            asyncio.QueueEmpty: 排程中沒有語音
+        """
+        now = time.monotonic()
+        while True:
+            item = self._pop_next()
+            if is_expired(item, now):
+                self.expired += 1
+                continue
+            self.served += 1
+            return item
+
+    async def get(self) -> Any:
+        """
+        取出下一個要播放的語音，排程為空時等待
+        """
+        while True:
+            while self.empty():
+                self._not_empty.clear()
+                await self._not_empty.wait()
+            try:
+                return self.get_nowait()
+            except asyncio.QueueEmpty:
+                # 排程中的語音都已過期
+                continue
+
+    def snapshot(self) -> dict:
+        """
+        取得排程目前的狀態
+
+        Returns:
+            dict: 各優先級與各使用者排隊的語音數、最舊語音的等待秒數，
+                以及累計的取出、拒絕、捨棄與過期次數
+        """
+        now = time.monotonic()
+        oldest = min(
+            (
+                items[0].enqueued_at
+                for users in self._classes.values()
+                for items in users.values()
+                if items[0].enqueued_at is not None
+            ),
+            default=None,
+        )
+        return {
+            "size": self._size,
+            "by_priority": {
+                priority.name.lower(): sum(len(items) for items in users.values())
+                for priority, users in self._classes.items()
+            },
+            "by_user": dict(self._per_user),
+            "oldest_age": now - oldest if oldest is not None else 0.0,
+            "served": self.served,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "expired": self.expired,
+        }
+
+    def position_of(self, user: Optional[Hashable], priority: Priority) -> int:
+        """
+        估計新加入的語音前面最多還有幾段語音 (最壞情況的排隊長度)
+
+        較高優先級的語音全部排在前面；同一優先級內，其他使用者每人最多
+        比該使用者多播放一段。
+        """
+        ahead = 0
+        for level, users in self._classes.items():
+            if level < priority:
+                ahead += sum(len(items) for items in users.values())
+            elif level == priority:
+                own = len(users.get(user, ()))
+                ahead += own + sum(
+                    min(len(items), own + 1) for other, items in users.items() if other != user
+                )
+        return ahead
+
+    def _pop_next(self) -> Any:
+        for users in self._classes.values():
+            if not users:
+                continue
+            user, items = next(iter(users.items()))
+            item = items.popleft()
+            # 取出後將使用者移到隊尾，下一次輪到其他使用者
+            if items:
+                users.move_to_end(user)
+            else:
+                del users[user]
+            self._release(user)
+            return item
+        raise asyncio.QueueEmpty
+
+    def _drop_expired(self):
+        now = time.monotonic()
+        for users in self._classes.values():
+            for user in list(users):
+                items = users[user]
+                kept = deque(item for item in items if not is_expired(item, now))
+                for _ in range(len(items) - len(kept)):
+                    self._release(user)
+                    self.expired += 1
+                if kept:
+                    users[user] = kept
+                else:
+                    del users[user]
+
+    def _drop_oldest(self, priority: Priority) -> bool:
+        users = self._classes[priority]
+        if not users:
+            return False
+        # 每位使用者的第一段語音就是該使用者最舊的語音
+        user = min(
+            users,
+            key=lambda u: users[u][0].enqueued_at if users[u][0].enqueued_at is not None else 0.0,
+        )
+        users[user].popleft()
+        if not users[user]:
+            del users[user]
+        self._release(user)
+        self.dropped += 1
+        return True
+
+    def _release(self, user: Hashable):
+        self._size -= 1
+        remaining = self._per_user[user] - 1
+        if remaining:
+            self._per_user[user] = remaining
+        else:
+            del self._per_user[user]
+
+
+def is_expired(item: Any, now: Optional[float] = None) -> bool:
+    """
+    檢查語音是否已超過期限
+    """
+    deadline = item.deadline
+    if deadline is None:
+        return False
+    return (time.monotonic() if now is None else now) > deadline
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from typing import Hashable, Optional
+
+from config import (
+    TTS_MAX_CONCURRENT_REQUESTS,
+    TTS_USER_RATE_PER_MINUTE,
+    TTS_USER_BURST,
+    TTS_GUILD_RATE_PER_MINUTE,
+    TTS_GUILD_BURST,
+)
+
+# 桶子數量超過這個值時，清除已經補滿 (閒置) 的桶子
+_PRUNE_THRESHOLD = 1024
+
+
+class TokenBucket:
+    """
+    令牌桶限流
+
+    Attributes:
+        rate (float): 每秒補充的令牌數
+        capacity (float): 令牌上限，即允許的瞬間請求數
+    """
+
+    def __init__(self, rate: float, capacity: float, now: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic() if now is None else now
+
+    def refill(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def retry_after(self, cost: float = 1, now: Optional[float] = None) -> float:
+        """
+        取得還需等待多久才有足夠的令牌
+        Args:
+            cost: 需要的令牌數
+            now: 目前時間 (time.monotonic)
+
+        Returns:
+            float: 需等待的秒數，0 表示現在就可以取得
+        """
+        self.refill(now)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost: float = 1):
+        self.tokens -= cost
+
+    def is_full(self, now: Optional[float] = None) -> bool:
+        self.refill(now)
+        return self.tokens >= self.capacity
+
+
+class RateLimiter:
+    """
+    依使用者與伺服器限制語音請求的頻率
+
+    使用者與伺服器各有一個令牌桶，兩者都有令牌時才允許請求並同時扣除，
+    被拒絕的請求不會消耗任何令牌。
+
+    Attributes:
+        user_rate (float): 每位使用者每分鐘可補充的請求數，0 表示不限制
+        user_burst (int): 每位使用者允許的瞬間請求數
+        guild_rate (float): 每個伺服器每分鐘可補充的請求數，0 表示不限制
+        guild_burst (int): 每個伺服器允許的瞬間請求數
+    """
+
+    def __init__(
+        self,
+        user_rate: float = TTS_USER_RATE_PER_MINUTE,
+        user_burst: int = TTS_USER_BURST,
+        guild_rate: float = TTS_GUILD_RATE_PER_MINUTE,
+        guild_burst: int = TTS_GUILD_BURST,
+    ):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.guild_rate = guild_rate
+        self.guild_burst = guild_burst
+        self._buckets: dict[Hashable, TokenBucket] = {}
+        self._notified: set = set()
+        self.allowed = 0
+        self.rejected = 0
+
+    def acquire(self, user_id: Optional[int], guild_id: Optional[int], cost: float = 1) -> float:
+        """
+        嘗試取得一次語音請求的額度
+        Args:
+            user_id: 使用者 ID
+            guild_id: 伺服器 ID
+            cost: 這次請求消耗的令牌數
+
+        Returns:
+            float: 0 表示允許；否則為需等待的秒數
+        """
+        now = time.monotonic()
+        buckets = []
+        if user_id is not None and self.user_rate > 0:
+            buckets.append(self._bucket(("user", user_id), self.user_rate, self.user_burst, now))
+        if guild_id is not None and self.guild_rate > 0:
+            buckets.append(self._bucket(("guild", guild_id), self.guild_rate, self.guild_burst, now))
+
+        retry_after = max((bucket.retry_after(cost, now) for bucket in buckets), default=0.0)
+        if retry_after > 0:
+            self.rejected += 1
+            return retry_after
+
+        for bucket in buckets:
+            bucket.take(cost)
+        self._notified.discard(user_id)
+        self.allowed += 1
+        return 0.0
+
+    def should_notify(self, user_id: Optional[int]) -> bool:
+        """
+        使用者連續被拒絕時只需通知一次，再次成功取得額度後才會重新通知
+        """
+        if user_id in self._notified:
+            return False
+        self._notified.add(user_id)
+        return True
+
+    def stats(self) -> dict:
+        """
+        取得限流統計
+        """
+        return {
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "buckets": len(self._buckets),
+        }
+
+    def _bucket(self, key: Hashable, rate_per_minute: float, burst: int, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= _PRUNE_THRESHOLD:
+                self._prune(now)
+            bucket = TokenBucket(rate_per_minute / 60, max(1, burst), now)
+            self._buckets[key] = bucket
+        return bucket
+
+    def _prune(self, now: float):
+        # 已補滿的桶子與新建立的桶子相同，可以安全移除
+        for key in [key for key, bucket in self._buckets.items() if bucket.is_full(now)]:
+            del self._buckets[key]
+
+
+class ConcurrencyLimiter:
+    """
+    限制整個機器人同時送往 TTS 後端的請求數
+
+    號誌在第一次使用時才建立，確保綁定到機器人實際執行的事件迴圈。
+
+    Attributes:
+        limit (int): 同時進行的請求數上限
+    """
+
+    def __init__(self, limit: int = TTS_MAX_CONCURRENT_REQUESTS):
+        self.limit = max(1, limit)
+        self.active = 0
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    async def try_acquire(self) -> bool:
+        """
+        不等待地取得一個名額，取得後需呼叫 release 歸還
+        Returns:
+            bool: 是否取得名額，沒有空閒名額或已有請求在排隊時回傳 False
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self._semaphore.locked() or self.waiting:
+            return False
+        # 有空閒名額時 acquire 會立即完成
+        await self._semaphore.acquire()
+        self.active += 1
+        return True
+
+    def release(self):
+        """
+        歸還一個名額
+        """
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        """
+        取得目前的併發狀態
+        """
+        return {"limit": self.limit, "active": self.active, "waiting": self.waiting}
+
+
+tts_rate_limiter = RateLimiter()
+tts_concurrency = ConcurrencyLimiter()
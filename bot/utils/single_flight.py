@@ -0,0 +1,70 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    合併同時進行的相同工作
+
+    同一個 key 的工作尚未完成時，之後的呼叫不會再次執行，而是等待同一個結果。
+    個別呼叫端被取消時不會影響其他仍在等待的呼叫端；
+    所有呼叫端都取消後才會取消工作本身，避免替沒有人需要的結果佔用後端。
+
+    Attributes:
+        shared (int): 共用進行中工作而沒有重新執行的呼叫次數
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, _Flight] = {}
+        self.shared = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[T]]) -> T:
+        """
+        執行工作，或等待相同 key 正在進行的工作
+        Args:
+            key: 工作的識別鍵
+            work: 產生工作的協程函式，只有在沒有相同工作進行中時才會呼叫
+
+        Returns:
+            工作的結果，所有同時等待的呼叫端取得同一個物件
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(work()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+        else:
+            self.shared += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # 先移除，讓之後的呼叫重新執行，而不是等到一個正在取消的工作
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+                await asyncio.gather(flight.task, return_exceptions=True)
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _finish(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # 所有呼叫端都已離開時仍要取出例外，避免 "exception was never retrieved" 警告
+        if not flight.task.cancelled():
+            flight.task.exception()
@@ -11,6 +11,73 @@ load_dotenv()
 
 DISCORD_TOKEN = environ.get('DISCORD_TOKEN')
 TTS_API_URL = environ.get("TTS_API_URL", "http://127.0.0.1:9880/tts/")
+# 多個 TTS 後端 (以逗號分隔)，未設定時只使用 TTS_API_URL
+TTS_API_URLS = [url.strip() for url in environ.get('TTS_API_URLS', TTS_API_URL).split(',') if url.strip()]
+# 後端健康檢查：路徑 (相對於 TTS API 網址，留空則停用)、間隔與逾時秒數
+TTS_HEALTH_PATH = environ.get('TTS_HEALTH_PATH', '/docs')
+TTS_HEALTH_INTERVAL = float(environ.get('TTS_HEALTH_INTERVAL', 30))
+TTS_HEALTH_TIMEOUT = float(environ.get('TTS_HEALTH_TIMEOUT', 5))
+# 角色固定後端的進行中請求數比最空閒的後端多出此數量以上時，改送往最空閒的後端
+TTS_BACKEND_STICKY_SLACK = int(environ.get('TTS_BACKEND_STICKY_SLACK', 2))
+# TTS HTTP 連線池
+TTS_POOL_LIMIT = int(environ.get('TTS_POOL_LIMIT', 32))
+TTS_POOL_LIMIT_PER_HOST = int(environ.get('TTS_POOL_LIMIT_PER_HOST', 8))
+TTS_KEEPALIVE_TIMEOUT = float(environ.get('TTS_KEEPALIVE_TIMEOUT', 60))
+TTS_DNS_CACHE_TTL = int(environ.get('TTS_DNS_CACHE_TTL', 300))
+TTS_REQUEST_TIMEOUT = float(environ.get('TTS_REQUEST_TIMEOUT', 1200))
+# 單次合成請求的逾時：最近延遲 p99 乘上倍數，並限制在上下限秒數之間
+TTS_TIMEOUT_MIN = float(environ.get('TTS_TIMEOUT_MIN', 10))
+TTS_TIMEOUT_MAX = float(environ.get('TTS_TIMEOUT_MAX', 120))
+TTS_TIMEOUT_MULTIPLIER = float(environ.get('TTS_TIMEOUT_MULTIPLIER', 3))
+# 後端異常時的重試次數與指數退避的基準/上限秒數
+TTS_MAX_RETRIES = int(environ.get('TTS_MAX_RETRIES', 2))
+TTS_RETRY_BASE_DELAY = float(environ.get('TTS_RETRY_BASE_DELAY', 0.5))
+TTS_RETRY_MAX_DELAY = float(environ.get('TTS_RETRY_MAX_DELAY', 5))
+# 請求超過 p95 延遲仍未完成時再送出一個相同的請求
+TTS_HEDGE_ENABLED = environ.get('TTS_HEDGE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# 連續失敗幾次後暫停送出請求 (0 表示停用斷路器)，以及暫停的秒數
+TTS_BREAKER_THRESHOLD = int(environ.get('TTS_BREAKER_THRESHOLD', 5))
+TTS_BREAKER_COOLDOWN = float(environ.get('TTS_BREAKER_COOLDOWN', 30))
+# 整個機器人同時送往 TTS 後端的請求數上限 (預設每個後端 4 個)
+TTS_MAX_CONCURRENT_REQUESTS = int(environ.get('TTS_MAX_CONCURRENT_REQUESTS', 4 * len(TTS_API_URLS)))
+# 每位使用者/每個伺服器每分鐘可補充的語音請求數 (0 表示不限制) 與允許的瞬間請求數
+TTS_USER_RATE_PER_MINUTE = float(environ.get('TTS_USER_RATE_PER_MINUTE', 12))
+TTS_USER_BURST = int(environ.get('TTS_USER_BURST', 5))
+TTS_GUILD_RATE_PER_MINUTE = float(environ.get('TTS_GUILD_RATE_PER_MINUTE', 60))
+TTS_GUILD_BURST = int(environ.get('TTS_GUILD_BURST', 20))
+# 同一段語音最多同時送出的文本塊請求數
+TTS_MAX_PARALLEL_CHUNKS = int(environ.get('TTS_MAX_PARALLEL_CHUNKS', 3))
+# 每個文本塊的字數預算，第一個文本塊可使用較小的預算讓播放更快開始 (0 表示與一般預算相同)
+TTS_CHUNK_MAX_CHARS = int(environ.get('TTS_CHUNK_MAX_CHARS', 80))
+TTS_FIRST_CHUNK_MAX_CHARS = int(environ.get('TTS_FIRST_CHUNK_MAX_CHARS', 30))
+# 伺服器將文本塊切分後批次推論的片段數
+TTS_BATCH_SIZE = int(environ.get('TTS_BATCH_SIZE', 4))
+# 使用 GPT-SoVITS 的 streaming_mode，邊接收邊播放
+TTS_STREAMING_MODE = environ.get('TTS_STREAMING_MODE', 'false').lower() in ('1', 'true', 'yes')
+# 語音合成快取
+TTS_CACHE_ENABLED = environ.get('TTS_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+TTS_CACHE_DIR = environ.get('TTS_CACHE_DIR', 'data/tts_cache')
+TTS_CACHE_MEMORY_MB = int(environ.get('TTS_CACHE_MEMORY_MB', 64))
+TTS_CACHE_DISK_MB = int(environ.get('TTS_CACHE_DISK_MB', 512))
+# 保留在記憶體中的說話者前綴 ("<名稱> 說:") 音訊數量
+TTS_PREFIX_CACHE_SIZE = int(environ.get('TTS_PREFIX_CACHE_SIZE', 512))
+# 依負載自動調整合成品質：排隊語音數與平均請求延遲 (秒) 的各層級門檻
+TTS_ADAPTIVE_QUALITY = environ.get('TTS_ADAPTIVE_QUALITY', 'true').lower() in ('1', 'true', 'yes')
+TTS_ADAPTIVE_BACKLOG_THRESHOLDS = list(map(int, environ.get('TTS_ADAPTIVE_BACKLOG_THRESHOLDS', '5,10').split(',')))
+TTS_ADAPTIVE_LATENCY_THRESHOLDS = list(map(float, environ.get('TTS_ADAPTIVE_LATENCY_THRESHOLDS', '4,8').split(',')))
+# 語音播放：兩段語音之間的間隔秒數
+TTS_PLAYBACK_GAP = float(environ.get('TTS_PLAYBACK_GAP', 0.05))
+# 播放工作在佇列閒置多少秒後結束
+TTS_PLAYER_IDLE_TIMEOUT = float(environ.get('TTS_PLAYER_IDLE_TIMEOUT', 300))
+# 每位使用者在同一個伺服器最多排隊的語音數 (0 表示不限制)
+TTS_QUEUE_MAX_PER_USER = int(environ.get('TTS_QUEUE_MAX_PER_USER', 10))
+# 每個伺服器最多排隊的語音數 (0 表示不限制)
+TTS_QUEUE_MAX_DEPTH = int(environ.get('TTS_QUEUE_MAX_DEPTH', 30))
+# 聊天語音最多排隊的秒數，超過後不再合成與播放 (0 表示不限制)
+TTS_QUEUE_MAX_AGE = float(environ.get('TTS_QUEUE_MAX_AGE', 60))
+# 合併同一使用者在同一頻道連續送出的訊息：時間窗口秒數 (0 表示不合併) 與文本長度上限
+TTS_COALESCE_WINDOW = float(environ.get('TTS_COALESCE_WINDOW', 1.5))
+TTS_COALESCE_MAX_CHARS = int(environ.get('TTS_COALESCE_MAX_CHARS', 200))
 GUILD_ID = int(environ.get("GUILD_ID", 933290709589577728))
 LOGGER_LEVEL = logging.DEBUG
 GEMINI_MODEL_NAME = environ.get('GEMINI_MODEL_NAME', 'gemini-2.5-flash')
@@ -29,6 +96,13 @@ DEFAULT_VOICE = list_characters(load_sample_data())[0]
 USER_SETTINGS_FILE = environ.get('USER_SETTINGS_FILE', 'data/user_settings.json')
 USER_VOICE_SETTINGS_FILE = environ.get('USER_VOICE_SETTINGS_FILE', 'data/user_voice.json', )
 REVERSE_MAPPING_FILE = environ.get('REVERSE_MAPPING_FILE', 'data/game_id_to_user_id.json', )
+# 用戶設置變更後延遲寫回檔案的秒數，期間的多次變更會合併為一次寫入
+USER_SETTINGS_FLUSH_DELAY = float(environ.get('USER_SETTINGS_FLUSH_DELAY', 2))
+# 用戶設置與用戶語音的儲存方式：json (預設) 或 sqlite，切換到 sqlite 前先執行 python -m bot.sqlite_store 匯入
+USER_DATA_BACKEND = environ.get('USER_DATA_BACKEND', 'json').lower()
+USER_DATA_DB_FILE = environ.get('USER_DATA_DB_FILE', 'data/user_data.db')
+# 使用 sqlite 時在背景檢查資料庫是否被其他程序寫入 (例如重新匯入) 的間隔秒數，0 表示只在啟動時讀取用戶語音
+USER_DATA_REFRESH_INTERVAL = float(environ.get('USER_DATA_REFRESH_INTERVAL', 30))
 VOICE_DIR = environ.get('VOICE_DIR', 'data/samples')
 DOWNLOAD_DIR = environ.get('DOWNLOAD_DIR', 'data/samples')
 
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+
+import pytest
+
+from bot.api import async_tts_handler
+from bot.api.quality_tiers import LoadMonitor
+from bot.api.tts_cache import TTSCache
+from bot.api.tts_resilience import ResilientCaller
+from bot import user_settings
+from bot.utils import audio_queue
+from bot.utils.rate_limiter import ConcurrencyLimiter
+from bot.utils.single_flight import SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def isolated_tts_cache(monkeypatch):
+    """只用記憶體的語音快取與前綴音訊快取，不會讀寫硬碟上的快取目錄"""
+    cache = TTSCache(disk_dir=None)
+    monkeypatch.setattr(async_tts_handler, "tts_cache", cache)
+    monkeypatch.setattr(async_tts_handler, "_prefix_audio", OrderedDict())
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_handler_state(monkeypatch):
+    """重設提及名稱快取、進行中的合成與並行上限，避免前一個測試的請求影響計數"""
+    monkeypatch.setattr(async_tts_handler, "_mention_names", OrderedDict())
+    monkeypatch.setattr(async_tts_handler, "chunk_flights", SingleFlight())
+    monkeypatch.setattr(async_tts_handler, "tts_concurrency", ConcurrencyLimiter())
+
+
+@pytest.fixture(autouse=True)
+def isolated_load_monitor(monkeypatch):
+    """合成與播放共用的負載監控，品質層級從最高層開始"""
+    monitor = LoadMonitor()
+    monkeypatch.setattr(async_tts_handler, "load_monitor", monitor)
+    monkeypatch.setattr(audio_queue, "load_monitor", monitor)
+    return monitor
+
+
+@pytest.fixture(autouse=True)
+def isolated_tts_resilience(monkeypatch):
+    """斷路器保持關閉、沒有延遲紀錄，重試時不等待"""
+    caller = ResilientCaller(base_delay=0)
+    monkeypatch.setattr(async_tts_handler, "tts_resilience", caller)
+    return caller
+
+
+@pytest.fixture(autouse=True)
+def isolated_settings_store(monkeypatch, tmp_path):
+    """用戶設置寫入暫存目錄，不會修改 data/ 中的檔案"""
+    store = user_settings.UserSettingsStore(
+        str(tmp_path / "user_settings.json"), str(tmp_path / "game_id_to_user_id.json"), flush_delay=0.01
+    )
+    monkeypatch.setattr(user_settings, "settings_store", store)
+    return store
@@ -1,6 +1,41 @@
+import asyncio
+import gc
+import io
+import wave
+
 import pytest
-from unittest.mock import MagicMock
-from bot.api.async_tts_handler import preprocess_text, split_text_into_chunks
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from unittest.mock import MagicMock, patch
+from bot.api import async_tts_handler
+from bot.api.async_tts_handler import (
+    build_tts_payload,
+    chunk_cache_key,
+    preprocess_text,
+    split_text_into_chunks,
+    stream_chunk_pcm,
+    stream_chunks,
+    synthesize_chunks,
+    text_to_speech,
+    text_to_speech_stream,
+)
+from bot.api.quality_tiers import QUALITY_TIERS
+from bot.api.tts_backends import BackendPool
+from bot.api.tts_client import TTSClient
+from bot.utils.pcm import PCMFormat
+
+
+SAMPLE = {"file": "a.wav", "text": "hi", "name": "char"}
+
+
+def make_wav(n_frames: int, sample_rate: int = 32000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(b"\x00\x00" * n_frames)
+    return buf.getvalue()
 
 
 class TestAsyncTTSHandler:
@@ -35,16 +70,302 @@ class TestAsyncTTSHandler:
 
     def test_split_text_into_chunks(self):
         text = "這是第一句。這是第二句！這是第三句？這是第四句。"
-        result = split_text_into_chunks(text, 2)
+        result = split_text_into_chunks(text, max_chars=13, first_chunk_chars=0)
         expected = ["這是第一句。 這是第二句！", "這是第三句？ 這是第四句。"]
         assert result == expected
 
     def test_split_text_into_chunks_single_chunk(self):
         text = "這是第一句。"
-        result = split_text_into_chunks(text, 2)
+        result = split_text_into_chunks(text)
         assert result == ["這是第一句。"]
 
     def test_split_text_into_chunks_empty(self):
         text = ""
-        result = split_text_into_chunks(text, 2)
-        assert result == []
\ No newline at end of file
+        result = split_text_into_chunks(text)
+        assert result == []
+
+    def test_split_text_into_chunks_packs_short_sentences(self):
+        text = "好。" * 10
+        assert split_text_into_chunks(text, max_chars=80, first_chunk_chars=0) == [" ".join(["好。"] * 10)]
+
+    def test_split_text_into_chunks_long_sentence_split_at_commas(self):
+        text = "第一段話說得很長，" * 6 + "最後結束。"
+        result = split_text_into_chunks(text, max_chars=20, first_chunk_chars=0)
+        assert all(len(chunk) <= 20 for chunk in result)
+        assert "".join(chunk.replace(" ", "") for chunk in result) == text
+
+    def test_split_text_into_chunks_unbreakable_sentence_kept(self):
+        text = "沒" * 50 + "。"
+        assert split_text_into_chunks(text, max_chars=20, first_chunk_chars=0) == [text]
+
+    def test_split_text_into_chunks_first_chunk_budget(self):
+        text = "第一句。第二句。第三句。第四句。"
+        result = split_text_into_chunks(text, max_chars=80, first_chunk_chars=4)
+        assert result == ["第一句。", "第二句。 第三句。 第四句。"]
+
+    def test_build_tts_payload_batch_size(self):
+        assert build_tts_payload("你好", SAMPLE)["batch_size"] == async_tts_handler.TTS_BATCH_SIZE
+
+    @pytest.mark.asyncio
+    async def test_synthesize_chunks_preserves_order(self):
+        delays = {"a": 0.03, "b": 0.01, "c": 0.0}
+        lengths = {"a": 100, "b": 200, "c": 300}
+
+        async def fake_request(chunk, character_sample, tier=None):
+            await asyncio.sleep(delays[chunk])
+            return make_wav(lengths[chunk])
+
+        with patch.object(async_tts_handler, "request_chunk_audio", side_effect=fake_request):
+            segments = await synthesize_chunks(["a", "b", "c"], SAMPLE, max_parallel=3)
+
+        assert [len(segment.frames) // 2 for segment in segments] == [100, 200, 300]
+
+    @pytest.mark.asyncio
+    async def test_synthesize_chunks_respects_parallel_limit(self):
+        in_flight = 0
+        peak = 0
+
+        async def fake_request(chunk, character_sample, tier=None):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return make_wav(10)
+
+        with patch.object(async_tts_handler, "request_chunk_audio", side_effect=fake_request):
+            segments = await synthesize_chunks(["a", "b", "c", "d", "e"], SAMPLE, max_parallel=2)
+
+        assert len(segments) == 5
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_synthesize_chunks_cancels_on_failure(self):
+        cancelled = []
+
+        async def fake_request(chunk, character_sample, tier=None):
+            if chunk == "bad":
+                raise Exception("TTS API請求失敗: 400")
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(chunk)
+                raise
+            return make_wav(10)
+
+        with patch.object(async_tts_handler, "request_chunk_audio", side_effect=fake_request):
+            with pytest.raises(Exception, match="400"):
+                await synthesize_chunks(["a", "bad", "c"], SAMPLE, max_parallel=3)
+
+        assert sorted(cancelled) == ["a", "c"]
+
+    @pytest.mark.asyncio
+    async def test_stream_chunks_yields_before_later_chunks_finish(self):
+        release = asyncio.Event()
+
+        async def fake_request(chunk, character_sample, tier=None):
+            if chunk != "first":
+                await release.wait()
+            return make_wav(10)
+
+        with patch.object(async_tts_handler, "request_chunk_audio", side_effect=fake_request):
+            stream = stream_chunks(["first", "second"], SAMPLE, max_parallel=2)
+            first = await asyncio.wait_for(stream.__anext__(), timeout=1)
+            assert first == make_wav(10)
+
+            release.set()
+            rest = [segment async for segment in stream]
+            assert len(rest) == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_chunks_aclose_cancels_pending(self):
+        cancelled = []
+
+        async def fake_request(chunk, character_sample, tier=None):
+            if chunk == "first":
+                return make_wav(10)
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(chunk)
+                raise
+
+        with patch.object(async_tts_handler, "request_chunk_audio", side_effect=fake_request):
+            stream = stream_chunks(["first", "second"], SAMPLE, max_parallel=2)
+            await stream.__anext__()
+            await stream.aclose()
+
+        assert cancelled == ["second"]
+
+    @pytest.mark.asyncio
+    async def test_stream_chunk_pcm_decodes_chunked_response(self):
+        received = {}
+
+        async def handler(request):
+            received.update(await request.json())
+            response = web.StreamResponse()
+            await response.prepare(request)
+            header = make_wav(0)
+            # Split the header across writes to exercise incremental parsing
+            await response.write(header[:10])
+            await response.write(header[10:] + b"\x01\x00" * 4)
+            await response.write(b"\x02\x00" * 4)
+            await response.write_eof()
+            return response
+
+        app = web.Application()
+        app.router.add_post("/tts/", handler)
+        client = TTSClient()
+
+        async with TestServer(app) as server:
+            pool = BackendPool([str(server.make_url("/tts/"))], client=client, health_path="")
+            with patch.object(async_tts_handler, "backend_pool", pool):
+                pieces = [
+                    piece async for piece in stream_chunk_pcm("你好", {"file": "a.wav", "text": "hi"})
+                ]
+        await client.close()
+
+        assert received["streaming_mode"] is True
+        assert all(piece.fmt == PCMFormat(32000, 1, 2) for piece in pieces)
+        assert b"".join(piece.frames for piece in pieces) == b"\x01\x00" * 4 + b"\x02\x00" * 4
+
+    @pytest.mark.asyncio
+    async def test_synthesize_chunks_uses_cache(self, isolated_tts_cache):
+        calls = []
+
+        async def fake_request(chunk, character_sample, tier=None):
+            calls.append(chunk)
+            return make_wav(10)
+
+        with patch.object(async_tts_handler, "request_chunk_audio", side_effect=fake_request):
+            await synthesize_chunks(["gg"], SAMPLE)
+            segments = await synthesize_chunks(["gg"], SAMPLE)
+
+        assert calls == ["gg"]
+        assert len(segments[0].frames) == 20
+        assert isolated_tts_cache.stats()["memory_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_text_to_speech_stream_prefix_synthesized_once(self, isolated_tts_cache):
+        isolated_tts_cache.enabled = False
+        calls = []
+
+        async def fake_request(chunk, character_sample, tier=None):
+            calls.append(chunk)
+            return make_wav(10 if chunk == "John 說:" else 20)
+
+        with patch.object(async_tts_handler, "request_chunk_audio", side_effect=fake_request), \
+                patch.object(async_tts_handler, "resolve_character_sample", return_value=SAMPLE):
+            for text in ["第一句。", "第二句。"]:
+                stream = await text_to_speech_stream(text, "char", prefix="John 說:")
+                pieces = [piece async for piece in stream]
+                # Prefix audio comes first, then the body
+                assert [len(piece.frames) for piece in pieces] == [20, 40]
+
+        assert calls.count("John 說:") == 1
+        assert calls.count("第一句。") == 1
+
+    @pytest.mark.asyncio
+    async def test_text_to_speech_stream_prefix_and_body_in_parallel(self):
+        started = []
+        both_started = asyncio.Event()
+
+        async def fake_request(chunk, character_sample, tier=None):
+            started.append(chunk)
+            if len(started) == 2:
+                both_started.set()
+            await asyncio.wait_for(both_started.wait(), timeout=1)
+            return make_wav(10)
+
+        with patch.object(async_tts_handler, "request_chunk_audio", side_effect=fake_request), \
+                patch.object(async_tts_handler, "resolve_character_sample", return_value=SAMPLE):
+            stream = await text_to_speech_stream("內文。", "char", prefix="John 說:")
+            pieces = [piece async for piece in stream]
+
+        assert len(pieces) == 2
+        assert sorted(started) == sorted(["John 說:", "內文。"])
+
+    @pytest.mark.asyncio
+    async def test_dropped_prefixed_stream_leaves_no_coroutine(self, recwarn):
+        with patch.object(async_tts_handler, "request_chunk_audio") as request, \
+                patch.object(async_tts_handler, "resolve_character_sample", return_value=SAMPLE):
+            stream = await text_to_speech_stream("內文。", "char", prefix="John 說:")
+            # Rejected or cleared queue items are dropped without ever being iterated
+            del stream
+            gc.collect()
+
+        request.assert_not_called()
+        assert not [w for w in recwarn if issubclass(w.category, RuntimeWarning)]
+
+    @pytest.mark.asyncio
+    async def test_text_to_speech_joins_prefix_and_body(self):
+        async def fake_request(chunk, character_sample, tier=None):
+            return make_wav(10 if chunk == "John 說:" else 20)
+
+        with patch.object(async_tts_handler, "request_chunk_audio", side_effect=fake_request), \
+                patch.object(async_tts_handler, "resolve_character_sample", return_value=SAMPLE):
+            audio = await text_to_speech("第一句。第二句。第三句。", "char", prefix="John 說:")
+
+        with wave.open(io.BytesIO(audio), "rb") as wav_file:
+            assert wav_file.getframerate() == 32000
+            # The three short sentences fit into a single chunk
+            assert wav_file.getnframes() == 10 + 20
+
+    def test_build_tts_payload_uses_current_tier(self, isolated_load_monitor):
+        payload = build_tts_payload("你好", SAMPLE)
+        assert payload["speed_factor"] == 1
+        assert payload["sample_steps"] == 32
+
+        isolated_load_monitor.backlog_thresholds = [1]
+        isolated_load_monitor.report_backlog(1, 3)
+        payload = build_tts_payload("你好", SAMPLE)
+        assert payload["speed_factor"] == QUALITY_TIERS[1].speed_factor
+        assert payload["sample_steps"] == QUALITY_TIERS[1].sample_steps
+
+    @pytest.mark.asyncio
+    async def test_chunk_cache_key_depends_on_tier(self):
+        low = await chunk_cache_key("你好", SAMPLE, QUALITY_TIERS[0])
+        assert low != await chunk_cache_key("你好", SAMPLE, QUALITY_TIERS[1])
+
+    @pytest.mark.asyncio
+    async def test_fetch_chunk_audio_records_latency(self, isolated_load_monitor):
+        response = MagicMock()
+        response.status = 200
+
+        async def read():
+            return make_wav(10)
+
+        response.read = read
+        post = MagicMock()
+        post.return_value.__aenter__.return_value = response
+        client = MagicMock()
+        client.session.post = post
+        pool = BackendPool(["http://tts/"], client=client, health_path="")
+
+        with patch.object(async_tts_handler, "backend_pool", pool):
+            await async_tts_handler.fetch_chunk_audio("你好", SAMPLE)
+
+        assert isolated_load_monitor.latency is not None
+        assert post.call_args.kwargs["json"]["sample_steps"] == 32
+
+    @pytest.mark.asyncio
+    async def test_text_to_speech_deduplicates_concurrent_requests(self, isolated_tts_cache):
+        isolated_tts_cache.enabled = False
+        calls = []
+        release = asyncio.Event()
+
+        async def fake_request(chunk, character_sample, tier=None):
+            calls.append(chunk)
+            await release.wait()
+            return make_wav(10)
+
+        with patch.object(async_tts_handler, "request_chunk_audio", side_effect=fake_request), \
+                patch.object(async_tts_handler, "resolve_character_sample", return_value=SAMPLE):
+            requests = [asyncio.create_task(text_to_speech("同一句話。", "char")) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            release.set()
+            results = await asyncio.gather(*requests)
+
+        assert calls == ["同一句話。"]
+        assert results[0] == results[1] == results[2]
+        assert async_tts_handler.chunk_flights.shared == 2
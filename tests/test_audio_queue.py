@@ -1,19 +1,29 @@
 import pytest
 import asyncio
+import threading
+import time
 from unittest.mock import AsyncMock, MagicMock, patch
-from bot.utils.audio_queue import AudioQueue, AudioItem
+from bot.client.base_cog import BaseCog
+from bot.utils.audio_queue import AudioQueue, AudioItem, audio_queue as shared_audio_queue
+from bot.utils.audio_source import SILENCE_FRAME
+from bot.utils.pcm import PCMChunk, PCMFormat
+from bot.utils.playback_scheduler import PlaybackScheduler, Priority
+
+
+async def pcm_stream(frames=b'\x01\x00' * 1920):
+    yield PCMChunk(frames, PCMFormat(48000, 2, 2))
 
 
 class TestAudioQueue:
     @pytest.fixture
     def audio_queue(self):
-        aq = AudioQueue()
+        aq = AudioQueue(idle_timeout=0.01)
         aq._log = MagicMock()  # Mock the logger
         return aq
 
     def test_get_queue_new(self, audio_queue):
         queue = audio_queue.get_queue(123)
-        assert isinstance(queue, asyncio.Queue)
+        assert isinstance(queue, PlaybackScheduler)
         assert 123 in audio_queue._queues
 
     def test_get_queue_existing(self, audio_queue):
@@ -71,16 +81,325 @@ class TestAudioQueue:
             assert audio_queue._play_tasks[123] is mock_task
             mock_play.assert_not_called()
 
+    @pytest.mark.asyncio
+    async def test_play_loop_plays_stream_while_synthesizing(self, audio_queue):
+        loop = asyncio.get_running_loop()
+        voice_client = MagicMock()
+        voice_client.is_connected.return_value = True
+        voice_client.is_playing.return_value = False
+        voice_client.loop = loop
+        voice_state = MagicMock()
+        voice_state.channel.guild.voice_client = voice_client
+        voice_client.channel = voice_state.channel
+
+        fmt = PCMFormat(48000, 2, 2)
+
+        release_second_chunk = asyncio.Event()
+
+        async def stream():
+            yield PCMChunk(b'\x01\x00' * 1920, fmt)
+            await release_second_chunk.wait()
+            yield PCMChunk(b'\x02\x00' * 1920, fmt)
+
+        played = []
+
+        def fake_play(source, after):
+            # Playback starts before the second chunk has been synthesized
+            loop.call_soon_threadsafe(release_second_chunk.set)
+
+            def drain():
+                while frame := source.read():
+                    played.append(frame)
+                after(None)
+
+            threading.Thread(target=drain).start()
+
+        voice_client.play.side_effect = fake_play
+
+        item = AudioItem(stream(), voice_state, 'text', 123)
+        audio_queue.get_queue(123).put_nowait(item)
+
+        with patch('bot.utils.audio_queue.asyncio.sleep', new_callable=AsyncMock):
+            await asyncio.wait_for(audio_queue._play_loop(123), timeout=5)
+
+        audio = b''.join(played)
+        assert audio.replace(SILENCE_FRAME, b'') == b'\x01\x00' * 1920 + b'\x02\x00' * 1920
+        voice_client.play.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_play_loop_plays_pre_encoded_opus(self, audio_queue):
+        loop = asyncio.get_running_loop()
+        voice_client = MagicMock()
+        voice_client.is_connected.return_value = True
+        voice_client.is_playing.return_value = False
+        voice_client.loop = loop
+        voice_state = MagicMock()
+        voice_state.channel.guild.voice_client = voice_client
+        voice_client.channel = voice_state.channel
+
+        played = []
+
+        def fake_play(source, after):
+            played.append(source.is_opus())
+            while frame := source.read():
+                played.append(frame)
+            after(None)
+
+        voice_client.play.side_effect = fake_play
+
+        encoder = MagicMock()
+        encoder.SAMPLES_PER_FRAME = 960
+        encoder.encode.side_effect = lambda frame, size: b'opus'
+        audio_queue.get_queue(123).put_nowait(AudioItem(pcm_stream(b'\x01\x00' * 3840), voice_state, 'text', 123))
+
+        with patch('bot.utils.audio_source.opus.Encoder', return_value=encoder), \
+                patch('bot.utils.audio_queue.asyncio.sleep', new_callable=AsyncMock):
+            await asyncio.wait_for(audio_queue._play_loop(123), timeout=5)
+
+        # Playback reads Opus packets encoded ahead of time, one per 20 ms frame
+        assert played == [True, b'opus', b'opus']
+
+    @pytest.mark.asyncio
+    async def test_play_loop_prepares_next_item_while_playing(self, audio_queue):
+        loop = asyncio.get_running_loop()
+        voice_client = MagicMock()
+        voice_client.is_connected.return_value = True
+        voice_client.is_playing.return_value = False
+        voice_client.loop = loop
+        voice_state = MagicMock()
+        voice_state.channel.guild.voice_client = voice_client
+        voice_client.channel = voice_state.channel
+
+        events = []
+
+        async def stream(name):
+            events.append(f'prepare {name}')
+            yield PCMChunk(name.encode().ljust(3840, b'\x00'), PCMFormat(48000, 2, 2))
+
+        def fake_play(source, after):
+            name = source.read().rstrip(b'\x00').decode()
+            events.append(f'play {name}')
+
+            def finish():
+                events.append(f'end {name}')
+                after(None)
+
+            loop.call_later(0.05, finish)
+
+        voice_client.play.side_effect = fake_play
+
+        for name in ('one', 'two'):
+            audio_queue.get_queue(123).put_nowait(AudioItem(stream(name), voice_state, 'text', 123))
+
+        audio_queue.gap = 0.25
+        with patch('bot.utils.audio_queue.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+            await asyncio.wait_for(audio_queue._play_loop(123), timeout=5)
+
+        assert events.index('prepare two') < events.index('end one')
+        assert events[-2:] == ['play two', 'end two']
+        mock_sleep.assert_awaited_with(0.25)
+
+    @pytest.mark.asyncio
+    async def test_play_loop_without_gap_does_not_sleep(self, audio_queue):
+        voice_client = MagicMock()
+        voice_client.is_connected.return_value = True
+        voice_client.is_playing.return_value = False
+        voice_client.loop = asyncio.get_running_loop()
+        voice_client.play.side_effect = lambda source, after: after(None)
+        voice_state = MagicMock()
+        voice_state.channel.guild.voice_client = voice_client
+        voice_client.channel = voice_state.channel
+
+        audio_queue.get_queue(123).put_nowait(AudioItem(pcm_stream(), voice_state, 'text', 123))
+
+        audio_queue.gap = 0
+        with patch('bot.utils.audio_queue.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+            await asyncio.wait_for(audio_queue._play_loop(123), timeout=5)
+
+        voice_client.play.assert_called_once()
+        mock_sleep.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_play_loop_stops_stream_on_connect_failure(self, audio_queue):
+        voice_state = MagicMock()
+        voice_state.channel.guild.voice_client = None
+        started = asyncio.Event()
+        closed = asyncio.Event()
+
+        async def fail_connect(**kwargs):
+            await started.wait()
+            raise RuntimeError('no voice')
+
+        voice_state.channel.connect = AsyncMock(side_effect=fail_connect)
+
+        async def stream():
+            started.set()
+            try:
+                yield PCMChunk(b'\x01\x00' * 1920, PCMFormat(48000, 2, 2))
+                await asyncio.sleep(60)
+            finally:
+                closed.set()
+
+        audio_queue.get_queue(123).put_nowait(AudioItem(stream(), voice_state, 'text', 123))
+        await asyncio.wait_for(audio_queue._play_loop(123), timeout=5)
+
+        assert closed.is_set()
+        audio_queue._log.error.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_play_loop_reports_synthesis_failure(self, audio_queue):
+        voice_client = MagicMock()
+        voice_client.is_connected.return_value = True
+        voice_state = MagicMock()
+        voice_state.channel.guild.voice_client = voice_client
+        voice_client.channel = voice_state.channel
+
+        async def stream():
+            raise RuntimeError('backend down')
+            yield
+
+        on_error = AsyncMock()
+        audio_queue.get_queue(123).put_nowait(AudioItem(stream(), voice_state, 'text', 123, on_error=on_error))
+        await asyncio.wait_for(audio_queue._play_loop(123), timeout=5)
+
+        voice_client.play.assert_not_called()
+        on_error.assert_awaited_once()
+        assert str(on_error.await_args.args[0]) == 'backend down'
+
+    @pytest.mark.asyncio
+    async def test_tts_error_reporter_edits_interaction(self):
+        inter = MagicMock()
+        inter.edit_original_response = AsyncMock()
+        inter.followup.send = AsyncMock()
+
+        await BaseCog.tts_error_reporter(inter)(RuntimeError('x'))
+        inter.edit_original_response.assert_awaited_once()
+        assert inter.edit_original_response.await_args.kwargs['embed'].description == '獲取TTS音頻時出錯。'
+
+        await BaseCog.tts_error_reporter(inter, followup=True)(RuntimeError('x'))
+        inter.followup.send.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_worker_stays_alive_between_messages(self, audio_queue):
+        voice_client = MagicMock()
+        voice_client.is_connected.return_value = True
+        voice_client.is_playing.return_value = False
+        voice_client.loop = asyncio.get_running_loop()
+        voice_client.play.side_effect = lambda source, after: after(None)
+        voice_state = MagicMock()
+        voice_state.channel.guild.voice_client = voice_client
+        voice_client.channel = voice_state.channel
+
+        audio_queue.idle_timeout = 5
+        await audio_queue.add_to_queue(AudioItem(pcm_stream(), voice_state, 'text', 123))
+        worker = audio_queue._play_tasks[123]
+        await asyncio.sleep(0.05)
+        assert voice_client.play.call_count == 1
+        assert not worker.done()
+
+        await audio_queue.add_to_queue(AudioItem(pcm_stream(), voice_state, 'text', 123))
+        await asyncio.sleep(0.05)
+
+        assert audio_queue._play_tasks[123] is worker
+        assert voice_client.play.call_count == 2
+        await audio_queue.close()
+
+    @pytest.mark.asyncio
+    async def test_worker_stops_after_idle_timeout(self, audio_queue):
+        audio_queue.idle_timeout = 0.01
+        await asyncio.wait_for(audio_queue._play_loop(123), timeout=5)
+        assert audio_queue.get_queue(123).empty()
+
+    @pytest.mark.asyncio
+    async def test_add_to_queue_rejects_over_user_cap(self, audio_queue):
+        audio_queue.get_queue(123).max_per_user = 1
+        audio_queue._play_tasks[123] = MagicMock(done=MagicMock(return_value=False))
+
+        assert await audio_queue.add_to_queue(AudioItem(b'1', MagicMock(), 'text', 123, user_id=1))
+        assert not await audio_queue.add_to_queue(AudioItem(b'2', MagicMock(), 'text', 123, user_id=1))
+        assert await audio_queue.add_to_queue(
+            AudioItem(b'3', MagicMock(), 'text', 123, user_id=2, priority=Priority.INTERACTIVE)
+        )
+
+        snapshot = audio_queue.snapshot()[123]
+        assert snapshot['size'] == 2
+        assert snapshot['rejected'] == 1
+        assert snapshot['by_priority'] == {'interactive': 1, 'passive': 1}
+        assert snapshot['playing']
+
+    @pytest.mark.asyncio
+    async def test_add_to_queue_sets_deadline_for_passive_items(self, audio_queue):
+        audio_queue.max_age = 30
+        audio_queue._play_tasks[123] = MagicMock(done=MagicMock(return_value=False))
+
+        await audio_queue.add_to_queue(AudioItem(b'chat', MagicMock(), 'text', 123, user_id=1))
+        await audio_queue.add_to_queue(
+            AudioItem(b'command', MagicMock(), 'text', 123, user_id=2, priority=Priority.INTERACTIVE)
+        )
+
+        queue = audio_queue.get_queue(123)
+        command, chat = queue.get_nowait(), queue.get_nowait()
+        assert command.deadline is None
+        assert command.enqueued_at is not None
+        assert chat.deadline == pytest.approx(chat.enqueued_at + 30)
+
+    @pytest.mark.asyncio
+    async def test_play_loop_skips_stale_items_before_synthesis(self, audio_queue):
+        voice_client = MagicMock()
+        voice_client.is_connected.return_value = True
+        voice_client.is_playing.return_value = False
+        voice_client.loop = asyncio.get_running_loop()
+        voice_client.play.side_effect = lambda source, after: after(None)
+        voice_state = MagicMock()
+        voice_state.channel.guild.voice_client = voice_client
+        voice_client.channel = voice_state.channel
+
+        started = []
+
+        async def stream(name):
+            started.append(name)
+            yield PCMChunk(b'\x01\x00' * 1920, PCMFormat(48000, 2, 2))
+
+        queue = audio_queue.get_queue(123)
+        queue.put_nowait(AudioItem(stream('stale'), voice_state, 'text', 123, deadline=time.monotonic() - 1))
+        queue.put_nowait(AudioItem(stream('fresh'), voice_state, 'text', 123))
+
+        with patch('bot.utils.audio_queue.asyncio.sleep', new_callable=AsyncMock):
+            await asyncio.wait_for(audio_queue._play_loop(123), timeout=5)
+
+        assert started == ['fresh']
+        voice_client.play.assert_called_once()
+
     def test_clear(self, audio_queue):
-        audio_queue._queues[123] = asyncio.Queue()
+        audio_queue.get_queue(123).put_nowait(AudioItem(b'audio', MagicMock(), 'text', 123))
         mock_task = MagicMock()
         audio_queue._play_tasks[123] = mock_task
 
         audio_queue.clear(123)
 
-        assert isinstance(audio_queue._queues[123], asyncio.Queue)
+        assert audio_queue.get_queue(123).empty()
         mock_task.cancel.assert_called_once()
 
     def test_clear_nonexistent(self, audio_queue):
         # Should not raise error
         audio_queue.clear(999)
+
+    @pytest.mark.asyncio
+    async def test_close_cancels_play_tasks(self, audio_queue):
+        task = asyncio.create_task(asyncio.sleep(60))
+        audio_queue._play_tasks[123] = task
+        audio_queue.get_queue(123)
+
+        await audio_queue.close()
+
+        assert task.cancelled()
+        assert not audio_queue._queues
+        assert not audio_queue._play_tasks
+
+    def test_cogs_share_playback_engine(self):
+        bot = MagicMock(spec=[])
+        assert BaseCog(bot).audio_manager is shared_audio_queue
+        assert BaseCog(bot).audio_manager is BaseCog(bot).audio_manager
+
+        bot.audio_queue = AudioQueue()
+        assert BaseCog(bot).audio_manager is bot.audio_queue
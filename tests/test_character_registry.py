@@ -0,0 +1,87 @@
+import json
+import os
+
+import pytest
+from unittest.mock import patch
+from bot.character_registry import CharacterRegistry
+from utils import file_utils
+
+
+def write_json(path, data):
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+@pytest.fixture
+def registry(tmp_path):
+    sample_file = tmp_path / "sample_data.json"
+    user_voice_file = tmp_path / "user_voice.json"
+    write_json(sample_file, {"角色A": {"file": "a.wav", "text": "你好"}, "角色B": {"file": "b.wav", "text": "嗨"}})
+    write_json(user_voice_file, {"123": {"file": "123.wav", "text": "我的聲音"}})
+    return CharacterRegistry(str(sample_file), str(user_voice_file))
+
+
+class TestCharacterRegistry:
+    def test_get_merges_both_files(self, registry):
+        assert registry.get("角色A") == {"file": "a.wav", "text": "你好"}
+        assert registry.get("123") == {"file": "123.wav", "text": "我的聲音"}
+        assert registry.get("不存在") == {}
+        assert registry.list_characters() == ["角色A", "角色B"]
+
+    def test_user_voice_overrides_sample(self, registry):
+        with open(registry.user_voice_file, "w", encoding="utf-8") as f:
+            json.dump({"角色A": {"file": "override.wav", "text": "覆蓋"}}, f)
+        assert registry.get("角色A")["file"] == "override.wav"
+
+    def test_parses_only_once_while_unchanged(self, registry):
+        with patch.object(file_utils, "load_sample_data", wraps=file_utils.load_sample_data) as load:
+            for _ in range(5):
+                registry.get("角色A")
+        assert load.call_count == 2
+
+    def test_reloads_when_file_changes(self, registry):
+        registry.get("角色A")
+        with open(registry.sample_file, "w", encoding="utf-8") as f:
+            json.dump({"角色C": {"file": "c.wav", "text": "新的角色"}}, f)
+
+        with patch.object(file_utils, "load_sample_data", wraps=file_utils.load_sample_data) as load:
+            assert registry.get("角色C")["file"] == "c.wav"
+            assert registry.get("角色A") == {}
+        # Only the changed file is parsed again
+        assert load.call_count == 1
+
+    def test_reloads_same_size_change_by_mtime(self, registry):
+        registry.get("角色A")
+        with open(registry.sample_file, encoding="utf-8") as f:
+            content = f.read()
+        with open(registry.sample_file, "w", encoding="utf-8") as f:
+            f.write(content.replace("a.wav", "x.wav"))
+        stat = os.stat(registry.sample_file)
+        os.utime(registry.sample_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        assert registry.get("角色A")["file"] == "x.wav"
+
+    def test_missing_user_voice_file(self, registry):
+        os.remove(registry.user_voice_file)
+        assert registry.get("123") == {}
+        assert registry.get("角色A")["file"] == "a.wav"
+
+    def test_corrupted_file_keeps_previous_data(self, registry):
+        registry.get("角色A")
+        with open(registry.sample_file, "w", encoding="utf-8") as f:
+            f.write("{not json")
+        assert registry.get("角色A")["file"] == "a.wav"
+
+    def test_add_remove_edit_refresh_index(self, registry):
+        registry.get("角色A")
+        registry.add_character("角色D", "d.wav", "第四個")
+        assert registry.get("角色D") == {"file": "d.wav", "text": "第四個"}
+
+        registry.edit_character("角色D", text="改過了")
+        assert registry.get("角色D")["text"] == "改過了"
+
+        assert registry.remove_character("角色D")["file"] == "d.wav"
+        assert registry.get("角色D") == {}
+
+    def test_failed_write_still_raises(self, registry):
+        with pytest.raises(ValueError):
+            registry.add_character("角色A", "a.wav", "重複")
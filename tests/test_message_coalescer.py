@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from bot.utils.message_coalescer import MessageCoalescer, join_messages
+
+
+class TestMessageCoalescer:
+    def test_join_messages(self):
+        assert join_messages(["你好", "今天天氣不錯！", "走吧"]) == "你好。今天天氣不錯！走吧"
+        assert join_messages([" a ", "", "b"]) == "a。b"
+
+    @pytest.mark.asyncio
+    async def test_burst_is_flushed_once(self):
+        coalescer = MessageCoalescer(window=0.05, max_chars=200)
+        flushed = []
+
+        async def flush(text):
+            flushed.append(text)
+
+        await coalescer.submit((1, 10), "第一句", flush)
+        await coalescer.submit((1, 10), "第二句", flush)
+        await coalescer.submit((2, 10), "別人", flush)
+        assert flushed == []
+        assert coalescer.pending == 2
+
+        await asyncio.sleep(0.1)
+        assert sorted(flushed) == sorted(["第一句。第二句", "別人"])
+        assert coalescer.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_latest_flush_callback_is_used(self):
+        coalescer = MessageCoalescer(window=0.05, max_chars=200)
+        calls = []
+
+        async def first(text):
+            calls.append(("first", text))
+
+        async def second(text):
+            calls.append(("second", text))
+
+        await coalescer.submit("key", "a", first)
+        await coalescer.submit("key", "b", second)
+        await asyncio.sleep(0.1)
+        assert calls == [("second", "a。b")]
+
+    @pytest.mark.asyncio
+    async def test_max_chars_flushes_early(self):
+        coalescer = MessageCoalescer(window=0.05, max_chars=5)
+        flushed = []
+
+        async def flush(text):
+            flushed.append(text)
+
+        await coalescer.submit("key", "abcd", flush)
+        await coalescer.submit("key", "efgh", flush)
+        assert flushed == ["abcd"]
+
+        await asyncio.sleep(0.1)
+        assert flushed == ["abcd", "efgh"]
+
+    @pytest.mark.asyncio
+    async def test_zero_window_flushes_immediately(self):
+        coalescer = MessageCoalescer(window=0)
+        flushed = []
+
+        async def flush(text):
+            flushed.append(text)
+
+        await coalescer.submit("key", "a", flush)
+        assert flushed == ["a"]
+        assert coalescer.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_flush_error_is_logged(self):
+        coalescer = MessageCoalescer(window=0.01)
+
+        async def flush(text):
+            raise RuntimeError("boom")
+
+        await coalescer.submit("key", "a", flush)
+        await asyncio.sleep(0.05)
+        assert coalescer.pending == 0
@@ -0,0 +1,174 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+from disnake.opus import OpusNotLoaded
+from bot.utils.audio_source import (
+    OPUS_SILENCE_FRAME,
+    SILENCE_FRAME,
+    DiscordFrameEncoder,
+    StreamingAudioSource,
+)
+from bot.utils.pcm import (
+    DISCORD_FRAME_SIZE,
+    PCMFormat,
+    PCMChunk,
+    PCMResampler,
+    build_wav,
+    decode_wav,
+    parse_wav_header,
+)
+
+
+def make_wav(frames: bytes, sample_rate: int = 32000, channels: int = 1) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(frames)
+    return buf.getvalue()
+
+
+class TestPCM:
+    def test_parse_wav_header(self):
+        data = make_wav(b"\x01\x00" * 10)
+        fmt, offset = parse_wav_header(data)
+        assert fmt == PCMFormat(32000, 1, 2)
+        assert data[offset:] == b"\x01\x00" * 10
+
+    def test_parse_wav_header_incomplete(self):
+        data = make_wav(b"")
+        assert parse_wav_header(data[:20]) is None
+        assert parse_wav_header(data) is not None
+
+    def test_parse_wav_header_invalid(self):
+        with pytest.raises(ValueError):
+            parse_wav_header(b"NOT A WAV FILE AT ALL")
+
+    def test_decode_wav(self):
+        chunk = decode_wav(make_wav(b"\x02\x00" * 5, sample_rate=24000))
+        assert chunk.fmt == PCMFormat(24000, 1, 2)
+        assert chunk.frames == b"\x02\x00" * 5
+
+    def test_decode_wav_is_zero_copy(self):
+        data = make_wav(b"\x02\x00" * 5)
+        chunk = decode_wav(data)
+        assert isinstance(chunk.frames, memoryview)
+        assert chunk.frames.obj is data
+
+    def test_decode_wav_streaming_header_without_length(self):
+        header = make_wav(b"")
+        chunk = decode_wav(header + b"\x01\x00\x02\x00\x03")
+        assert chunk.frames == b"\x01\x00\x02\x00"
+
+    def test_build_wav_concatenates_frames(self):
+        fmt = PCMFormat(32000, 1, 2)
+        audio = build_wav([PCMChunk(b"\x01\x00" * 3, fmt), PCMChunk(memoryview(b"\x02\x00" * 2), fmt)])
+
+        with wave.open(io.BytesIO(audio), "rb") as wav_file:
+            assert wav_file.getframerate() == 32000
+            assert wav_file.getnchannels() == 1
+            assert wav_file.readframes(10) == b"\x01\x00" * 3 + b"\x02\x00" * 2
+
+    def test_build_wav_mixed_formats_converted(self):
+        audio = build_wav([
+            PCMChunk(b"\x01\x00" * 480, PCMFormat(48000, 1, 2)),
+            PCMChunk(b"\x01\x00\x01\x00" * 480, PCMFormat(48000, 2, 2)),
+        ])
+
+        with wave.open(io.BytesIO(audio), "rb") as wav_file:
+            assert wav_file.getframerate() == 48000
+            assert wav_file.getnchannels() == 2
+            assert wav_file.getnframes() == 960
+
+    def test_build_wav_empty(self):
+        assert build_wav([]) == b""
+
+    def test_resampler_passthrough(self):
+        resampler = PCMResampler(PCMFormat(48000, 2, 2))
+        assert resampler.convert(b"\x01\x00\x02\x00\x03") == b"\x01\x00\x02\x00"
+        # The trailing partial frame is kept for the next call
+        assert resampler.convert(b"\x00\x04\x00") == b"\x03\x00\x04\x00"
+
+    def test_resampler_upsamples_mono_to_stereo(self):
+        samples = np.arange(0, 24000, dtype="<i2")
+        resampler = PCMResampler(PCMFormat(24000, 1, 2))
+        out = np.frombuffer(resampler.convert(samples.tobytes()), dtype="<i2").reshape(-1, 2)
+
+        # Roughly twice as many frames, left and right channels identical
+        assert abs(len(out) - 48000) <= 2
+        assert (out[:, 0] == out[:, 1]).all()
+        assert out[1, 0] == 0 or out[1, 0] == 1
+        assert out[2, 0] == 1
+
+    def test_resampler_split_input_matches_whole(self):
+        samples = (np.sin(np.arange(3200) / 10) * 10000).astype("<i2").tobytes()
+
+        whole = PCMResampler(PCMFormat(32000, 1, 2)).convert(samples)
+
+        resampler = PCMResampler(PCMFormat(32000, 1, 2))
+        parts = b"".join(resampler.convert(samples[i:i + 333]) for i in range(0, len(samples), 333))
+
+        assert parts == whole
+
+    def test_resampler_unsupported_width(self):
+        with pytest.raises(ValueError):
+            PCMResampler(PCMFormat(32000, 1, 1))
+
+
+class TestStreamingAudioSource:
+    def test_read_frames_in_order(self):
+        source = StreamingAudioSource()
+        source.feed([b"a", b"b"])
+        assert source.read() == b"a"
+        assert source.read() == b"b"
+        assert source.fed == 2
+
+    def test_read_underrun_returns_silence(self):
+        assert StreamingAudioSource().read() == SILENCE_FRAME
+        opus_source = StreamingAudioSource(opus=True)
+        assert opus_source.is_opus()
+        assert opus_source.read() == OPUS_SILENCE_FRAME
+
+    def test_finish_ends_after_buffered_frames(self):
+        source = StreamingAudioSource()
+        source.feed([b"a"])
+        source.finish()
+        assert source.read() == b"a"
+        assert source.read() == b""
+
+    def test_cleanup(self):
+        source = StreamingAudioSource()
+        source.feed([b"a"])
+        source.cleanup()
+        assert source.read() == b""
+
+
+class TestDiscordFrameEncoder:
+    def test_pcm_frames_carry_partial_frame(self):
+        fmt = PCMFormat(48000, 2, 2)
+        with patch("bot.utils.audio_source.opus.Encoder", side_effect=OpusNotLoaded):
+            encoder = DiscordFrameEncoder()
+
+        assert not encoder.opus
+        assert encoder.encode(PCMChunk(b"\x01" * (DISCORD_FRAME_SIZE - 10), fmt)) == []
+        frames = encoder.encode(PCMChunk(b"\x02" * 20, fmt))
+        assert frames == [b"\x01" * (DISCORD_FRAME_SIZE - 10) + b"\x02" * 10]
+        assert encoder.flush() == [(b"\x02" * 10).ljust(DISCORD_FRAME_SIZE, b"\x00")]
+        assert encoder.flush() == []
+
+    def test_resamples_and_encodes_opus(self):
+        opus_encoder = MagicMock()
+        opus_encoder.SAMPLES_PER_FRAME = 960
+        opus_encoder.encode.side_effect = lambda frame, size: b"opus"
+        with patch("bot.utils.audio_source.opus.Encoder", return_value=opus_encoder):
+            encoder = DiscordFrameEncoder()
+
+        assert encoder.opus
+        # 0.5 s of 32 kHz mono becomes 25 frames of 48 kHz stereo
+        packets = encoder.encode(PCMChunk(b"\x01\x00" * 16000, PCMFormat(32000, 1, 2))) + encoder.flush()
+        assert packets == [b"opus"] * 25
+        assert all(len(call.args[0]) == DISCORD_FRAME_SIZE for call in opus_encoder.encode.call_args_list)
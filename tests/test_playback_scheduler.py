@@ -0,0 +1,159 @@
+import asyncio
+import time
+from typing import NamedTuple, Optional
+
+import pytest
+from bot.utils.playback_scheduler import PlaybackScheduler, Priority
+
+
+class Item(NamedTuple):
+    name: str
+    user_id: Optional[int] = None
+    priority: Priority = Priority.PASSIVE
+    enqueued_at: Optional[float] = None
+    deadline: Optional[float] = None
+
+
+def drain(scheduler):
+    names = []
+    while not scheduler.empty():
+        names.append(scheduler.get_nowait().name)
+    return names
+
+
+class TestPlaybackScheduler:
+    def test_fifo_for_single_user(self):
+        scheduler = PlaybackScheduler(max_per_user=0)
+        for name in ("a", "b", "c"):
+            scheduler.put_nowait(Item(name, 1))
+        assert drain(scheduler) == ["a", "b", "c"]
+
+    def test_interactive_before_passive(self):
+        scheduler = PlaybackScheduler(max_per_user=0)
+        scheduler.put_nowait(Item("chat1", 1))
+        scheduler.put_nowait(Item("chat2", 1))
+        scheduler.put_nowait(Item("command", 2, Priority.INTERACTIVE))
+        assert drain(scheduler) == ["command", "chat1", "chat2"]
+
+    def test_round_robin_between_users(self):
+        scheduler = PlaybackScheduler(max_per_user=0)
+        for i in range(3):
+            scheduler.put_nowait(Item(f"chatty{i}", 1))
+        scheduler.put_nowait(Item("quiet", 2))
+        assert drain(scheduler) == ["chatty0", "quiet", "chatty1", "chatty2"]
+
+    def test_per_user_cap(self):
+        scheduler = PlaybackScheduler(max_per_user=2)
+        assert scheduler.put_nowait(Item("a", 1))
+        assert scheduler.put_nowait(Item("b", 1, Priority.INTERACTIVE))
+        assert not scheduler.put_nowait(Item("c", 1))
+        assert scheduler.put_nowait(Item("other", 2))
+        assert scheduler.put_nowait(Item("anonymous1"))
+        assert scheduler.put_nowait(Item("anonymous2"))
+        assert scheduler.put_nowait(Item("anonymous3"))
+        assert scheduler.rejected == 1
+
+        scheduler.get_nowait()
+        assert scheduler.put_nowait(Item("c", 1))
+
+    def test_get_nowait_empty(self):
+        with pytest.raises(asyncio.QueueEmpty):
+            PlaybackScheduler().get_nowait()
+
+    @pytest.mark.asyncio
+    async def test_get_waits_for_item(self):
+        scheduler = PlaybackScheduler()
+        getter = asyncio.create_task(scheduler.get())
+        await asyncio.sleep(0)
+        assert not getter.done()
+
+        scheduler.put_nowait(Item("a", 1))
+        assert (await asyncio.wait_for(getter, timeout=1)).name == "a"
+
+    @pytest.mark.asyncio
+    async def test_cancelled_get_keeps_item(self):
+        scheduler = PlaybackScheduler()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.get(), timeout=0.01)
+        scheduler.put_nowait(Item("a", 1))
+        assert len(scheduler) == 1
+
+    def test_snapshot(self):
+        scheduler = PlaybackScheduler(max_per_user=1)
+        scheduler.put_nowait(Item("a", 1))
+        scheduler.put_nowait(Item("b", 2, Priority.INTERACTIVE))
+        scheduler.put_nowait(Item("c", 2))
+        scheduler.get_nowait()
+
+        assert scheduler.snapshot() == {
+            "size": 1,
+            "by_priority": {"interactive": 0, "passive": 1},
+            "by_user": {1: 1},
+            "oldest_age": 0.0,
+            "served": 1,
+            "rejected": 1,
+            "dropped": 0,
+            "expired": 0,
+        }
+
+    def test_position_of(self):
+        scheduler = PlaybackScheduler(max_per_user=0)
+        for i in range(5):
+            scheduler.put_nowait(Item(f"chatty{i}", 1))
+        scheduler.put_nowait(Item("command", 3, Priority.INTERACTIVE))
+
+        # A new user's chat waits for the command plus at most one chatty message
+        assert scheduler.position_of(2, Priority.PASSIVE) == 2
+        assert scheduler.position_of(2, Priority.INTERACTIVE) == 1
+        assert scheduler.position_of(1, Priority.PASSIVE) == 6
+
+    def test_expired_items_skipped(self):
+        scheduler = PlaybackScheduler(max_per_user=0)
+        past = time.monotonic() - 1
+        scheduler.put_nowait(Item("stale", 1, deadline=past))
+        scheduler.put_nowait(Item("fresh", 1, deadline=past + 60))
+        scheduler.put_nowait(Item("stale2", 2, deadline=past))
+
+        assert drain(scheduler) == ["fresh"]
+        assert scheduler.expired == 2
+        assert scheduler.served == 1
+
+    @pytest.mark.asyncio
+    async def test_get_waits_when_only_expired_items(self):
+        scheduler = PlaybackScheduler()
+        scheduler.put_nowait(Item("stale", 1, deadline=time.monotonic() - 1))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.get(), timeout=0.01)
+        assert scheduler.empty()
+
+    def test_max_depth_drops_oldest_passive(self):
+        scheduler = PlaybackScheduler(max_per_user=0, max_depth=2)
+        scheduler.put_nowait(Item("old", 1, enqueued_at=1.0))
+        scheduler.put_nowait(Item("new", 2, enqueued_at=2.0))
+        assert scheduler.put_nowait(Item("command", 3, Priority.INTERACTIVE, enqueued_at=3.0))
+
+        assert drain(scheduler) == ["command", "new"]
+        assert scheduler.dropped == 1
+
+    def test_max_depth_drops_expired_first(self):
+        scheduler = PlaybackScheduler(max_per_user=0, max_depth=2)
+        scheduler.put_nowait(Item("old", 1, enqueued_at=1.0))
+        scheduler.put_nowait(Item("stale", 2, enqueued_at=2.0, deadline=time.monotonic() - 1))
+        assert scheduler.put_nowait(Item("next", 3, enqueued_at=3.0))
+
+        assert drain(scheduler) == ["old", "next"]
+        assert scheduler.expired == 1
+        assert scheduler.dropped == 0
+
+    def test_max_depth_rejects_when_full_of_commands(self):
+        scheduler = PlaybackScheduler(max_per_user=0, max_depth=1)
+        scheduler.put_nowait(Item("command", 1, Priority.INTERACTIVE))
+        assert not scheduler.put_nowait(Item("chat", 2))
+        assert not scheduler.put_nowait(Item("command2", 2, Priority.INTERACTIVE))
+        assert scheduler.rejected == 2
+        assert drain(scheduler) == ["command"]
+
+    def test_snapshot_oldest_age(self):
+        scheduler = PlaybackScheduler()
+        scheduler.put_nowait(Item("a", 1, enqueued_at=time.monotonic() - 5))
+        assert scheduler.snapshot()["oldest_age"] >= 5
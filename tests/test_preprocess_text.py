@@ -0,0 +1,51 @@
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from bot.api import async_tts_handler
+from bot.api.async_tts_handler import preprocess_text
+
+GOLDEN = json.loads((Path(__file__).parent / "fixtures" / "preprocess_golden.json").read_text(encoding="utf-8"))
+
+
+def fake_message(guild_id: int = 1):
+    members = GOLDEN["members"]
+    channels = GOLDEN["channels"]
+    guild = SimpleNamespace(
+        id=guild_id,
+        get_member=MagicMock(
+            side_effect=lambda i: SimpleNamespace(display_name=members[str(i)]) if str(i) in members else None
+        ),
+        get_channel=MagicMock(
+            side_effect=lambda i: SimpleNamespace(name=channels[str(i)]) if str(i) in channels else None
+        ),
+    )
+    return SimpleNamespace(guild=guild)
+
+
+class TestPreprocessText:
+    @pytest.mark.parametrize("case", GOLDEN["cases"], ids=lambda case: repr(case["text"][:30]))
+    def test_golden_output(self, case):
+        message = fake_message() if case["message"] else None
+        assert preprocess_text(case["text"], message) == case["expected"]
+
+    def test_mention_lookups_memoized_per_guild(self):
+        message = fake_message()
+        preprocess_text("<@123> <@123> <#456>", message)
+        preprocess_text("<@123> 在 <#456>", message)
+        assert message.guild.get_member.call_count == 1
+        assert message.guild.get_channel.call_count == 1
+
+        other = fake_message(guild_id=2)
+        preprocess_text("<@123>", other)
+        assert other.guild.get_member.call_count == 1
+
+    def test_mention_cache_expires(self):
+        message = fake_message()
+        with patch.object(async_tts_handler.time, "monotonic", return_value=0):
+            preprocess_text("<@123>", message)
+        with patch.object(async_tts_handler.time, "monotonic", return_value=async_tts_handler._MENTION_CACHE_TTL + 1):
+            preprocess_text("<@123>", message)
+        assert message.guild.get_member.call_count == 2
@@ -0,0 +1,62 @@
+from bot.api.quality_tiers import QUALITY_TIERS, LoadMonitor
+
+
+class TestLoadMonitor:
+    def make_monitor(self, **kwargs):
+        return LoadMonitor(
+            enabled=kwargs.get("enabled", True),
+            backlog_thresholds=[5, 10],
+            latency_thresholds=[4, 8],
+        )
+
+    def test_full_quality_when_idle(self):
+        monitor = self.make_monitor()
+        assert monitor.tier == QUALITY_TIERS[0]
+        assert monitor.tier.speed_factor == 1
+        assert monitor.tier.sample_steps == 32
+
+    def test_backlog_raises_tier(self):
+        monitor = self.make_monitor()
+        monitor.report_backlog(1, 5)
+        assert monitor.tier.name == "fast"
+        monitor.report_backlog(2, 12)
+        assert monitor.tier.name == "rush"
+        assert monitor.tier.speed_factor > QUALITY_TIERS[1].speed_factor
+        assert monitor.tier.sample_steps < QUALITY_TIERS[1].sample_steps
+
+    def test_latency_raises_tier(self):
+        monitor = self.make_monitor()
+        monitor.record_latency(5)
+        assert monitor.tier.name == "fast"
+        assert monitor.stats()["latency"] == 5
+
+    def test_recovers_with_hysteresis(self):
+        monitor = self.make_monitor()
+        monitor.report_backlog(1, 6)
+        assert monitor.tier.name == "fast"
+
+        # Just below the threshold keeps the degraded tier
+        monitor.report_backlog(1, 4)
+        assert monitor.tier.name == "fast"
+
+        monitor.report_backlog(1, 3)
+        assert monitor.tier.name == "full"
+
+        monitor.report_backlog(1, 0)
+        assert monitor.stats()["backlog"] == 0
+
+    def test_disabled_keeps_full_quality(self):
+        monitor = self.make_monitor(enabled=False)
+        monitor.report_backlog(1, 100)
+        monitor.record_latency(100)
+        assert monitor.tier.name == "full"
+
+    def test_stats(self):
+        monitor = self.make_monitor()
+        monitor.report_backlog(1, 2)
+        monitor.report_backlog(2, 7)
+        stats = monitor.stats()
+        assert stats["tier"] == "fast"
+        assert stats["level"] == 1
+        assert stats["backlog"] == 7
+        assert stats["latency"] is None
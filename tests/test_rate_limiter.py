@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from unittest.mock import patch
+from bot.api import async_tts_handler
+from bot.utils.rate_limiter import ConcurrencyLimiter, RateLimiter, TokenBucket
+
+
+class TestTokenBucket:
+    def test_burst_then_refill(self):
+        bucket = TokenBucket(rate=1, capacity=2, now=0)
+        for _ in range(2):
+            assert bucket.retry_after(now=0) == 0
+            bucket.take()
+        assert bucket.retry_after(now=0) == pytest.approx(1)
+        assert bucket.retry_after(now=0.5) == pytest.approx(0.5)
+        assert bucket.retry_after(now=1) == 0
+
+    def test_refill_capped_at_capacity(self):
+        bucket = TokenBucket(rate=1, capacity=2, now=0)
+        bucket.take(2)
+        bucket.refill(now=100)
+        assert bucket.tokens == 2
+        assert bucket.is_full(now=100)
+
+
+class TestRateLimiter:
+    def test_user_limit(self):
+        limiter = RateLimiter(user_rate=60, user_burst=2, guild_rate=0)
+        assert limiter.acquire(1, 10) == 0
+        assert limiter.acquire(1, 10) == 0
+        assert limiter.acquire(1, 10) > 0
+        # Other users are unaffected
+        assert limiter.acquire(2, 10) == 0
+        assert limiter.stats()["rejected"] == 1
+
+    def test_guild_limit_shared_by_users(self):
+        limiter = RateLimiter(user_rate=60, user_burst=5, guild_rate=60, guild_burst=2)
+        assert limiter.acquire(1, 10) == 0
+        assert limiter.acquire(2, 10) == 0
+        assert limiter.acquire(3, 10) > 0
+        assert limiter.acquire(3, 20) == 0
+
+    def test_rejection_consumes_nothing(self):
+        limiter = RateLimiter(user_rate=60, user_burst=1, guild_rate=60, guild_burst=1)
+        assert limiter.acquire(1, 10) == 0
+        # Rejected by the guild bucket, so user 2 keeps their token for later
+        assert limiter.acquire(2, 10) > 0
+        assert limiter._buckets[("user", 2)].tokens == 1
+
+    def test_disabled(self):
+        limiter = RateLimiter(user_rate=0, guild_rate=0)
+        assert all(limiter.acquire(1, 10) == 0 for _ in range(100))
+
+    def test_should_notify_once_per_streak(self):
+        limiter = RateLimiter(user_rate=60, user_burst=1, guild_rate=0)
+        limiter.acquire(1, 10)
+        assert limiter.should_notify(1)
+        assert not limiter.should_notify(1)
+
+        limiter._buckets[("user", 1)].tokens = 1
+        assert limiter.acquire(1, 10) == 0
+        assert limiter.should_notify(1)
+
+    def test_prunes_idle_buckets(self):
+        limiter = RateLimiter(user_rate=60, user_burst=1, guild_rate=0)
+        with patch("bot.utils.rate_limiter._PRUNE_THRESHOLD", 3):
+            for user_id in range(3):
+                limiter.acquire(user_id, None)
+            for bucket in limiter._buckets.values():
+                bucket.updated_at -= 60
+            limiter.acquire(99, None)
+        assert list(limiter._buckets) == [("user", 99)]
+
+
+class TestConcurrencyLimiter:
+    @pytest.mark.asyncio
+    async def test_limits_concurrency(self):
+        limiter = ConcurrencyLimiter(limit=2)
+        in_flight = 0
+        peak = 0
+
+        async def work():
+            nonlocal in_flight, peak
+            async with limiter:
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+
+        await asyncio.gather(*(work() for _ in range(5)))
+        assert peak == 2
+        assert limiter.stats() == {"limit": 2, "active": 0, "waiting": 0}
+
+    @pytest.mark.asyncio
+    async def test_try_acquire(self):
+        limiter = ConcurrencyLimiter(limit=1)
+        assert await limiter.try_acquire()
+        assert not await limiter.try_acquire()
+        limiter.release()
+        assert limiter.stats() == {"limit": 1, "active": 0, "waiting": 0}
+
+    @pytest.mark.asyncio
+    async def test_bounds_backend_requests_across_calls(self, monkeypatch):
+        monkeypatch.setattr(async_tts_handler, "tts_concurrency", ConcurrencyLimiter(limit=1))
+        in_flight = 0
+        peak = 0
+
+        async def fake_request(chunk, character_sample, tier=None):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return b""
+
+        sample = {"file": "a.wav", "text": "hi", "name": "char"}
+        with patch.object(async_tts_handler, "request_chunk_audio", side_effect=fake_request):
+            await asyncio.gather(
+                *(async_tts_handler.fetch_chunk_audio(f"第{i}句", sample) for i in range(4))
+            )
+        assert peak == 1
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from bot.utils.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_result(self):
+        flights = SingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def work():
+            calls.append(1)
+            await release.wait()
+            return bytearray(b"audio")
+
+        waiters = [asyncio.create_task(flights.do("key", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert flights.in_flight == 1
+        release.set()
+        results = await asyncio.gather(*waiters)
+
+        assert calls == [1]
+        assert all(result is results[0] for result in results)
+        assert flights.shared == 2
+        assert flights.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_different_keys_run_separately(self):
+        flights = SingleFlight()
+
+        async def work(value):
+            await asyncio.sleep(0)
+            return value
+
+        results = await asyncio.gather(
+            flights.do("a", lambda: work("a")), flights.do("b", lambda: work("b"))
+        )
+        assert results == ["a", "b"]
+        assert flights.shared == 0
+
+    @pytest.mark.asyncio
+    async def test_finished_flight_runs_again(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return len(calls)
+
+        assert await flights.do("key", work) == 1
+        assert await flights.do("key", work) == 2
+
+    @pytest.mark.asyncio
+    async def test_error_shared_and_forgotten(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            raise RuntimeError("boom")
+
+        waiters = [asyncio.create_task(flights.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert flights.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_others(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+        cancelled = []
+
+        async def work():
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return "done"
+
+        first = asyncio.create_task(flights.do("key", work))
+        second = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        release.set()
+
+        assert await second == "done"
+        assert first.cancelled()
+        assert cancelled == []
+
+    @pytest.mark.asyncio
+    async def test_last_waiter_cancel_cancels_work(self):
+        flights = SingleFlight()
+        cancelled = []
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        waiter = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        assert cancelled == [True]
+        assert flights.in_flight == 0
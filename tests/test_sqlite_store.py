@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from unittest.mock import patch
+from bot.character_registry import CharacterRegistry
+from bot.sqlite_store import SQLiteStore
+from bot.user_settings import UserSettingsStore
+
+
+@pytest.fixture
+def database(tmp_path):
+    store = SQLiteStore(str(tmp_path / "user_data.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def json_files(tmp_path):
+    settings_file = tmp_path / "user_settings.json"
+    user_voice_file = tmp_path / "user_voice.json"
+    settings_file.write_text(
+        json.dumps({"user_settings": {"123": {"game_id": "abc", "character": "角色A"}, "456": {"character": "角色B"}}}),
+        encoding="utf-8",
+    )
+    user_voice_file.write_text(json.dumps({"123": {"file": "123.wav", "text": "我的聲音"}}), encoding="utf-8")
+    return str(settings_file), str(user_voice_file)
+
+
+class TestSQLiteStore:
+    def test_uses_wal_mode(self, database):
+        assert database.connect().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_settings_roundtrip(self, database):
+        database.save_settings({"123": {"game_id": "abc", "character": "角色A"}, "456": {}})
+        assert database.load_settings() == {"123": {"game_id": "abc", "character": "角色A"}, "456": {}}
+
+        database.save_settings({"456": {"character": "角色B"}})
+        assert database.load_settings()["456"] == {"character": "角色B"}
+
+    def test_failed_transaction_rolls_back(self, database):
+        database.save_settings({"123": {"game_id": "abc"}})
+        with pytest.raises(ValueError):
+            database.save_settings({"456": {}, "not a number": {}})
+        assert database.load_settings() == {"123": {"game_id": "abc"}}
+
+    def test_import_json_runs_once(self, database, json_files):
+        assert database.import_json(*json_files) == (2, 1)
+        assert database.load_settings()["123"] == {"game_id": "abc", "character": "角色A"}
+        assert database.load_user_voices() == {"123": {"file": "123.wav", "text": "我的聲音"}}
+
+        assert database.import_json(*json_files) is None
+        assert database.import_json(*json_files, force=True) == (2, 1)
+
+    def test_import_missing_files(self, database, tmp_path):
+        assert database.import_json(str(tmp_path / "missing.json"), str(tmp_path / "missing_voice.json")) == (0, 0)
+        assert database.is_imported()
+
+    @pytest.mark.asyncio
+    async def test_run_off_event_loop(self, database):
+        database.save_settings({"123": {"game_id": "abc"}})
+        assert await database.run(database.load_settings) == {"123": {"game_id": "abc"}}
+        thread_name = await database.run(lambda: threading.current_thread().name)
+        assert thread_name.startswith("sqlite_store")
+
+
+class TestSQLiteBackedStores:
+    @pytest.mark.asyncio
+    async def test_settings_store_saves_only_changed_users(self, database, json_files, tmp_path):
+        database.import_json(*json_files)
+        store = UserSettingsStore(json_files[0], str(tmp_path / "mapping.json"), flush_delay=0.01, database=database)
+        assert store.get(123) == {"game_id": "abc", "character": "角色A"}
+        assert store.user_id_by_game_id("abc") == 123
+
+        with patch.object(database, "save_settings", wraps=database.save_settings) as save:
+            store.set(456, {"character": "角色B", "game_id": "def"})
+            store.set(456, {"character": "角色C", "game_id": "def"})
+            await asyncio.sleep(0.05)
+        save.assert_called_once_with({"456": {"character": "角色C", "game_id": "def"}})
+        assert database.load_settings()["456"] == {"character": "角色C", "game_id": "def"}
+
+        # The in-memory game ID index replaces the reverse mapping file
+        assert store.game_id_mapping() == {"abc": 123, "def": 456}
+        await store.close()
+        assert not (tmp_path / "mapping.json").exists()
+
+    @pytest.mark.asyncio
+    async def test_registry_reads_user_voices_from_database(self, database, json_files, tmp_path):
+        sample_file = tmp_path / "sample_data.json"
+        sample_file.write_text(json.dumps({"角色A": {"file": "a.wav", "text": "你好"}}), encoding="utf-8")
+        registry = CharacterRegistry(str(sample_file), json_files[1], database=database, refresh_interval=0.01)
+        await registry.start()
+        assert registry.get("123") == {}
+
+        database.import_json(*json_files)
+        await asyncio.sleep(0.05)
+        assert registry.get("123") == {"file": "123.wav", "text": "我的聲音"}
+        assert registry.get("角色A")["file"] == "a.wav"
+        await registry.close()
+
+    @pytest.mark.asyncio
+    async def test_registry_lookups_do_not_touch_database(self, database, json_files, tmp_path):
+        database.import_json(*json_files)
+        registry = CharacterRegistry(str(tmp_path / "sample_data.json"), json_files[1], database=database)
+        await registry.refresh_user_voices()
+
+        with patch.object(database, "signature") as signature, patch.object(database, "load_user_voices") as load:
+            assert "123" in registry.user_voices
+            registry.invalidate()
+            assert registry.get("123") == {"file": "123.wav", "text": "我的聲音"}
+        signature.assert_not_called()
+        load.assert_not_called()
@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiohttp import ClientConnectionError, web
+from aiohttp.test_utils import TestServer
+from bot.api.tts_backends import BackendPool
+from bot.api.tts_client import TTSClient
+
+
+def make_app(name: str, status: int = 200, health_status: int = 200, calls: list = None):
+    async def tts(request):
+        payload = await request.json()
+        if calls is not None:
+            calls.append((name, payload["text"]))
+        return web.Response(status=status, body=name.encode())
+
+    async def docs(request):
+        return web.Response(status=health_status)
+
+    app = web.Application()
+    app.router.add_post("/tts/", tts)
+    app.router.add_get("/docs", docs)
+    return app
+
+
+class TestBackendPool:
+    @pytest_asyncio.fixture
+    async def client(self):
+        client = TTSClient()
+        yield client
+        await client.close()
+
+    def test_requires_backend(self):
+        with pytest.raises(ValueError):
+            BackendPool([])
+
+    def test_candidates_sticky_per_character(self):
+        pool = BackendPool([f"http://tts{i}/tts/" for i in range(4)], health_path="")
+        first = pool.candidates("角色A")[0]
+        assert all(pool.candidates("角色A")[0] is first for _ in range(5))
+        assert {pool.candidates(f"角色{i}")[0].url for i in range(50)} == {b.url for b in pool.backends}
+
+    def test_candidates_least_outstanding_when_sticky_busy(self):
+        pool = BackendPool(["http://a/tts/", "http://b/tts/", "http://c/tts/"], health_path="", sticky_slack=2)
+        sticky = pool.candidates("角色")[0]
+        sticky.outstanding = 2
+        assert pool.candidates("角色")[0] is sticky
+
+        sticky.outstanding = 3
+        others = [b for b in pool.backends if b is not sticky]
+        others[0].outstanding = 1
+        ordered = pool.candidates("角色")
+        assert ordered[0] is others[1]
+        assert ordered[1] is sticky
+
+    def test_candidates_unhealthy_last(self):
+        pool = BackendPool(["http://a/tts/", "http://b/tts/"], health_path="")
+        sticky = pool.candidates("角色")[0]
+        sticky.healthy = False
+        ordered = pool.candidates("角色")
+        assert ordered[0] is not sticky
+        assert ordered[-1] is sticky
+
+    @pytest.mark.asyncio
+    async def test_post_routes_sticky_backend(self, client):
+        calls = []
+        async with TestServer(make_app("a", calls=calls)) as a, TestServer(make_app("b", calls=calls)) as b:
+            pool = BackendPool([str(a.make_url("/tts/")), str(b.make_url("/tts/"))], client=client, health_path="")
+            sticky = pool.candidates("角色")[0]
+            expected = "a" if sticky is pool.backends[0] else "b"
+            for text in ("1", "2", "3"):
+                async with pool.post("角色", {"text": text}) as response:
+                    assert response.status == 200
+                    assert await response.read() == expected.encode()
+
+        assert calls == [(expected, "1"), (expected, "2"), (expected, "3")]
+        assert sticky.requests == 3
+        assert all(backend.outstanding == 0 for backend in pool.backends)
+
+    @pytest.mark.asyncio
+    async def test_post_fails_over_on_server_error(self, client):
+        calls = []
+        async with TestServer(make_app("bad", status=503, calls=calls)) as bad, \
+                TestServer(make_app("good", calls=calls)) as good:
+            pool = BackendPool([str(bad.make_url("/tts/")), str(good.make_url("/tts/"))], client=client, health_path="")
+            # Make the failing node the preferred one
+            pool.backends[0].weight = lambda character: 1
+            pool.backends[1].weight = lambda character: 0
+
+            async with pool.post("角色", {"text": "你好"}) as response:
+                assert await response.read() == b"good"
+
+        assert [name for name, _ in calls] == ["bad", "good"]
+        assert not pool.backends[0].healthy
+        assert pool.backends[0].last_error == "HTTP 503"
+        assert pool.backends[1].healthy
+
+    @pytest.mark.asyncio
+    async def test_post_fails_over_on_connection_error(self, client):
+        async with TestServer(make_app("good")) as good:
+            pool = BackendPool(["http://127.0.0.1:1/tts/", str(good.make_url("/tts/"))], client=client, health_path="")
+            pool.backends[0].weight = lambda character: 1
+            pool.backends[1].weight = lambda character: 0
+
+            async with pool.post("角色", {"text": "你好"}) as response:
+                assert await response.read() == b"good"
+
+        assert not pool.backends[0].healthy
+        assert pool.backends[0].failures == 1
+
+    @pytest.mark.asyncio
+    async def test_post_last_backend_error_is_raised(self, client):
+        pool = BackendPool(["http://127.0.0.1:1/tts/"], client=client, health_path="")
+        with pytest.raises(ClientConnectionError):
+            async with pool.post("角色", {"text": "你好"}):
+                pass
+        assert pool.backends[0].outstanding == 0
+
+    @pytest.mark.asyncio
+    async def test_post_last_backend_server_error_returned(self, client):
+        async with TestServer(make_app("bad", status=500)) as bad:
+            pool = BackendPool([str(bad.make_url("/tts/"))], client=client, health_path="")
+            async with pool.post("角色", {"text": "你好"}) as response:
+                assert response.status == 500
+
+    @pytest.mark.asyncio
+    async def test_health_check_marks_and_recovers(self, client):
+        async with TestServer(make_app("down", health_status=503)) as down, TestServer(make_app("up")) as up:
+            pool = BackendPool([str(down.make_url("/tts/")), str(up.make_url("/tts/"))], client=client)
+            await pool.check_health()
+            assert [backend.healthy for backend in pool.backends] == [False, True]
+
+            pool.backends[0].url = str(up.make_url("/tts/"))
+            await pool.check_health()
+            assert all(backend.healthy for backend in pool.backends)
+
+    @pytest.mark.asyncio
+    async def test_start_and_close_health_loop(self, client):
+        async with TestServer(make_app("up")) as up:
+            pool = BackendPool([str(up.make_url("/tts/"))], client=client, health_interval=0.01)
+            pool.backends[0].healthy = False
+            await pool.start()
+            await asyncio.sleep(0.1)
+            await pool.close()
+
+        assert pool.backends[0].healthy
+        assert pool.stats()[0]["healthy"]
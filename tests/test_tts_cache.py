@@ -0,0 +1,145 @@
+import os
+import threading
+
+import pytest
+from unittest.mock import patch
+from bot.api import tts_cache
+from bot.api.tts_cache import TTSCache, normalize_text, sample_fingerprint, sample_fingerprint_async
+
+
+class TestTTSCache:
+    def test_normalize_text(self):
+        assert normalize_text("  gg \n  wp ") == "gg wp"
+
+    def test_make_key_normalizes_text(self):
+        key1 = TTSCache.make_key("X 說: gg", "char", "hash", {"speed_factor": 1})
+        key2 = TTSCache.make_key(" X 說:  gg ", "char", "hash", {"speed_factor": 1})
+        assert key1 == key2
+
+    def test_make_key_depends_on_params(self):
+        key1 = TTSCache.make_key("gg", "char", "hash", {"speed_factor": 1})
+        key2 = TTSCache.make_key("gg", "char", "hash", {"speed_factor": 1.2})
+        key3 = TTSCache.make_key("gg", "char", "other", {"speed_factor": 1})
+        assert len({key1, key2, key3}) == 3
+
+    def test_sample_fingerprint(self, tmp_path):
+        sample = tmp_path / "a.wav"
+        sample.write_bytes(b"abc")
+        first = sample_fingerprint(str(sample))
+        assert sample_fingerprint(str(sample)) == first
+
+        sample.write_bytes(b"abcd")
+        assert sample_fingerprint(str(sample)) != first
+
+    def test_sample_fingerprint_missing_file(self, tmp_path):
+        assert sample_fingerprint(str(tmp_path / "missing.wav")).startswith("path:")
+
+    def test_sample_fingerprint_cache_is_bounded(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(tts_cache, "_SAMPLE_FINGERPRINT_CACHE_SIZE", 2)
+        monkeypatch.setattr(tts_cache, "_sample_fingerprints", tts_cache.OrderedDict())
+        paths = []
+        for name in ("a", "b", "c"):
+            sample = tmp_path / f"{name}.wav"
+            sample.write_bytes(name.encode())
+            paths.append(str(sample))
+            sample_fingerprint(str(sample))
+            # Each path keeps a single entry even after it changes
+            sample.write_bytes(name.encode() * 2)
+            sample_fingerprint(str(sample))
+        assert list(tts_cache._sample_fingerprints) == paths[1:]
+
+    @pytest.mark.asyncio
+    async def test_sample_fingerprint_async_hashes_off_loop(self, tmp_path):
+        sample = tmp_path / "b.wav"
+        sample.write_bytes(b"abc")
+        threads = []
+
+        def record(path):
+            threads.append(threading.current_thread())
+            return "hash"
+
+        with patch.object(tts_cache, "_hash_file", side_effect=record):
+            assert await sample_fingerprint_async(str(sample)) == "hash"
+            # Cached fingerprints are returned without hashing again
+            assert await sample_fingerprint_async(str(sample)) == "hash"
+        assert len(threads) == 1
+        assert threads[0] is not threading.main_thread()
+
+    @pytest.mark.asyncio
+    async def test_memory_hit_and_miss_counters(self):
+        cache = TTSCache(disk_dir=None)
+        assert await cache.get("key") is None
+        await cache.put("key", b"audio", "char")
+        assert await cache.get("key") == b"audio"
+
+        stats = cache.stats()
+        assert stats["memory_hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    @pytest.mark.asyncio
+    async def test_memory_lru_eviction(self):
+        cache = TTSCache(max_memory_bytes=10, disk_dir=None)
+        await cache.put("a", b"12345", "char")
+        await cache.put("b", b"12345", "char")
+        await cache.get("a")
+        await cache.put("c", b"12345", "char")
+
+        assert await cache.get("a") == b"12345"
+        assert await cache.get("b") is None
+        assert cache.stats()["memory_bytes"] == 10
+
+    @pytest.mark.asyncio
+    async def test_disk_tier_hit_after_memory_eviction(self, tmp_path):
+        cache = TTSCache(max_memory_bytes=5, disk_dir=str(tmp_path), max_disk_bytes=100)
+        await cache.put("a", b"12345", "char")
+        await cache.put("b", b"12345", "char")
+
+        assert await cache.get("a") == b"12345"
+        assert cache.stats()["disk_hits"] == 1
+
+        # A fresh cache picks up existing entries from disk
+        reloaded = TTSCache(disk_dir=str(tmp_path), max_disk_bytes=100)
+        assert await reloaded.get("b") == b"12345"
+
+    @pytest.mark.asyncio
+    async def test_disk_lru_order_survives_restart(self, tmp_path):
+        cache = TTSCache(max_memory_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=100)
+        for key in ("a", "b", "c"):
+            await cache.put(key, b"12345", "char")
+        # Age the files so the read below is clearly the most recent use
+        for i, name in enumerate(sorted(os.listdir(tmp_path), key=lambda n: n.split("-")[1])):
+            os.utime(tmp_path / name, (1_000_000 + i, 1_000_000 + i))
+        assert await cache.get("a") == b"12345"
+
+        reloaded = TTSCache(max_memory_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=100)
+        reloaded._load_disk_index()
+        assert list(reloaded._disk) == ["b", "c", "a"]
+
+    @pytest.mark.asyncio
+    async def test_disk_size_cap(self, tmp_path):
+        cache = TTSCache(max_memory_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=10)
+        await cache.put("a", b"12345", "char")
+        await cache.put("b", b"12345", "char")
+        await cache.put("c", b"12345", "char")
+
+        assert cache.stats()["disk_bytes"] == 10
+        assert len(os.listdir(tmp_path)) == 2
+        assert await cache.get("a") is None
+
+    @pytest.mark.asyncio
+    async def test_invalidate_character(self, tmp_path):
+        cache = TTSCache(disk_dir=str(tmp_path))
+        await cache.put("a", b"audio", "char1")
+        await cache.put("b", b"audio", "char2")
+
+        assert await cache.invalidate_character("char1") == 2
+        assert await cache.get("a") is None
+        assert await cache.get("b") == b"audio"
+        assert len(os.listdir(tmp_path)) == 1
+
+    @pytest.mark.asyncio
+    async def test_disabled(self):
+        cache = TTSCache(disk_dir=None, enabled=False)
+        await cache.put("a", b"audio", "char")
+        assert await cache.get("a") is None
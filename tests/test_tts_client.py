@@ -0,0 +1,45 @@
+import pytest
+from bot.api.tts_client import TTSClient
+
+
+class TestTTSClient:
+    @pytest.mark.asyncio
+    async def test_session_is_reused(self):
+        client = TTSClient()
+        session1 = client.session
+        session2 = client.session
+        assert session1 is session2
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_connector_settings(self):
+        client = TTSClient(limit=10, limit_per_host=4, keepalive_timeout=30, dns_cache_ttl=120, timeout=60)
+        session = client.session
+        connector = session.connector
+        assert connector.limit == 10
+        assert connector.limit_per_host == 4
+        assert connector.use_dns_cache
+        assert session.timeout.total == 60
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_close_and_restart(self):
+        client = TTSClient()
+        await client.start()
+        session = client.session
+        assert not client.closed
+
+        await client.close()
+        assert client.closed
+        assert session.closed
+
+        # Accessing the session again should create a new one
+        assert client.session is not session
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_close_without_session(self):
+        client = TTSClient()
+        # Should not raise error
+        await client.close()
+        assert client.closed
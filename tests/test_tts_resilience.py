@@ -0,0 +1,320 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientConnectionError, web
+from aiohttp.test_utils import TestServer
+from unittest.mock import MagicMock, patch
+from bot.api import async_tts_handler
+from bot.api.tts_backends import BackendPool
+from bot.api.tts_client import TTSClient
+from bot.api.tts_resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    ResilientCaller,
+    TTSHTTPError,
+    is_retryable,
+)
+from bot.utils.pcm import PCMFormat, encode_wav, PCMChunk
+from bot.utils.rate_limiter import ConcurrencyLimiter
+
+
+def make_caller(**kwargs) -> ResilientCaller:
+    kwargs.setdefault("base_delay", 0)
+    kwargs.setdefault("breaker", CircuitBreaker(threshold=3, cooldown=60))
+    return ResilientCaller(**kwargs)
+
+
+def failing(errors: list, result="ok"):
+    """Return a request factory that raises the given errors in order, then succeeds."""
+    calls = []
+
+    async def request():
+        calls.append(len(calls))
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    return request, calls
+
+
+class TestLatencyTracker:
+    def test_percentile(self):
+        tracker = LatencyTracker()
+        assert tracker.percentile(50) is None
+        for value in range(1, 101):
+            tracker.record(float(value))
+        assert tracker.percentile(50) == 51.0
+        assert tracker.percentile(99) == 99.0
+        assert tracker.percentile(100) == 100.0
+
+    def test_keeps_recent_samples(self):
+        tracker = LatencyTracker(size=3)
+        for value in (100.0, 1.0, 2.0, 3.0):
+            tracker.record(value)
+        assert len(tracker) == 3
+        assert tracker.percentile(100) == 3.0
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=60)
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_allows_single_probe(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=0)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=60)
+        breaker.record_failure()
+        breaker._opened_at -= 60
+        breaker.before_call()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_disabled(self):
+        breaker = CircuitBreaker(threshold=0)
+        for _ in range(10):
+            breaker.record_failure()
+        breaker.before_call()
+
+
+class TestResilientCaller:
+    def test_is_retryable(self):
+        assert is_retryable(TTSHTTPError("boom", 503))
+        assert not is_retryable(TTSHTTPError("bad request", 400))
+        assert is_retryable(ClientConnectionError())
+        assert is_retryable(asyncio.TimeoutError())
+        assert not is_retryable(ValueError())
+
+    def test_timeout_from_latency(self):
+        caller = make_caller(min_timeout=1, max_timeout=60, timeout_multiplier=3)
+        assert caller.timeout() == 60
+        for _ in range(50):
+            caller.latency.record(2.0)
+        assert caller.timeout() == 6.0
+        for _ in range(200):
+            caller.latency.record(0.1)
+        assert caller.timeout() == 1
+
+    @pytest.mark.asyncio
+    async def test_retries_server_errors(self):
+        request, calls = failing([TTSHTTPError("boom", 503), ClientConnectionError()])
+        caller = make_caller(retries=2)
+        assert await caller.call(request) == "ok"
+        assert len(calls) == 3
+        assert caller.retried == 2
+        assert caller.breaker.failures == 0
+
+    @pytest.mark.asyncio
+    async def test_does_not_retry_client_errors(self):
+        request, calls = failing([TTSHTTPError("bad request", 400)])
+        caller = make_caller(retries=2)
+        with pytest.raises(TTSHTTPError):
+            await caller.call(request)
+        assert len(calls) == 1
+        assert caller.breaker.failures == 0
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_retries(self):
+        request, calls = failing([TTSHTTPError("boom", 500) for _ in range(5)])
+        caller = make_caller(retries=1)
+        with pytest.raises(TTSHTTPError):
+            await caller.call(request)
+        assert len(calls) == 2
+        assert caller.breaker.failures == 2
+
+    @pytest.mark.asyncio
+    async def test_times_out_stuck_request(self):
+        cancelled = []
+
+        async def stuck():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        caller = make_caller(retries=0, max_timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(caller.call(stuck), timeout=1)
+        assert cancelled == [True]
+        assert caller.timeouts == 1
+
+    @pytest.mark.asyncio
+    async def test_open_breaker_fails_fast(self):
+        request, calls = failing([ClientConnectionError() for _ in range(10)])
+        caller = make_caller(retries=0)
+        for _ in range(3):
+            with pytest.raises(ClientConnectionError):
+                await caller.call(request)
+        with pytest.raises(CircuitOpenError):
+            await caller.call(request)
+        assert len(calls) == 3
+        assert caller.stats()["breaker"] == CircuitBreaker.OPEN
+
+    @pytest.mark.asyncio
+    async def test_hedged_request_wins(self):
+        calls = []
+
+        async def request():
+            calls.append(len(calls))
+            # The first request is stuck, the hedged one answers quickly
+            await asyncio.sleep(10 if len(calls) == 1 else 0)
+            return len(calls)
+
+        caller = make_caller(retries=0, hedge=True, max_timeout=1)
+        for _ in range(20):
+            caller.latency.record(0.01)
+        assert await asyncio.wait_for(caller.call(request), timeout=1) == 2
+        assert caller.hedged == 1
+
+    @pytest.mark.asyncio
+    async def test_hedge_takes_a_concurrency_slot(self):
+        limiter = ConcurrencyLimiter(limit=2)
+        peaks = []
+
+        async def request():
+            peaks.append(limiter.active)
+            await asyncio.sleep(10 if len(peaks) == 1 else 0)
+            return len(peaks)
+
+        caller = make_caller(retries=0, hedge=True, max_timeout=1)
+        for _ in range(20):
+            caller.latency.record(0.01)
+        async with limiter:
+            assert await asyncio.wait_for(caller.call(request, limiter=limiter), timeout=1) == 2
+        assert peaks == [1, 2]
+        assert limiter.stats()["active"] == 0
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_without_free_slot(self):
+        limiter = ConcurrencyLimiter(limit=1)
+        calls = []
+
+        async def request():
+            calls.append(len(calls))
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        caller = make_caller(retries=0, hedge=True, max_timeout=1)
+        for _ in range(20):
+            caller.latency.record(0.01)
+        async with limiter:
+            assert await caller.call(request, limiter=limiter) == "ok"
+        assert calls == [0]
+        assert caller.hedged == 0
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_without_history(self):
+        request, calls = failing([])
+        caller = make_caller(hedge=True)
+        await caller.call(request)
+        assert caller.hedged == 0
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_guard_cancellation_releases_probe(self):
+        caller = make_caller(breaker=CircuitBreaker(threshold=1, cooldown=0))
+        caller.breaker.record_failure()
+
+        async def probe():
+            async with caller.guard():
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(probe())
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # The cancelled probe must not keep the breaker locked
+        caller.breaker.before_call()
+
+    @pytest.mark.asyncio
+    async def test_fetch_chunk_audio_retries_server_error(self, isolated_tts_resilience):
+        statuses = [503, 200]
+
+        def post(url, json):
+            response = MagicMock()
+            response.status = statuses.pop(0)
+
+            async def read():
+                return b"audio"
+
+            async def text():
+                return "error"
+
+            response.read = read
+            response.text = text
+            context = MagicMock()
+            context.__aenter__.return_value = response
+            return context
+
+        client = MagicMock()
+        client.session.post = post
+        pool = BackendPool(["http://tts/"], client=client, health_path="")
+
+        with patch.object(async_tts_handler, "backend_pool", pool):
+            content = await async_tts_handler.fetch_chunk_audio("你好", {"file": "a.wav", "text": "hi", "name": "c"})
+
+        assert content == b"audio"
+        assert isolated_tts_resilience.retried == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_chunk_pcm_times_out_stalled_backend(self, isolated_tts_resilience):
+        isolated_tts_resilience.max_timeout = 0.2
+        isolated_tts_resilience.retries = 1
+        attempts = []
+
+        async def handler(request):
+            attempts.append(len(attempts))
+            response = web.StreamResponse()
+            await response.prepare(request)
+            if len(attempts) == 1:
+                # Headers are sent, but the audio never arrives
+                await asyncio.sleep(5)
+            await response.write(encode_wav(PCMChunk(b"\x01\x00" * 4, PCMFormat(32000, 1, 2))))
+            await response.write_eof()
+            return response
+
+        app = web.Application()
+        app.router.add_post("/tts/", handler)
+        client = TTSClient()
+
+        async with TestServer(app) as server:
+            pool = BackendPool([str(server.make_url("/tts/"))], client=client, health_path="")
+            with patch.object(async_tts_handler, "backend_pool", pool):
+                pieces = await asyncio.wait_for(
+                    _collect(async_tts_handler.stream_chunk_pcm("你好", {"file": "a.wav", "text": "hi"})), timeout=3
+                )
+        await client.close()
+
+        assert b"".join(piece.frames for piece in pieces) == b"\x01\x00" * 4
+        assert len(attempts) == 2
+        assert isolated_tts_resilience.timeouts == 1
+        assert isolated_tts_resilience.retried == 1
+        assert async_tts_handler.tts_concurrency.stats()["active"] == 0
+
+
+async def _collect(stream) -> list:
+    return [piece async for piece in stream]
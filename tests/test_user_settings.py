@@ -1,55 +1,140 @@
-import pytest
-from unittest.mock import patch, mock_open, MagicMock
+import asyncio
 import json
-from bot.user_settings import get_user_settings, set_user_settings, generate_game_id_to_user_id_mapping, get_user_id_by_game_id, is_user_voice_exist
+import os
+import threading
+
+import pytest
+from unittest.mock import patch
+from bot import user_settings
+from bot.character_registry import CharacterRegistry
+from bot.user_settings import (
+    UserSettingsStore,
+    get_user_settings,
+    set_user_settings,
+    generate_game_id_to_user_id_mapping,
+    get_user_id_by_game_id,
+    is_user_voice_exist,
+)
+from utils.file_utils import write_json_atomic
+
+
+def read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def store(isolated_settings_store):
+    with open(isolated_settings_store.path, "w") as f:
+        json.dump({"user_settings": {"123": {"key": "value", "game_id": "abc"}}, "version": 1}, f)
+    return isolated_settings_store
 
 
 class TestUserSettings:
-    @patch('builtins.open', new_callable=mock_open, read_data='{"user_settings": {"123": {"key": "value"}}}')
-    def test_get_user_settings(self, mock_file):
-        result = get_user_settings(123)
-        assert result == {"key": "value"}
-
-    @patch('builtins.open', new_callable=mock_open, read_data='{"user_settings": {}}')
-    def test_get_user_settings_not_found(self, mock_file):
-        result = get_user_settings(123)
-        assert result == {}
-
-    @patch('builtins.open', new_callable=mock_open, read_data='{"user_settings": {"123": {"old": "val"}}}')
-    @patch('json.dump')
-    def test_set_user_settings(self, mock_dump, mock_file):
-        mock_file.return_value.seek = MagicMock()
-        mock_file.return_value.truncate = MagicMock()
+    def test_get_user_settings(self, store):
+        assert get_user_settings(123) == {"key": "value", "game_id": "abc"}
 
+    def test_get_user_settings_not_found(self, store):
+        assert get_user_settings(456) == {}
+
+    def test_get_returns_copy(self, store):
+        get_user_settings(123)["key"] = "changed"
+        assert get_user_settings(123)["key"] == "value"
+
+    def test_missing_file_starts_empty(self, isolated_settings_store):
+        assert get_user_settings(123) == {}
+
+    def test_set_user_settings_writes_without_loop(self, store):
         set_user_settings(123, {"new": "val"})
 
-        expected_data = {"user_settings": {"123": {"new": "val"}}}
-        mock_dump.assert_called_once_with(expected_data, mock_file.return_value, indent=4)
-
-    @patch('builtins.open', new_callable=mock_open, read_data='{"user_settings": {"123": {"game_id": "abc"}}}')
-    @patch('json.dump')
-    def test_generate_game_id_to_user_id_mapping(self, mock_dump, mock_file):
-        result = generate_game_id_to_user_id_mapping()
-
-        expected = {"abc": 123}
-        assert result == expected
-        mock_dump.assert_called_once_with(expected, mock_file.return_value, indent=4)
-    @patch('builtins.open', new_callable=mock_open, read_data='{"abc": 123}')
-    def test_get_user_id_by_game_id(self, mock_file):
-        result = get_user_id_by_game_id("abc")
-        assert result == 123
-
-    @patch('builtins.open', new_callable=mock_open, read_data='{"abc": 123}')
-    def test_get_user_id_by_game_id_not_found(self, mock_file):
-        result = get_user_id_by_game_id("xyz")
-        assert result is None
-
-    @patch('builtins.open', new_callable=mock_open, read_data='{"123": {}}')
-    def test_is_user_voice_exist_true(self, mock_file):
-        result = is_user_voice_exist(123)
-        assert result is True
-
-    @patch('builtins.open', new_callable=mock_open, read_data='{}')
-    def test_is_user_voice_exist_false(self, mock_file):
-        result = is_user_voice_exist(123)
-        assert result is False
\ No newline at end of file
+        data = read_json(store.path)
+        assert data["user_settings"] == {"123": {"new": "val"}}
+        # Unrelated top-level keys survive the rewrite
+        assert data["version"] == 1
+
+    def test_generate_game_id_to_user_id_mapping(self, store):
+        assert generate_game_id_to_user_id_mapping() == {"abc": 123}
+        assert read_json(store.mapping_path) == {"abc": 123}
+
+    def test_get_user_id_by_game_id(self, store):
+        assert get_user_id_by_game_id("abc") == 123
+        assert get_user_id_by_game_id("xyz") is None
+
+    def test_game_id_index_follows_updates(self, store):
+        set_user_settings(123, {"game_id": "new"})
+        set_user_settings(456, {"game_id": "other"})
+        assert get_user_id_by_game_id("abc") is None
+        assert get_user_id_by_game_id("new") == 123
+        assert get_user_id_by_game_id("other") == 456
+
+    def test_is_user_voice_exist(self, tmp_path, monkeypatch):
+        user_voice_file = tmp_path / "user_voice.json"
+        user_voice_file.write_text('{"123": {}}')
+        monkeypatch.setattr(
+            user_settings, "character_registry", CharacterRegistry(str(tmp_path / "sample.json"), str(user_voice_file))
+        )
+        assert is_user_voice_exist(123) is True
+        assert is_user_voice_exist(456) is False
+
+
+class TestWriteBehind:
+    @pytest.mark.asyncio
+    async def test_debounces_writes(self, store):
+        with patch.object(user_settings, "write_json_atomic", wraps=write_json_atomic) as write:
+            for i in range(10):
+                set_user_settings(i, {"game_id": f"player{i}"})
+            assert write.call_count == 0
+            assert get_user_settings(3) == {"game_id": "player3"}
+
+            await asyncio.sleep(0.05)
+            assert write.call_count == 1
+
+        data = read_json(store.path)
+        assert len(data["user_settings"]) == 11
+
+    @pytest.mark.asyncio
+    async def test_close_flushes_pending_changes(self, store):
+        store.flush_delay = 60
+        set_user_settings(123, {"game_id": "closing"})
+        assert read_json(store.path)["user_settings"]["123"]["game_id"] == "abc"
+
+        await store.close()
+        assert read_json(store.path)["user_settings"]["123"] == {"game_id": "closing"}
+
+    @pytest.mark.asyncio
+    async def test_failed_write_is_retried(self, store):
+        with patch.object(user_settings, "write_json_atomic", side_effect=[OSError("disk full"), None]) as write:
+            set_user_settings(123, {"game_id": "retry"})
+            await asyncio.sleep(0.05)
+        assert write.call_count == 2
+
+    def test_atomic_write_keeps_old_file_on_failure(self, tmp_path):
+        path = tmp_path / "settings.json"
+        write_json_atomic(str(path), {"ok": True})
+
+        with pytest.raises(TypeError):
+            write_json_atomic(str(path), {"bad": object()})
+
+        assert read_json(path) == {"ok": True}
+        assert os.listdir(tmp_path) == ["settings.json"]
+
+    def test_store_is_loaded_once(self, store):
+        reloaded = UserSettingsStore(store.path, store.mapping_path)
+        with patch("builtins.open", wraps=open) as opened:
+            for _ in range(5):
+                reloaded.get(123)
+        assert opened.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_load_async_reads_off_loop(self, store):
+        threads = []
+
+        def load(f):
+            threads.append(threading.current_thread())
+            return json.loads(f.read())
+
+        with patch.object(user_settings.json, "load", side_effect=load):
+            await store.load_async()
+        assert threads and threads[0] is not threading.current_thread()
+        assert store.get(123) == {"key": "value", "game_id": "abc"}
+        assert store.user_id_by_game_id("abc") == 123
@@ -1,4 +1,6 @@
 import json
+import os
+import tempfile
 
 
 def load_sample_data(file_path="data/sample_data.json"):
@@ -79,6 +81,33 @@ def save_user_conversation(user_id: int, conversation: list):
         json.dump(conversation, f, ensure_ascii=False, indent=4)
 
 
+def write_json_atomic(file_path: str, data, **dump_kwargs) -> None:
+    """
+    以原子方式寫入 JSON 檔案
+
+    先寫入同一目錄下的暫存檔並同步到磁碟，再以 os.replace 取代原檔，
+    寫入途中當機或斷電時原檔仍保持完整。
+    Args:
+        file_path: 文件路徑
+        data: 要寫入的數據
+        **dump_kwargs: 傳給 json.dump 的參數
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
 def save_sample_data(data: dict, file_path: str = "data/sample_data.json") -> None:
     """保存語音樣本數據到文件"""
     with open(file_path, "w", encoding="utf-8") as f: